@@ -0,0 +1,267 @@
+import asyncio
+import threading
+import random
+import zmq
+import zmq.asyncio
+from ram_telemetry import decode_ram_frame
+from input_script import parse_script_done
+
+# Non-blocking replacement for auto_controller.backend_controller, talking to the same patched VBA-rr.
+#
+# backend_controller blocks on the REP socket for every button press and sleeps a fixed amount between
+# the two presses needed to turn and then walk. Here the sockets are served by asyncio tasks instead:
+#   - presses and input scripts go through a command queue and are answered to the emulator's next
+#     "check_move" request, and every wait has a timeout so a hung emulator can't freeze the AI
+#   - the RAM stream is read continuously in the background, and a movement is considered complete as
+#     soon as the RAM shows its result (the direction changing after a turn, the position changing or
+#     the collision/battle flags after a step) and enough emulator frames have passed for the game to
+#     take input again, rather than after a fixed sleep
+#
+# async_backend_controller is used from inside an event loop, threaded_controller wraps it with the same
+# blocking API as backend_controller (running the event loop on its own thread) so it can be dropped into
+# poke_ai and battle_ai.
+
+# Reply byte for each action (0 up, 1 right, 2 down, 3 left, 4 interact), see DirectInput::readDevice
+action_buttons = [0b01000000, 0b00100000, 0b00010000, 0b00001000, 0b00000100]
+# Action facing each RAM direction value (1 down, 2 up, 3 left, 4 right)
+direction_actions = {1: 2, 2: 0, 3: 3, 4: 1}
+
+class async_backend_controller:
+    # press_timeout is how long the emulator gets to ask for input, movement_timeout how long a movement
+    # gets to show up in the RAM
+    def __init__(self, move_endpoint="tcp://*:5555", ram_endpoint="tcp://localhost:5556", press_timeout=1.0, \
+        movement_timeout=1.0):
+        self.press_timeout = press_timeout
+        self.movement_timeout = movement_timeout
+        # Frames a turn and a step (or bumping into something) take, the game ignores input meanwhile
+        self.turn_frames = 8
+        self.step_frames = 16
+
+        self.context = zmq.asyncio.Context()
+        self.move_socket = self.context.socket(zmq.REP)
+        self.move_socket.setsockopt(zmq.LINGER, 0)
+        self.move_socket.bind(move_endpoint)
+        self.ram_socket = self.context.socket(zmq.SUB)
+        self.ram_socket.setsockopt_string(zmq.SUBSCRIBE, "")
+        self.ram_socket.setsockopt(zmq.CONFLATE, 1)
+        self.ram_socket.setsockopt(zmq.LINGER, 0)
+        self.ram_socket.connect(ram_endpoint)
+
+        self.cur_dir = 0
+        self.script_id = 0
+        self.ram_vals = None # Latest RAM values, None until the first message
+        self.ram_frame = -1 # Emulator frame the latest RAM values were read on
+        self.num_rejected = 0 # RAM frames that couldn't be decoded
+        self.num_timeouts = 0
+
+        # Created in start() so that they belong to the running event loop
+        self.commands = None
+        self.ram_changed = None
+        self.tasks = []
+
+    async def start(self):
+        self.commands = asyncio.Queue()
+        self.ram_changed = asyncio.Condition()
+        self.tasks = [asyncio.ensure_future(self.input_loop()), asyncio.ensure_future(self.ram_loop())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.context.destroy(linger=0)
+
+    # Answers the emulator's input requests with the queued commands, one command per request. Input
+    # scripts are only done once the emulator acknowledges them.
+    async def input_loop(self):
+        while True:
+            message, script_id, timeout, done = await self.commands.get()
+            try:
+                await self.recv_request(self.press_timeout)
+            except asyncio.TimeoutError:
+                done.set_exception(TimeoutError("Emulator didn't ask for input"))
+                continue
+            await self.move_socket.send(message)
+            if (script_id == None):
+                done.set_result(True)
+                continue
+
+            deadline = asyncio.get_event_loop().time() + timeout
+            while True:
+                try:
+                    request = await asyncio.wait_for(self.move_socket.recv(), \
+                        deadline - asyncio.get_event_loop().time())
+                except asyncio.TimeoutError:
+                    done.set_exception(TimeoutError("Emulator didn't finish the input script"))
+                    break
+                await self.move_socket.send(bytes([0])) # Nothing to press
+                if (parse_script_done(request) == script_id):
+                    done.set_result(True)
+                    break
+
+    # Next request from the emulator for input. The acknowledgement of a script that timed out can still come
+    # in late, it's answered with nothing to press so that the next command isn't sent as its reply (which
+    # the emulator throws away).
+    async def recv_request(self, timeout):
+        deadline = asyncio.get_event_loop().time() + timeout
+        while True:
+            request = await asyncio.wait_for(self.move_socket.recv(), \
+                deadline - asyncio.get_event_loop().time())
+            if (parse_script_done(request) == None):
+                return request
+            await self.move_socket.send(bytes([0])) # Nothing to press
+
+    # RAM frames, see ram_telemetry.py
+    async def ram_loop(self):
+        while True:
+            message = await self.ram_socket.recv(copy=False)
+            try:
+                record = decode_ram_frame(message.buffer)
+            except ValueError:
+                self.num_rejected += 1
+                continue
+            async with self.ram_changed:
+                self.ram_vals = record["values"].tolist()
+                self.ram_frame = int(record["frame"])
+                self.ram_changed.notify_all()
+
+    # Waits until RAM values read after emulator frame after_frame satisfy predicate. Returns them, or None
+    # on timeout.
+    async def wait_for_ram(self, predicate, after_frame=-1, timeout=None):
+        async with self.ram_changed:
+            try:
+                await asyncio.wait_for(self.ram_changed.wait_for(lambda: self.ram_frame > after_frame and \
+                    predicate(self.ram_vals)), timeout)
+            except asyncio.TimeoutError:
+                return None
+            return self.ram_vals
+
+    async def get_ram_vals(self):
+        if (self.ram_vals == None):
+            vals = await self.wait_for_ram(lambda vals: True, timeout=self.movement_timeout)
+            if (vals == None):
+                self.num_timeouts += 1
+                return [0, 0, 0, 0, 0, 0]
+        return list(self.ram_vals)
+
+    # Queues a message for the emulator and waits until it has been handed over (and for input scripts,
+    # played out). Returns False on timeout.
+    async def send_command(self, message, script_id=None, timeout=0.0):
+        done = asyncio.get_event_loop().create_future()
+        await self.commands.put((message, script_id, timeout, done))
+        try:
+            await done
+        except TimeoutError:
+            self.num_timeouts += 1
+            return False
+        return True
+
+    async def press(self, action):
+        return await self.send_command(bytes([action_buttons[action]]))
+
+    # Plays out an input_script (see input_script.py) in a single round trip, returns False if the emulator
+    # didn't acknowledge it within press_timeout seconds of its length
+    async def run_script(self, script):
+        self.script_id = (self.script_id + 1) & 0xffff
+        return await self.send_command(script.to_bytes(self.script_id), self.script_id, \
+            script.num_frames() / 60 + self.press_timeout)
+
+    # Whether the RAM shows that a step that started at start_vals is over, num_frames emulator frames after
+    # the press. The position changes (or the collision flag is set) as soon as
+    # the step starts, but the game ignores input until it is over.
+    def is_movement_done(self, start_vals, vals, num_frames):
+        if (vals[4] == 1 or vals[3] == 1 or vals[3] == 2): # Battle started
+            return True
+        moved = vals[0] != start_vals[0] or vals[1] != start_vals[1] or vals[5] == 1
+        return moved and num_frames >= self.step_frames
+
+    def is_turn_done(self, start_vals, vals, action, num_frames):
+        if (self.is_movement_done(start_vals, vals, num_frames)):
+            return True
+        return direction_actions.get(vals[2]) == action and num_frames >= self.turn_frames
+
+    # Same as backend_controller.perform_movement, turns to face the direction first if needed and returns
+    # (key_pressed, ram_vals) once the movement shows up in the RAM (or movement_timeout has passed)
+    async def perform_movement(self, action=-1):
+        if (action == -1):
+            action = random.randint(0, 3)
+        start_vals = await self.get_ram_vals()
+        if (start_vals[2] in direction_actions):
+            self.cur_dir = direction_actions[start_vals[2]]
+
+        if (action == 4):
+            await self.press(action)
+            return action, await self.get_ram_vals()
+
+        if (self.cur_dir != action):
+            if (await self.press(action) == True):
+                press_frame = self.ram_frame
+                # Wait for the turn before pressing again, unless that press already moved the player
+                vals = await self.wait_for_ram(lambda vals: self.is_turn_done(start_vals, vals, action, \
+                    self.ram_frame - press_frame), press_frame, self.movement_timeout)
+                if (vals == None):
+                    self.num_timeouts += 1
+                elif (self.is_movement_done(start_vals, vals, self.ram_frame - press_frame)):
+                    self.cur_dir = action
+                    return action, list(vals)
+        self.cur_dir = action
+
+        if (await self.press(action) == True):
+            press_frame = self.ram_frame
+            vals = await self.wait_for_ram(lambda vals: self.is_movement_done(start_vals, vals, \
+                self.ram_frame - press_frame), press_frame, self.movement_timeout)
+            if (vals == None):
+                self.num_timeouts += 1
+        return action, await self.get_ram_vals()
+
+
+# Blocking wrapper with the same methods as backend_controller, running an async_backend_controller on
+# its own event loop thread
+class threaded_controller:
+    def __init__(self, *args, **kwargs):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        # The sockets have to be made on the loop's thread
+        self.ctrl = self.call(self.create, *args, **kwargs)
+
+    async def create(self, *args, **kwargs):
+        ctrl = async_backend_controller(*args, **kwargs)
+        await ctrl.start()
+        return ctrl
+
+    def call(self, coroutine_function, *args, **kwargs):
+        return asyncio.run_coroutine_threadsafe(coroutine_function(*args, **kwargs), self.loop).result()
+
+    def stop(self):
+        self.call(self.ctrl.stop)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    @property
+    def num_timeouts(self):
+        return self.ctrl.num_timeouts
+
+    def get_ram_vals(self):
+        return self.call(self.ctrl.get_ram_vals)
+
+    def run_script(self, script):
+        return self.call(self.ctrl.run_script, script)
+
+    def perform_movement(self, action=-1):
+        return self.call(self.ctrl.perform_movement, action)
+
+    def move_up(self):
+        self.call(self.ctrl.press, 0)
+        return 0
+    def move_right(self):
+        self.call(self.ctrl.press, 1)
+        return 1
+    def move_down(self):
+        self.call(self.ctrl.press, 2)
+        return 2
+    def move_left(self):
+        self.call(self.ctrl.press, 3)
+        return 3
+    def interact(self):
+        self.call(self.ctrl.press, 4)
+        return 4
@@ -3,6 +3,8 @@ import pyautogui as pag
 import time
 import random
 import zmq
+from ram_telemetry import ram_subscriber
+from input_script import parse_script_done
 
 #from ram_searcher import ram_searcher
 
@@ -179,59 +181,82 @@ class ubuntu_controller:
         return key_pressed
 
 class backend_controller:
-    def __init__(self):
+    # The endpoints only need changing when running several emulators at once, see controller_pool.py
+    def __init__(self, move_endpoint="tcp://*:5555", ram_endpoint="tcp://localhost:5556"):
         self.consecutive_cmd_delay = 0.1
 
         self.move_context = zmq.Context()
         self.move_socket = self.move_context.socket(zmq.REP)
-        self.move_socket.bind("tcp://*:5555")
+        self.move_socket.bind(move_endpoint)
         
-        self.ram_context = zmq.Context()
-        self.ram_socket = self.ram_context.socket(zmq.SUB)
-        self.ram_socket.setsockopt_string(zmq.SUBSCRIBE, "")
-        self.ram_socket.setsockopt(zmq.CONFLATE, 1)
-        self.ram_socket.connect("tcp://localhost:5556")
+        # Latest RAM values are kept up to date on a background thread, see ram_telemetry.py
+        self.ram = ram_subscriber(ram_endpoint)
+        self.ram.start()
+        # Emulator frames to wait after a movement before reading the RAM again
+        self.movement_frames = 10
 
         self.cur_dir = 0
+        self.script_id = 0
 
-    def get_ram_vals(self):
-        #self.ram_socket.connect("tcp://localhost:5556")
-        string = None
-        for i in range(0,10):
-            string = self.ram_socket.recv_string()
-
-        vals = [0,0,0,0,0,0]
+    def stop(self):
+        self.ram.stop()
+        self.move_socket.close(linger=0)
+        self.move_context.term()
 
-        for i in range(0,6):
-            if (i + 1) > len(string):
-                break
-            vals[i] = ord(string[i])
+    def get_ram_vals(self):
+        vals = self.ram.get_ram_vals()
         print(vals)
-
-        #self.ram_socket.disconnect("tcp://localhost:5556")
         return vals
 
+    # Next request from the emulator for input. The acknowledgement of a script that run_script gave up on
+    # can still come in late, it's answered with nothing to press so that the next press isn't sent as
+    # its reply (which the emulator throws away).
+    def recv_request(self):
+        while True:
+            data_req = self.move_socket.recv()
+            if (parse_script_done(data_req) == None):
+                return data_req
+            self.move_socket.send(chr(0).encode("utf-8"))
+
     def move_up(self):
-        data_req = self.move_socket.recv()
+        data_req = self.recv_request()
         self.move_socket.send(chr(0b01000000).encode("utf-8"))
         return 0
     def move_right(self):
-        data_req = self.move_socket.recv()
+        data_req = self.recv_request()
         self.move_socket.send(chr(0b00100000).encode("utf-8"))
         return 1
     def move_down(self):
-        data_req = self.move_socket.recv()
+        data_req = self.recv_request()
         self.move_socket.send(chr(0b00010000).encode("utf-8"))
         return 2
     def move_left(self):
-        data_req = self.move_socket.recv()
+        data_req = self.recv_request()
         self.move_socket.send(chr(0b00001000).encode("utf-8"))
         return 3
     def interact(self):
-        data_req = self.move_socket.recv()
+        data_req = self.recv_request()
         self.move_socket.send(chr(0b00000100).encode("utf-8"))
         return 4
 
+    # Sends a whole input_script (see input_script.py) as a single reply and blocks until the emulator
+    # acknowledges that it has played it out. Returns False if that doesn't happen within timeout seconds of
+    # the script's length.
+    def run_script(self, script, timeout=2.0):
+        self.script_id = (self.script_id + 1) & 0xffff
+        data_req = self.recv_request()
+        self.move_socket.send(script.to_bytes(self.script_id))
+
+        deadline = time.perf_counter() + script.num_frames() / 60 + timeout
+        while True:
+            wait_time = deadline - time.perf_counter()
+            if (wait_time <= 0 or self.move_socket.poll(int(wait_time * 1000)) == 0):
+                return False
+            data_req = self.move_socket.recv()
+            self.move_socket.send(chr(0).encode("utf-8")) # Nothing to press
+            if (parse_script_done(data_req) == self.script_id):
+                return True
+
     # A nice test function, by default moves the character randomly, but a string of
     # actions to perform can be sent from main.py
     def perform_movement(self, action=-1):
@@ -281,6 +306,10 @@ class backend_controller:
         elif action == 4:
             key_pressed = self.interact()
 
+        # Giving the movement time to show up in the RAM
+        snapshot = self.ram.latest()
+        if (snapshot != None):
+            self.ram.wait_for_newer(snapshot.frame + self.movement_frames, timeout=1.0)
         ram_vals = self.get_ram_vals()
 
         print("Current direction: " + str(self.cur_dir))
@@ -5,13 +5,37 @@ from mss import mss
 import pyautogui as pag
 from PIL import Image
 import time
+import os
+import threading
+from input_script import input_script
+from battle_ai.replay_memory import replay_memory
+from battle_ai.battle_learner import battle_learner
+from battle_ai.target_network import target_network
+from battle_ai.hp_reader import hp_reader
 
 # Shift + F1 saves state
 # F1 Loads the same state
 # Use this when battle has been lost.
 
 class battle_ai:
-    def __init__(self, battle_model):
+    # memory_capacity is the number of transitions kept for training (see replay_memory.py), the oldest
+    # ones making way for new ones. prioritized_replay samples them by TD error. replay_path, if given, is
+    # where the memory is saved along with the model, and loaded from on start up if it exists. Every
+    # battle_ai running at once needs its own.
+    #
+    # background_learner trains on its own thread (see battle_learner.py) instead of in between turns of
+    # the battle loop, which then only adds transitions and picks up the learner's weights every
+    # sync_interval learner steps. learner_steps_per_second caps how fast the learner trains.
+    #
+    # target_update bootstraps the targets from a frozen copy of the model (see target_network.py) instead
+    # of the model being trained, updated "hard" (copied every target_update_interval training steps) or
+    # "soft" (moved target_tau towards the model every step). None uses the model itself, as before.
+    # double_dqn picks the next state's best action with the trained model but takes its value from the
+    # target network, which needs target_update to be set.
+    def __init__(self, battle_model, memory_capacity=10000, prioritized_replay=False, \
+        replay_path=None, background_learner=False, sync_interval=10, \
+        learner_steps_per_second=10.0, target_update=None, target_update_interval=100, target_tau=0.01, \
+        double_dqn=False):
         self.states = ["entered_battle", "intro_anim", "action_select", "ongoing_turn", "win", "lose"]
         self.cur_state = "entered_battle"
 
@@ -22,15 +46,27 @@ class battle_ai:
 
         self.pokemon_hp = 141
         self.opponent_hp = 141
+        self.hp_reader = hp_reader()
 
         # DQNN Variables
         self.battle_model = battle_model
-        self.battle_data = [] # Contains an unsorted history of all state and action pairs so far
+        self.battle_data = replay_memory(memory_capacity, prioritized=prioritized_replay) # Recent state and action pairs
+        self.replay_path = replay_path
+        if (replay_path != None and os.path.exists(replay_path)):
+            self.battle_data.load(replay_path)
+        self.memory_lock = threading.Lock() # The learner samples while the battle loop appends
         self.gamma = 0.95
         self.epsilon = 1.0
         self.epsilon_min = 0.01
         self.epsilon_decay = 0.975 # Tune this to make decay faster 0.885?
         self.train_batch_size = 16 #32
+        if (double_dqn == True and target_update == None):
+            raise ValueError("double_dqn needs a target network, set target_update to hard or soft")
+        self.target_update = target_update
+        self.target_update_interval = target_update_interval
+        self.target_tau = target_tau
+        self.double_dqn = double_dqn
+        self.target_net = self.make_target_network(self.battle_model)
 
         self.continue_training = True
         self.action_predicted_rewards = [[0.0, 0.0, 0.0, 0.0]]
@@ -42,110 +78,115 @@ class battle_ai:
         self.next_state = None
         self.move_index = None
         self.move_method_used = None
+        self.action_performed = False # Whether the emulator played out the last move selection
 
         self.key_wait_time = 0.25
+        # Frames a key is held down for and let go of in input scripts, and the wait for the move menu to
+        # open after fight is selected
+        self.key_hold_frames = 2
+        self.key_release_frames = 6
+        self.key_wait_frames = 15
 
         # Variables for keeping track of battle AI history
         self.battle_history_list = []
         self.history_output = None
 
+        self.learner = None
+        if (background_learner == True):
+            self.learner = battle_learner(self, sync_interval, learner_steps_per_second)
+            self.learner.start()
+
     def update_hps(self, frame):
-        # HP Detection
-        black_lower_bound = (87, 0, 0)
-        black_upper_bound = (164, 74, 91)
-        black_detection_img = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        black_detection_img = cv2.inRange(black_detection_img, black_lower_bound, black_upper_bound)
-        contours, hierarchy = cv2.findContours(black_detection_img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        for cnt in contours:
-            if (cv2.contourArea(cnt) > 0):
-                M = cv2.moments(cnt)
-                centroid_x = int(M['m10']/M['m00'])
-                centroid_y = int(M['m01']/M['m00'])
-
-                # My HP
-                if (centroid_x >= 510 and centroid_x <= 680 and centroid_y >= 370 and centroid_y <= 420):
-                    leftmost = tuple(cnt[cnt[:,:,0].argmin()][0])
-                    rightmost = tuple(cnt[cnt[:,:,0].argmax()][0])
-                    self.pokemon_hp = 141 - (rightmost[0] - leftmost[0])
-
-                # Opponenet's HP
-                elif (centroid_x >= 140 and centroid_x <= 310 and centroid_y >= 200 and centroid_y <= 250):
-                    leftmost = tuple(cnt[cnt[:,:,0].argmin()][0])
-                    rightmost = tuple(cnt[cnt[:,:,0].argmax()][0])
-                    self.opponent_hp = 141 - (rightmost[0] - leftmost[0])
-        
-        if (self.pokemon_hp < 0):
-            self.pokemon_hp = 0
-        if (self.opponent_hp < 0):
-            self.opponent_hp = 0
+        # HP Detection, only looks at where the HP bars are (see hp_reader.py). HPs whose bar isn't found
+        # keep their last value.
+        pokemon_hp, opponent_hp = self.hp_reader.read(frame)
+        if (pokemon_hp != None):
+            self.pokemon_hp = pokemon_hp
+        if (opponent_hp != None):
+            self.opponent_hp = opponent_hp
 
 
+    # Returns False if the emulator didn't acknowledge the move selection in time
     def action_performer(self, ctrl):
-        # If fight is selected (for now we are only sticking with selecting fight)
-        time.sleep(self.key_wait_time)
-        ctrl.interact()
-
         print("Move selected: " + str(self.move_index))
 
+        # The whole move selection is sent as a single input script that the emulator plays out frame by
+        # frame (see input_script.py), rather than a round trip and a sleep for every key
+        script = input_script(self.key_hold_frames, self.key_release_frames)
+        script.wait(self.key_release_frames)
+        # If fight is selected (for now we are only sticking with selecting fight)
+        script.press("a", release_frames=self.key_wait_frames)
+
         # Reset move selector to 0 (top_left move)
-        time.sleep(self.key_wait_time)
-        ctrl.move_up()
-        time.sleep(self.key_wait_time)
-        ctrl.move_left()
-
-        if (self.move_index == 0): # First move and so on
-            time.sleep(self.key_wait_time)
-            ctrl.interact()
-        elif (self.move_index == 1):
-            time.sleep(self.key_wait_time)
-            ctrl.move_right()
-            time.sleep(self.key_wait_time)
-            ctrl.interact()
+        script.press("up")
+        script.press("left")
+
+        if (self.move_index == 1):
+            script.press("right")
         elif (self.move_index == 2):
-            time.sleep(self.key_wait_time)
-            ctrl.move_down()
-            time.sleep(self.key_wait_time)
-            ctrl.interact()
-        else: # 4th, last move
-            time.sleep(self.key_wait_time)
-            ctrl.move_down()
-            time.sleep(self.key_wait_time)
-            ctrl.move_right()
-            time.sleep(self.key_wait_time)
-            ctrl.interact()
+            script.press("down")
+        elif (self.move_index == 3): # 4th, last move
+            script.press("down")
+            script.press("right")
+        script.press("a")
+        return ctrl.run_script(script)
 
     
-    def do_training_step(self):
-        print("Performing training...")
+    # Target network following model, None without target_update
+    def make_target_network(self, model):
+        if (self.target_update == None):
+            return None
+        return target_network(model, self.target_update, self.target_update_interval, self.target_tau)
+
+    # Trains model (the battle model unless it's the background learner's copy, with its own target
+    # network) on one minibatch
+    def do_training_step(self, model=None, target=None):
+        if (model == None):
+            model = self.battle_model
+            target = self.target_net
+            print("Performing training...")
 
         # Get random sample of training data of batch_size 32
-        training_batch = random.sample(self.battle_data, self.train_batch_size)
-        train_state_arr = []
-        train_target_arr = []
-
-        for init_state, action, reward, next_state, done in training_batch:
-            target_reward = reward
-
-            if (done == False):
-                # If haven't reached terminal state, the target_reward value is based on the predicted
-                # expected reward from next_state
-                target_reward = (reward + self.gamma * np.amax(self.battle_model.predict(next_state)[0]))
-            
-            reward_prediction = self.battle_model.predict(init_state)
-            reward_prediction[0][action] = target_reward
-
-            train_state_arr.append(init_state[0])
-            train_target_arr.append(reward_prediction[0])
-        
-        # Actual keras training function
-        history = self.battle_model.fit(np.array(train_state_arr), np.array(train_target_arr), epochs=1, verbose=0)
+        with self.memory_lock:
+            indices, init_states, actions, rewards, next_states, dones, weights = \
+                self.battle_data.sample(self.train_batch_size)
+        train_target_arr, td_errors = self.compute_targets(init_states, actions, rewards, next_states, dones, \
+            model, target)
+        with self.memory_lock:
+            self.battle_data.update_priorities(indices, td_errors)
+
+        # Actual keras training function, weights only differ from 1 with prioritized replay
+        history = model.fit(init_states, train_target_arr, sample_weight=weights, epochs=1, verbose=0)
+        if (target != None):
+            target.step(model)
         # Keeping track of our loss
-        loss = history.history["loss"][0]
-        # Reduce randomness (exploration vs exploitation thing)
-        if (self.epsilon > self.epsilon_min):
-            self.epsilon *= self.epsilon_decay
-        return loss
+        return history.history["loss"][0]
+
+    # Training targets for a batch of transitions: the model's current predictions for init_states, with
+    # the taken action's value replaced by its reward plus, if the battle hasn't ended, the discounted best
+    # value predicted for next_state. Runs the model once on all the next states and once on all the
+    # initial states instead of twice per transition. Also returns the TD errors, how far off the
+    # predictions for the taken actions were.
+    #
+    # With a target network the next state's value comes from it instead, for the action it rates best or,
+    # with double_dqn, the action the model rates best.
+    def compute_targets(self, init_states, actions, rewards, next_states, dones, model=None, target=None):
+        if (model == None):
+            model = self.battle_model
+            target = self.target_net
+        if (target == None):
+            next_values = np.amax(model.predict_on_batch(next_states), axis=1)
+        elif (self.double_dqn == True):
+            next_actions = np.argmax(model.predict_on_batch(next_states), axis=1)
+            next_values = target.predict_on_batch(next_states)[np.arange(len(next_actions)), next_actions]
+        else:
+            next_values = np.amax(target.predict_on_batch(next_states), axis=1)
+        target_rewards = np.where(dones, rewards, rewards + self.gamma * next_values)
+
+        reward_predictions = np.array(model.predict_on_batch(init_states))
+        td_errors = target_rewards - reward_predictions[np.arange(len(actions)), actions]
+        reward_predictions[np.arange(len(actions)), actions] = target_rewards
+        return reward_predictions, td_errors
 
 
     def main_battle_loop(self, ctrl, sct, game_window_size):
@@ -191,6 +232,8 @@ class battle_ai:
             self.init_state[0][1] = self.opponent_hp
             
             self.move_index = 0
+            if (self.learner != None):
+                self.learner.sync_weights(self.battle_model)
             self.action_predicted_rewards = self.battle_model.predict(self.init_state)
             print(self.action_predicted_rewards[0])
             
@@ -203,8 +246,11 @@ class battle_ai:
                 self.move_method_used = "Predicted"
                 self.move_index = np.argmax(self.action_predicted_rewards[0])
             
-            # Performing actual, physical action now
-            self.action_performer(ctrl)
+            # Performing actual, physical action now. If it timed out the move may or may not have been
+            # selected, so the turn still plays out in ongoing_turn but no transition is recorded for it.
+            self.action_performed = self.action_performer(ctrl)
+            if (self.action_performed == False):
+                print("Move selection timed out, skipping this turn")
             self.cur_state = "ongoing_turn"
 
         # This state is when we've selected an attack and both pokemon are performing their individual attacks
@@ -245,21 +291,24 @@ class battle_ai:
                     (self.init_state[0][0] - self.next_state[0][0]) + base_reward
                 print("Action reward: " + str(self.last_reward))
 
-                # Adding this state/action pair to our dataset. Last element is True because 1v1 battle
-                # has ended in this conditional
-                self.battle_data.append((self.init_state, self.move_index, self.last_reward, self.next_state, True))
-                # Adding this turn to history list
-                status = ""
-                if (self.opponent_hp <= 0):
-                    status = "Won"
-                elif (self.pokemon_hp <= 0):
-                    status = "Lost"
-                else:
-                    status = "Ongoing"
-                self.cur_history_object = battle_history_list_obj(self.move_index, self.move_method_used, \
-                    self.action_predicted_rewards[0], \
-                    str(self.pokemon_hp), str(self.opponent_hp), status)
-                self.battle_history_list.append(self.cur_history_object) 
+                if (self.action_performed == True):
+                    # Adding this state/action pair to our dataset. Last element is True because 1v1 battle
+                    # has ended in this conditional
+                    with self.memory_lock:
+                        self.battle_data.append(self.init_state, self.move_index, self.last_reward, \
+                            self.next_state, True)
+                    # Adding this turn to history list
+                    status = ""
+                    if (self.opponent_hp <= 0):
+                        status = "Won"
+                    elif (self.pokemon_hp <= 0):
+                        status = "Lost"
+                    else:
+                        status = "Ongoing"
+                    self.cur_history_object = battle_history_list_obj(self.move_index, self.move_method_used, \
+                        self.action_predicted_rewards[0], \
+                        str(self.pokemon_hp), str(self.opponent_hp), status)
+                    self.battle_history_list.append(self.cur_history_object) 
                 
                 self.cur_state = "battle_ended"
 
@@ -278,21 +327,24 @@ class battle_ai:
                         (self.init_state[0][0] - self.next_state[0][0])
                     print("Action reward: " + str(self.last_reward))
 
-                    # Adding this state/action pair to our dataset. Last element is False because 1v1 battle
-                    # is still going on
-                    self.battle_data.append((self.init_state, self.move_index, self.last_reward, self.next_state, False))
-                    # Adding this turn to history list
-                    status = ""
-                    if (self.opponent_hp <= 0):
-                        status = "Won"
-                    elif (self.pokemon_hp <= 0):
-                        status = "Lost"
-                    else:
-                        status = "Ongoing"
-                    self.cur_history_object = battle_history_list_obj(self.move_index, self.move_method_used, \
-                        self.action_predicted_rewards[0], \
-                        str(self.pokemon_hp), str(self.opponent_hp), status)
-                    self.battle_history_list.append(self.cur_history_object) 
+                    if (self.action_performed == True):
+                        # Adding this state/action pair to our dataset. Last element is False because 1v1
+                        # battle is still going on
+                        with self.memory_lock:
+                            self.battle_data.append(self.init_state, self.move_index, self.last_reward, \
+                                self.next_state, False)
+                        # Adding this turn to history list
+                        status = ""
+                        if (self.opponent_hp <= 0):
+                            status = "Won"
+                        elif (self.pokemon_hp <= 0):
+                            status = "Lost"
+                        else:
+                            status = "Ongoing"
+                        self.cur_history_object = battle_history_list_obj(self.move_index, self.move_method_used, \
+                            self.action_predicted_rewards[0], \
+                            str(self.pokemon_hp), str(self.opponent_hp), status)
+                        self.battle_history_list.append(self.cur_history_object) 
                     
                     self.cur_state = "action_select"
             
@@ -305,15 +357,26 @@ class battle_ai:
                     print("Model saved!")
                     print("")
                     self.battle_model.save_weights(f"battle_ai/models/battle_model_{self.num_episodes_completed}.h5")
+                    if (self.replay_path != None):
+                        with self.memory_lock:
+                            self.battle_data.save(self.replay_path)
 
             # This conditional basically allows the battle_model to perform its training after every state
-            # pair provided that the minimum batch_size in battle_data has been achieved.
+            # pair provided that the minimum batch_size in battle_data has been achieved. The background
+            # learner trains on its own, only its progress is shown here.
             if (self.cur_state == "battle_ended" or self.cur_state == "action_select"):
                 print("Current batch size: " + str(len(self.battle_data)))
                 if (len(self.battle_data) > self.train_batch_size):
                     loss = None
                     if (self.continue_training == True):
-                        loss = self.do_training_step()
+                        if (self.learner == None):
+                            loss = self.do_training_step()
+                        else:
+                            loss = self.learner.last_loss
+                            print(self.learner.stats())
+                        # Reduce randomness (exploration vs exploitation thing)
+                        if (self.epsilon > self.epsilon_min):
+                            self.epsilon *= self.epsilon_decay
                     print(f"Episode: {self.num_episodes_completed}, Loss: {loss}")
                     print("")
 
@@ -357,10 +420,19 @@ class battle_ai:
     def open_battle_ai_model(self, model_path):
         # Load pre-trained model weights
         self.battle_model.load_weights(model_path)
+        if (self.target_net != None):
+            self.target_net.copy(self.battle_model)
         self.epsilon = 0.05 # Disabling randomness
         self.continue_training = False # Disabling training
+        self.stop()
         print("Loaded pretained model")
 
+    # Stops the background learner, if there is one
+    def stop(self):
+        if (self.learner != None):
+            self.learner.stop()
+            self.learner = None
+
 class battle_history_list_obj:
     def __init__(self, text, method_used, model_output, my_hp, enemy_hp, status):
         self.text = text
@@ -0,0 +1,116 @@
+import time
+import threading
+import keras
+import tensorflow as tf
+
+# Trains the battle AI's DQN on its own thread so that keras' fit never stalls the battle loop. The battle
+# loop keeps acting with battle_ai.battle_model and appending transitions to the replay memory, while the
+# learner trains its own copy of the model on minibatches sampled from that memory (see
+# battle_ai.do_training_step). Every sync_interval learner steps the copy's weights are published, and the
+# battle loop picks them up with sync_weights() before its next prediction.
+#
+# steps_per_second caps how fast the learner trains, a battle only adds a transition every few seconds and
+# an unthrottled learner would just fit the same few transitions over and over (and take CPU time away
+# from capture). None trains as fast as it can.
+#
+# stats() reports the learner's steps per second and how stale the acting weights are, in learner steps
+# and in seconds since they were published.
+class battle_learner:
+    def __init__(self, ai, sync_interval=10, steps_per_second=10.0):
+        self.ai = ai
+        self.sync_interval = sync_interval
+        self.steps_per_second = steps_per_second
+
+        # The graph has to be passed around explicitly as training runs on another thread
+        self.graph = tf.get_default_graph()
+        self.model = keras.models.clone_model(ai.battle_model)
+        self.model.set_weights(ai.battle_model.get_weights())
+        optimizer = ai.battle_model.optimizer
+        optimizer = optimizer.__class__.from_config(optimizer.get_config()) # A fresh one with the same settings
+        self.model.compile(loss=ai.battle_model.loss, optimizer=optimizer)
+        # Must be built before being used from other threads
+        self.model._make_train_function()
+        self.model._make_predict_function()
+        ai.battle_model._make_predict_function()
+        self.target = ai.make_target_network(self.model) # Follows the learner's copy, None without one
+
+        self.lock = threading.Lock() # Guards the published weights
+        self.published_weights = None
+        self.published_step = 0
+        self.published_time = time.perf_counter()
+        self.synced_step = 0 # Learner step and time of the weights the battle loop is acting with
+        self.synced_time = self.published_time
+        self.num_syncs = 0
+
+        self.num_steps = 0
+        self.last_loss = None
+        self.training_time = 0.0 # Time spent in training steps, excluding waiting for transitions
+        self.start_time = None
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.start_time = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        self.running = False
+        if (self.thread != None):
+            self.thread.join(timeout)
+            self.thread = None
+
+    def run(self):
+        with self.graph.as_default():
+            while (self.running == True):
+                if (self.ai.continue_training == False or len(self.ai.battle_data) <= self.ai.train_batch_size):
+                    time.sleep(0.1)
+                    continue
+
+                step_start = time.perf_counter()
+                self.last_loss = self.ai.do_training_step(self.model, self.target)
+                self.num_steps += 1
+                if (self.num_steps % self.sync_interval == 0):
+                    self.publish()
+                step_time = time.perf_counter() - step_start
+                self.training_time += step_time
+
+                if (self.steps_per_second != None and step_time < 1.0 / self.steps_per_second):
+                    time.sleep(1.0 / self.steps_per_second - step_time)
+
+    def publish(self):
+        weights = self.model.get_weights()
+        with self.lock:
+            self.published_weights = weights
+            self.published_step = self.num_steps
+            self.published_time = time.perf_counter()
+
+    # Called by the battle loop, copies the newest published weights into model if there are any it
+    # doesn't have yet. Returns True if the weights changed.
+    def sync_weights(self, model):
+        with self.lock:
+            weights = self.published_weights
+            self.published_weights = None
+            step = self.published_step
+            published_time = self.published_time
+        if (weights == None):
+            return False
+        model.set_weights(weights)
+        self.synced_step = step
+        self.synced_time = published_time
+        self.num_syncs += 1
+        return True
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.start_time if self.start_time != None else 0.0
+        return {
+            "learner_steps": self.num_steps,
+            "steps_per_second": self.num_steps / elapsed if elapsed > 0 else 0.0,
+            "training_steps_per_second": self.num_steps / self.training_time if self.training_time > 0 else 0.0,
+            "last_loss": self.last_loss,
+            "num_syncs": self.num_syncs,
+            "staleness_steps": self.num_steps - self.synced_step,
+            "staleness_seconds": time.perf_counter() - self.synced_time,
+        }
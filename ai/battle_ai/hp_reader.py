@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+
+# Reads both HPs off the battle screen (the padded 720x720 frame) by looking only at the two places the HP
+# bars can be, instead of converting the whole frame to HSV and finding contours in all of it. The
+# empty part of a bar is dark, so in each box the row with the most dark pixels is taken as the bar and
+# the longest run of dark columns along it as its empty part, the HP being 141 minus its length, as
+# battle_ai.update_hps worked it out from a contour.
+#
+# A run only counts if its middle is in the bar's box (where update_hps looked for contour centroids).
+# The row is scanned wide enough around the box to hold a run of a whole bar.
+class hp_reader:
+    black_lower_bound = (87, 0, 0)
+    black_upper_bound = (164, 74, 91)
+    full_hp = 141
+    # (left, top, right, bottom) boxes the middle of the empty part of each bar falls in
+    my_hp_box = (510, 370, 680, 420)
+    opponent_hp_box = (140, 200, 310, 250)
+
+    def __init__(self, frame_width=720):
+        self.bars = []
+        for box in [self.my_hp_box, self.opponent_hp_box]:
+            left, top, right, bottom = box
+            half_bar = self.full_hp // 2 + 1
+            x0 = max(0, left - half_bar)
+            x1 = min(frame_width, right + half_bar + 1)
+            # Dark columns of the bar's row with a column of nothing either side, so runs always have both ends
+            line = np.zeros(x1 - x0 + 2, dtype=np.uint8)
+            self.bars.append((box, x0, x1, line))
+
+    # HP of one bar, None if there's no empty part of a bar in its box
+    def read_bar(self, frame, bar):
+        (left, top, right, bottom), x0, x1, line = bar
+
+        # Only rows in the box can hold the bar, and its middle is between the box's columns, where there is
+        # nothing but the HP panel around it. Every other row is enough to find it, the dark part of a bar
+        # has to be at least 2 rows high to have had any area as a contour.
+        dark = cv2.inRange(cv2.cvtColor(frame[top:bottom + 1:2, left:right + 1], cv2.COLOR_BGR2HSV), \
+            self.black_lower_bound, self.black_upper_bound)
+        row_counts = cv2.reduce(dark, 1, cv2.REDUCE_SUM, dtype=cv2.CV_32S)[:, 0]
+        row = int(np.argmax(row_counts))
+        if (row_counts[row] < 2 * 255):
+            return None
+        row = top + 2 * row
+        line[1:-1] = cv2.inRange(cv2.cvtColor(frame[row:row + 1, x0:x1], cv2.COLOR_BGR2HSV), \
+            self.black_lower_bound, self.black_upper_bound)[0]
+
+        # Runs of dark columns, starts and (exclusive) ends from where the row changes
+        edges = np.flatnonzero(line[1:] != line[:-1])
+        starts = edges[0::2]
+        ends = edges[1::2]
+        middles = x0 + (starts + ends - 1) / 2
+        in_box = (ends - starts >= 2) & (middles >= left) & (middles <= right)
+        if (np.any(in_box) == False):
+            return None
+        run = int(np.argmax(np.where(in_box, ends - starts, 0)))
+        return max(0, self.full_hp - (int(ends[run]) - 1 - int(starts[run])))
+
+    # Returns (my_hp, opponent_hp), either None if its bar wasn't found
+    def read(self, frame):
+        return self.read_bar(frame, self.bars[0]), self.read_bar(frame, self.bars[1])
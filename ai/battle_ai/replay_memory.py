@@ -0,0 +1,152 @@
+import numpy as np
+
+# Fixed capacity replay memory for the battle AI's DQN, replacing the list of (init_state, action, reward,
+# next_state, done) tuples that grew for as long as the AI ran. Transitions are kept in preallocated
+# arrays, once full the oldest one is overwritten by the next, and minibatches are sampled with numpy
+# indexing instead of random.sample.
+#
+# With prioritized=True, transitions are sampled in proportion to their priority (their last TD error,
+# raised to alpha) using a sum tree, and sample() also returns importance sampling weights (annealed by
+# beta) to correct for that in the loss. New transitions get the highest priority seen so far so that
+# every one is trained on at least once.
+#
+# save() and load() keep the whole memory in a single .npz file, so it survives restarts.
+
+class sum_tree:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 1
+        while (self.size < capacity):
+            self.size *= 2
+        # tree[1] is the root, node i has children 2i and 2i + 1, the leaves start at tree[size]
+        self.tree = np.zeros(2 * self.size, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    def get(self, indices):
+        return self.tree[self.size + np.asarray(indices)]
+
+    def update(self, indices, priorities):
+        nodes = self.size + np.asarray(indices)
+        self.tree[nodes] = priorities
+        # Recompute the sums above the changed leaves one level at a time
+        nodes = np.unique(nodes // 2)
+        while (nodes[0] >= 1):
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if (nodes[0] == 1):
+                break
+            nodes = np.unique(nodes // 2)
+
+    # Leaf index for every value in [0, total), all of them walking down the tree together
+    def find(self, values):
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while (nodes[0] < self.size):
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values -= np.where(go_right, self.tree[left], 0.0)
+            nodes = left + go_right
+        return np.minimum(nodes - self.size, self.capacity - 1)
+
+
+class replay_memory:
+    def __init__(self, capacity=10000, state_size=2, prioritized=False, alpha=0.6, beta=0.4, \
+        priority_epsilon=1e-3, seed=None):
+        self.capacity = capacity
+        self.state_size = state_size
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.priority_epsilon = priority_epsilon # Keeps transitions with no TD error sampleable
+        self.rng = np.random.RandomState(seed)
+
+        self.init_states = np.zeros((capacity, state_size), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_size), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.bool_)
+        self.position = 0 # Where the next transition goes
+        self.size = 0
+
+        self.tree = sum_tree(capacity) if prioritized == True else None
+        self.max_priority = 1.0
+
+    def __len__(self):
+        return self.size
+
+    # States can be given as battle_ai keeps them, (1, state_size) arrays
+    def append(self, init_state, action, reward, next_state, done):
+        i = self.position
+        self.init_states[i] = np.reshape(init_state, self.state_size)
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = np.reshape(next_state, self.state_size)
+        self.dones[i] = done
+        if (self.tree != None):
+            self.tree.update([i], [self.max_priority])
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    # Returns (indices, init_states, actions, rewards, next_states, dones, weights) for batch_size
+    # transitions. The weights are all 1 unless the memory is prioritized, the indices are for
+    # update_priorities.
+    def sample(self, batch_size):
+        if (self.tree == None):
+            # Without replacement, like random.sample. Drawing again on the odd repeat is much faster than
+            # choice(replace=False), which shuffles the whole memory, unless the batch is most of it.
+            if (batch_size * 4 > self.size):
+                indices = self.rng.choice(self.size, batch_size, replace=False)
+            else:
+                indices = self.rng.randint(0, self.size, batch_size)
+                while (len(np.unique(indices)) < batch_size):
+                    indices = self.rng.randint(0, self.size, batch_size)
+            weights = np.ones(batch_size, dtype=np.float32)
+        else:
+            # One transition from each of batch_size equal slices of the total priority
+            total = self.tree.total()
+            values = (np.arange(batch_size) + self.rng.uniform(size=batch_size)) * (total / batch_size)
+            indices = np.minimum(self.tree.find(values), self.size - 1) # Rounding can overshoot the filled part
+            probabilities = self.tree.get(indices) / total
+            weights = (self.size * probabilities) ** -self.beta
+            weights = (weights / weights.max()).astype(np.float32)
+        return indices, self.init_states[indices], self.actions[indices], self.rewards[indices], \
+            self.next_states[indices], self.dones[indices], weights
+
+    def update_priorities(self, indices, td_errors):
+        if (self.tree == None):
+            return
+        priorities = (np.abs(td_errors) + self.priority_epsilon) ** self.alpha
+        self.tree.update(indices, priorities)
+        self.max_priority = max(self.max_priority, float(np.max(priorities)))
+
+    def save(self, path):
+        priorities = self.tree.get(np.arange(self.capacity)) if self.tree != None else np.zeros(0)
+        np.savez(path, init_states=self.init_states, actions=self.actions, rewards=self.rewards, \
+            next_states=self.next_states, dones=self.dones, priorities=priorities, \
+            counters=np.array([self.position, self.size]), max_priority=np.array(self.max_priority))
+
+    # Loads a memory saved with save(). A saved memory bigger than this one keeps its newest transitions.
+    def load(self, path):
+        with np.load(path) as data:
+            position, size = [int(value) for value in data["counters"]]
+            saved_capacity = len(data["actions"])
+            # Saved transitions from oldest to newest
+            order = (np.arange(size) + (position - size)) % saved_capacity
+            order = order[max(0, size - self.capacity):]
+            self.size = len(order)
+            self.position = self.size % self.capacity
+            self.init_states[:self.size] = data["init_states"][order]
+            self.actions[:self.size] = data["actions"][order]
+            self.rewards[:self.size] = data["rewards"][order]
+            self.next_states[:self.size] = data["next_states"][order]
+            self.dones[:self.size] = data["dones"][order]
+            if (self.tree != None):
+                self.tree = sum_tree(self.capacity)
+                self.max_priority = float(data["max_priority"])
+                if (len(data["priorities"]) > 0):
+                    priorities = data["priorities"][order]
+                else: # Saved without priorities
+                    priorities = np.full(self.size, self.max_priority)
+                if (self.size > 0):
+                    self.tree.update(np.arange(self.size), priorities)
@@ -0,0 +1,37 @@
+import keras
+
+# A frozen copy of the battle model that the DQN's targets are bootstrapped from, so that the values the
+# model is trained towards don't move with every training step. It follows the trained model either with
+# a hard update, copying its weights every update_interval training steps, or a soft one, moving tau of
+# the way towards them after every step.
+class target_network:
+    def __init__(self, model, update="hard", update_interval=100, tau=0.01):
+        if (update != "hard" and update != "soft"):
+            raise ValueError(f"Unknown target network update {update}, expected hard or soft")
+        self.update = update
+        self.update_interval = update_interval
+        self.tau = tau
+        self.model = keras.models.clone_model(model)
+        self.model._make_predict_function() # Must be built before being used from other threads
+        self.copy(model)
+        self.num_steps = 0 # Training steps since the target network was made
+        self.num_updates = 0
+
+    def predict_on_batch(self, states):
+        return self.model.predict_on_batch(states)
+
+    def copy(self, model):
+        self.model.set_weights(model.get_weights())
+
+    # Called after every training step of model
+    def step(self, model):
+        self.num_steps += 1
+        if (self.update == "hard"):
+            if (self.num_steps % self.update_interval == 0):
+                self.copy(model)
+                self.num_updates += 1
+        else:
+            weights = [self.tau * weight + (1.0 - self.tau) * target_weight for weight, target_weight \
+                in zip(model.get_weights(), self.model.get_weights())]
+            self.model.set_weights(weights)
+            self.num_updates += 1
@@ -0,0 +1,139 @@
+import os
+import time
+import tempfile
+import threading
+import subprocess
+from async_controller import threaded_controller
+
+# Lets one Python process drive several emulators at once. Every emulator needs its own pair of sockets,
+# so instance i gets its own endpoints instead of the fixed ports 5555 (input) and 5556 (RAM):
+#   - tcp: input on port base_port + 2 * i, RAM on base_port + 2 * i + 1, so instance 0 is the usual
+#     single emulator setup
+#   - ipc: Unix domain sockets in ipc_dir, skipping the TCP stack when everything runs on one machine
+#     (libzmq only supports ipc on Windows from 4.3 on Windows 10)
+# The patched VBA-rr reads its endpoints from the POKE_AI_INPUT_ENDPOINT and POKE_AI_RAM_ENDPOINT
+# environment variables (see DirectInput::startZMQ and ramwatch.cpp), emulator_env gives them for an
+# instance.
+#
+# fleet_scheduler then runs one agent per emulator, each on its own thread.
+
+default_base_port = 5555
+default_ipc_dir = os.path.join(tempfile.gettempdir(), "poke_ai")
+
+# Endpoints for emulator instance index. The controller binds the input socket and connects to the RAM
+# socket, the emulator does the opposite.
+def instance_endpoints(index, transport="tcp", base_port=default_base_port, ipc_dir=default_ipc_dir):
+    if (transport == "tcp"):
+        input_port = base_port + 2 * index
+        return {"input_bind": f"tcp://*:{input_port}", "input_connect": f"tcp://localhost:{input_port}", \
+            "ram_bind": f"tcp://*:{input_port + 1}", "ram_connect": f"tcp://localhost:{input_port + 1}"}
+    elif (transport == "ipc"):
+        os.makedirs(ipc_dir, exist_ok=True)
+        input_path = "ipc://" + os.path.join(ipc_dir, f"input_{index}").replace("\\", "/")
+        ram_path = "ipc://" + os.path.join(ipc_dir, f"ram_{index}").replace("\\", "/")
+        return {"input_bind": input_path, "input_connect": input_path, "ram_bind": ram_path, \
+            "ram_connect": ram_path}
+    raise ValueError(f"Unknown transport {transport}, expected tcp or ipc")
+
+class controller_pool:
+    # One controller per emulator instance. async_controller picks the asyncio controller (see
+    # async_controller.py) over auto_controller.backend_controller, controller_kwargs are passed on to it.
+    def __init__(self, num_instances, transport="tcp", base_port=default_base_port, ipc_dir=default_ipc_dir, \
+        async_controller=False, **controller_kwargs):
+        self.transport = transport
+        self.endpoints = [instance_endpoints(i, transport, base_port, ipc_dir) for i in range(num_instances)]
+        self.controllers = []
+        for endpoints in self.endpoints:
+            if (async_controller == True):
+                ctrl = threaded_controller(endpoints["input_bind"], endpoints["ram_connect"], **controller_kwargs)
+            else:
+                # auto_controller can only be imported on Windows
+                from auto_controller import backend_controller
+                ctrl = backend_controller(endpoints["input_bind"], endpoints["ram_connect"], **controller_kwargs)
+            self.controllers.append(ctrl)
+
+    def __len__(self):
+        return len(self.controllers)
+
+    def __getitem__(self, index):
+        return self.controllers[index]
+
+    # Environment to start emulator instance index with, so that it talks to its own controller
+    def emulator_env(self, index):
+        env = dict(os.environ)
+        env["POKE_AI_INPUT_ENDPOINT"] = self.endpoints[index]["input_connect"]
+        env["POKE_AI_RAM_ENDPOINT"] = self.endpoints[index]["ram_bind"]
+        return env
+
+    # Starts an emulator per instance, command being the emulator and its arguments (ROM, save state...)
+    def launch_emulators(self, command):
+        return [subprocess.Popen(command, env=self.emulator_env(i)) for i in range(len(self))]
+
+    def stop(self):
+        for ctrl in self.controllers:
+            ctrl.stop()
+
+
+# Runs num_agents agents concurrently, one thread each, until stop() is called or max_steps steps have been
+# run. make_agent(index) is called on the agent's own thread (screen capturers and keras graphs don't
+# like being shared between threads) and has to return something with a run_step() method. Most of a
+# step is spent waiting on the emulator, or in the detection model which releases the GIL, so threads are
+# enough to keep the cores busy.
+class fleet_scheduler:
+    def __init__(self, make_agent, num_agents, max_steps=None, on_step=None):
+        self.make_agent = make_agent
+        self.num_agents = num_agents
+        self.max_steps = max_steps
+        self.on_step = on_step # on_step(index, agent, result) after every step
+        self.agents = [None] * num_agents
+        self.steps = [0] * num_agents
+        self.errors = [None] * num_agents
+        self.running = False
+        self.threads = []
+        self.start_time = 0.0
+        self.end_time = None
+
+    def start(self):
+        self.running = True
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.threads = [threading.Thread(target=self.run_agent, args=(i,), daemon=True) \
+            for i in range(self.num_agents)]
+        for thread in self.threads:
+            thread.start()
+
+    def run_agent(self, index):
+        try:
+            agent = self.make_agent(index)
+            self.agents[index] = agent
+            while (self.running == True and (self.max_steps == None or self.steps[index] < self.max_steps)):
+                result = agent.run_step()
+                self.steps[index] += 1
+                if (self.on_step != None):
+                    self.on_step(index, agent, result)
+        except Exception as e:
+            # One agent failing (an emulator crashing, say) shouldn't take the others down with it
+            self.errors[index] = e
+            print(f"Agent {index} stopped after {self.steps[index]} steps: {e!r}")
+
+    # Waits for every agent to finish, returns False if some are still running after timeout seconds
+    def join(self, timeout=None):
+        deadline = None if timeout == None else time.perf_counter() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline == None else max(0.0, deadline - time.perf_counter()))
+        if (any(thread.is_alive() for thread in self.threads)):
+            return False
+        if (self.end_time == None):
+            self.end_time = time.perf_counter()
+        return True
+
+    def stop(self, timeout=None):
+        self.running = False
+        return self.join(timeout)
+
+    def stats(self):
+        end_time = self.end_time if self.end_time != None else time.perf_counter()
+        duration = max(end_time - self.start_time, 1e-9)
+        return {"steps": list(self.steps), "steps_per_second": [steps / duration for steps in self.steps], \
+            "total_steps_per_second": sum(self.steps) / duration, "duration": duration, \
+            "errors": [repr(error) if error != None else None for error in self.errors]}
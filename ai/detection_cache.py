@@ -0,0 +1,59 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Consecutive captures are very often pixel-identical (dialogue boxes, standing still after a
+# collision, waiting for a battle transition), so there is no point running the object detector
+# on them again. This cache maps a hash of a downsampled copy of the 720x480 game view to the
+# detections that were found on it, evicting the least recently used entry once full.
+class detection_cache:
+    def __init__(self, padding, view_width=720, view_height=480, capacity=64, stride=4, quantise_bits=2):
+        self.padding = padding # Black bars added by get_screen, these never change so are ignored
+        self.view_width = view_width
+        self.view_height = view_height
+        self.capacity = capacity
+        self.stride = stride # Only every stride-th pixel in each axis is hashed
+        self.quantise_bits = quantise_bits # Low bits dropped so capture noise doesn't change the key
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, frame):
+        view = frame[self.padding:self.padding + self.view_height, :self.view_width]
+        small = np.ascontiguousarray(view[::self.stride, ::self.stride]) >> self.quantise_bits
+        return hashlib.md5(small.tobytes()).digest()
+
+    # Returns the cached value for this key, or None on a miss
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if (value == None):
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if (self.capacity <= 0):
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while (len(self.entries) > self.capacity):
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, \
+                "size": len(self.entries), "hit_rate": self.hits / lookups if lookups > 0 else 0.0}
@@ -0,0 +1,136 @@
+import numpy as np
+from frontier_tracker import indexed_heap
+from grid_search import move_steps
+
+infinity = float("inf")
+
+# D* Lite path planner (Koenig and Likhachev) towards a single goal. The search runs backwards from the
+# goal and its results (g/rhs values) are kept between calls, so when the player has moved a few tiles
+# and a couple of tiles have turned out to be blocked, plan() only repairs the part of the search that
+# depends on those tiles instead of searching the whole map again.
+#
+# Tiles are keyed by world coordinates so that the kept search stays valid when the map grows. Moving
+# into a tile costs 1 if it is walkable, tiles outside the map are never walkable.
+class dstar_lite:
+    def __init__(self, goal):
+        self.goal = (goal[0], goal[1])
+        self.g = {}
+        self.rhs = {self.goal: 0}
+        self.queue = indexed_heap()
+        self.km = 0 # Heuristic offset, grows as the start moves
+        self.last_start = None
+
+        # Walkable tiles as of the last plan(), used to find the tiles that have changed since
+        self.walkable = None
+        self.origin_x = 0
+        self.origin_y = 0
+
+        self.num_expanded = 0 # Tiles expanded by the last plan()
+
+    def heuristic(self, a, b):
+        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+    def is_walkable(self, tile):
+        x = tile[0] - self.origin_x
+        y = tile[1] - self.origin_y
+        if (x < 0 or y < 0 or y >= self.walkable.shape[0] or x >= self.walkable.shape[1]):
+            return False
+        return bool(self.walkable[y][x])
+
+    def neighbours(self, tile):
+        return [(tile[0] + dx, tile[1] + dy) for dx, dy in move_steps]
+
+    def calculate_key(self, tile):
+        best = min(self.g.get(tile, infinity), self.rhs.get(tile, infinity))
+        return (best + self.heuristic(self.start, tile) + self.km, best)
+
+    def update_vertex(self, tile):
+        if (tile != self.goal):
+            best = infinity
+            for neighbour in self.neighbours(tile):
+                if (self.is_walkable(neighbour)):
+                    best = min(best, 1 + self.g.get(neighbour, infinity))
+            self.rhs[tile] = best
+        self.queue.remove(tile)
+        if (self.g.get(tile, infinity) != self.rhs.get(tile, infinity)):
+            self.queue.push(tile, self.calculate_key(tile))
+
+    def top_key(self):
+        if (len(self.queue) == 0):
+            return (infinity, infinity)
+        return self.queue.heap[0][0]
+
+    def compute_shortest_path(self):
+        self.num_expanded = 0
+        while (self.top_key() < self.calculate_key(self.start) or \
+            self.rhs.get(self.start, infinity) != self.g.get(self.start, infinity)):
+            old_key, tile = self.queue.heap[0]
+            new_key = self.calculate_key(tile)
+            self.num_expanded += 1
+            if (old_key < new_key):
+                self.queue.push(tile, new_key)
+            elif (self.g.get(tile, infinity) > self.rhs.get(tile, infinity)):
+                self.g[tile] = self.rhs[tile]
+                self.queue.remove(tile)
+                for neighbour in self.neighbours(tile):
+                    self.update_vertex(neighbour)
+            else:
+                self.g[tile] = infinity
+                for neighbour in self.neighbours(tile) + [tile]:
+                    self.update_vertex(neighbour)
+
+    # Takes the new walkable map and repairs the search around every tile whose walkability changed
+    def update_map(self, walkable, origin_x, origin_y):
+        if (self.walkable is None):
+            self.walkable = walkable.copy()
+            self.origin_x = origin_x
+            self.origin_y = origin_y
+            return
+
+        # The map only ever grows, so the old map fits inside the new one
+        old_walkable = np.zeros(walkable.shape, dtype=bool)
+        x = self.origin_x - origin_x
+        y = self.origin_y - origin_y
+        old_walkable[y:y + self.walkable.shape[0], x:x + self.walkable.shape[1]] = self.walkable
+        ys, xs = np.nonzero(old_walkable != walkable)
+
+        self.walkable = walkable.copy()
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        # The cost of moving into a changed tile is different now, so all tiles next to it need updating
+        for changed_y, changed_x in zip(ys.tolist(), xs.tolist()):
+            for neighbour in self.neighbours((changed_x + origin_x, changed_y + origin_y)):
+                self.update_vertex(neighbour)
+
+    # walkable is the 2D bool map, origin_x/y the world position of its top_left tile and start the world
+    # position to plan from. Returns the list of moves to the goal or None if it can't be reached.
+    def plan(self, walkable, origin_x, origin_y, start):
+        self.start = (start[0], start[1])
+        if (self.last_start == None):
+            self.queue.push(self.goal, self.calculate_key(self.goal))
+        else:
+            self.km += self.heuristic(self.last_start, self.start)
+        self.last_start = self.start
+
+        self.update_map(walkable, origin_x, origin_y)
+        self.compute_shortest_path()
+
+        if (self.g.get(self.start, infinity) == infinity):
+            return None
+        # Following the lowest g values down to the goal
+        moves = []
+        tile = self.start
+        while (tile != self.goal):
+            if (len(moves) > self.g[self.start]): # Only possible if the search is inconsistent
+                return None
+            best_move = None
+            best_cost = infinity
+            for move, neighbour in enumerate(self.neighbours(tile)):
+                if (self.is_walkable(neighbour) and 1 + self.g.get(neighbour, infinity) < best_cost):
+                    best_move = move
+                    best_cost = 1 + self.g.get(neighbour, infinity)
+            if (best_move == None):
+                return None
+            moves.append(best_move)
+            tile = self.neighbours(tile)[best_move]
+        return moves
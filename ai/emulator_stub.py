@@ -0,0 +1,138 @@
+import threading
+import time
+import zmq
+from ram_telemetry import pack_ram_frame
+from input_script import button_bits, parse_script, pack_script_done
+from simulator import map_simulator, make_random_world, ram_directions
+
+# Stand-in for the patched VBA-rr, so that the controllers can be run and timed without the emulator.
+# It talks to them exactly like the emulator does (see vba-rerecording/src/win32/DirectInput.cpp and
+# Dialogs/ramwatch.cpp):
+#   - every frame the input code sends "check_move" on a REQ socket connected to port 5555 and waits
+#     1 ms for the single byte of buttons to press on that frame. If nothing comes back in time the
+#     request stays pending and the reply is picked up on a later frame. A longer reply is an input
+#     script (see input_script.py), played out over the next frames and acknowledged with "script_done".
+#   - every frame the RAM watch publishes the 6 watched values on port 5556, as a binary frame along with
+#     the frame count (see ram_telemetry.py)
+#
+# The game itself is a map_simulator. Like the real game, pressing a direction the player isn't facing
+# only turns them, taking turn_frames frames, and a step takes walk_frames frames during which any
+# other input is ignored. Buttons only count when they go down, holding them doesn't press them again.
+# fps 0 runs as fast as possible.
+
+direction_buttons = ["up", "right", "down", "left"] # By action
+
+class emulator_stub:
+    def __init__(self, sim=None, move_endpoint="tcp://localhost:5555", ram_endpoint="tcp://*:5556", fps=60, \
+        turn_frames=8, walk_frames=16):
+        if (sim == None):
+            sim = map_simulator(make_random_world(0))
+        self.sim = sim
+        self.fps = fps
+        self.turn_frames = turn_frames
+        self.walk_frames = walk_frames
+
+        self.context = zmq.Context()
+        self.move_socket = self.context.socket(zmq.REQ)
+        self.move_socket.setsockopt(zmq.RCVTIMEO, 1)
+        self.move_socket.setsockopt(zmq.LINGER, 0)
+        self.move_socket.connect(move_endpoint)
+        self.ram_socket = self.context.socket(zmq.PUB)
+        self.ram_socket.setsockopt(zmq.LINGER, 0)
+        self.ram_socket.bind(ram_endpoint)
+
+        self.frame_count = 0
+        self.busy_frames = 0 # Frames left of the current turn/step
+        self.last_buttons = 0
+        self.num_presses = 0
+        self.press_log = [] # (frame, buttons) of every press
+        # Input script being played out, [buttons, frames left] steps
+        self.script_id = None
+        self.script_steps = []
+        self.num_scripts = 0
+        self.reply_pending = False # Sent a request on move_socket that hasn't been replied to yet
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if (self.thread != None):
+            self.thread.join()
+        self.context.destroy(linger=0)
+
+    def run(self):
+        frame_time = 1.0 / self.fps if self.fps > 0 else 0.0
+        next_frame = time.perf_counter()
+        while (self.running == True):
+            self.run_frame(self.read_input())
+            self.frame_count += 1
+            if (frame_time > 0):
+                next_frame += frame_time
+                delay = next_frame - time.perf_counter()
+                if (delay > 0):
+                    time.sleep(delay)
+
+    # Sends request and waits 1 ms for the reply, same as DirectInput::requestAI. Nothing is sent while the
+    # reply to an earlier request is still pending, that reply is picked up instead. Returns None if no
+    # reply came in time.
+    def request(self, request):
+        if (self.reply_pending == False):
+            self.move_socket.send(request)
+            self.reply_pending = True
+        try:
+            reply = self.move_socket.recv()
+        except zmq.Again:
+            return None
+        self.reply_pending = False
+        return reply
+
+    # Buttons held down on this frame (0 if none), same as DirectInput::readAIButtons
+    def read_input(self):
+        if (self.script_id == None):
+            message = self.request(b"check_move")
+            if (message == None):
+                return 0
+            if (len(message) == 1):
+                return message[0]
+            self.script_id, steps = parse_script(message)
+            self.script_steps = [[buttons, frames] for buttons, frames in steps]
+            self.num_scripts += 1
+
+        while (len(self.script_steps) > 0 and self.script_steps[0][1] <= 0):
+            self.script_steps.pop(0)
+        if (len(self.script_steps) == 0):
+            self.request(pack_script_done(self.script_id)) # A late reply is picked up by the next check_move
+            self.script_id = None
+            return 0
+        self.script_steps[0][1] -= 1
+        return self.script_steps[0][0]
+
+    def run_frame(self, buttons):
+        if (self.busy_frames > 0):
+            self.busy_frames -= 1
+        pressed = buttons & ~self.last_buttons
+        self.last_buttons = buttons
+        if (pressed != 0):
+            self.num_presses += 1
+            self.press_log.append((self.frame_count, pressed))
+            if (self.busy_frames == 0):
+                self.press(pressed)
+        self.ram_socket.send(pack_ram_frame(self.frame_count, self.frame_count, self.sim.get_ram_vals()))
+
+    def press(self, buttons):
+        for action, name in enumerate(direction_buttons):
+            if (buttons & button_bits[name]):
+                if (self.sim.direction != ram_directions[action]):
+                    self.sim.direction = ram_directions[action]
+                    self.busy_frames = self.turn_frames
+                else:
+                    self.sim.perform_movement(action)
+                    self.busy_frames = self.walk_frames
+                return
+        if (buttons & button_bits["a"]):
+            self.sim.interact()
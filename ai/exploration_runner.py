@@ -0,0 +1,157 @@
+import sys
+import io
+import json
+import time
+import random
+import contextlib
+import multiprocessing
+import numpy as np
+
+from mapper import live_map
+from map_tiles import TILE, EMPTY
+from simulator import map_simulator, make_random_world, load_training_map, padding
+
+# Exploration regression suite. Runs many independent live_map + path_finder agents, each exploring its
+# own world in the headless simulator (see simulator.py), spread over a process pool, and reports how
+# well and how fast they explore. Meant to be run after every change to the mapper or the path finder
+# instead of judging it from a single emulator session.
+#
+# python exploration_runner.py [--seeds 16] [--steps 1000] [--workers 4] [--maps random,littleroot.DIB.png]
+#     [--save results.json] [--compare old_results.json]
+#
+# Every map in --maps is explored once per seed, "random" is a randomly generated town per seed (see
+# make_random_world), anything else is a picture in object_detection/training_maps.
+
+coverage_target = 0.9
+
+# Drives one agent through the simulator the same way poke_ai.run_step drives the emulator.
+# on_step(sim, mp) is called after every movement.
+def explore(sim, num_steps, on_step=None):
+    mp = live_map(720, 480, padding, sim.get_ram_vals())
+    map_grid, collision_type = mp.draw_map(None, sim.get_detections(), sim.get_ram_vals())
+    actions = mp.get_movelist()
+    action_index = -1
+    for i in range(num_steps):
+        action_index += 1
+        if (action_index >= len(actions)):
+            action_index = 0
+            actions = mp.get_movelist()
+            if (len(actions) == 0): # Nothing left to explore
+                break
+        key_pressed, ram_vals = sim.perform_movement(actions[action_index])
+        map_grid, collision_type = mp.draw_map(key_pressed, sim.get_detections(), ram_vals)
+
+        # Frontier has turned out to be an object
+        frontier_x, frontier_y = mp.pf.get_frontier_grid_pos()
+        if (map_grid[frontier_y][frontier_x][TILE] != EMPTY):
+            action_index = -1
+            actions = mp.get_movelist()
+        if (collision_type == "normal_collision"):
+            actions = mp.pf.frontier_path_collision_handler(map_grid, \
+                (mp.map_offset_x - mp.map_min_offset_x), (mp.map_offset_y - mp.map_min_offset_y))
+            if (actions == False): # Gave up on the frontier
+                actions = mp.get_movelist()
+            action_index = -1
+
+        if (on_step != None):
+            on_step(sim, mp)
+    return mp
+
+def make_world(map_name, seed):
+    if (map_name == "random"):
+        return make_random_world(seed)
+    return load_training_map(map_name)
+
+# Explores one world with one seed, run inside the pool's worker processes
+def run_job(job):
+    map_name, seed, num_steps = job
+    random.seed(seed) # path_finder picks between the best frontiers at random
+    world = make_world(map_name, seed)
+    sim = map_simulator(world, seed=seed, box_noise=8)
+
+    coverage = []
+    frontiers = []
+    def on_step(sim, mp):
+        coverage.append(sim.coverage())
+        frontiers.append(mp.pf.next_frontier[1:])
+
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # path_finder prints every decision
+        explore(sim, num_steps, on_step)
+    total_time = time.perf_counter() - start_time
+
+    # Steps until the target coverage was reached, None if it never was
+    reached = np.nonzero(np.array(coverage) >= coverage_target)[0]
+    num_switches = sum(1 for i in range(1, len(frontiers)) if frontiers[i] != frontiers[i - 1])
+    return {"map": map_name, "seed": seed, "steps": sim.num_steps, "collisions": sim.num_collisions, \
+        "frontier_switches": num_switches, "coverage": coverage[-1] if len(coverage) > 0 else sim.coverage(), \
+        "steps_to_target": int(reached[0]) + 1 if len(reached) > 0 else None, \
+        "ms_per_step": total_time / max(sim.num_steps, 1) * 1000, "coverage_per_step": coverage}
+
+# Runs every map with every seed, on num_workers processes (in this process if num_workers is 1)
+def run_all(map_names, seeds, num_steps, num_workers):
+    jobs = [(map_name, seed, num_steps) for map_name in map_names for seed in seeds]
+    if (num_workers == 1):
+        return [run_job(job) for job in jobs]
+    with multiprocessing.Pool(num_workers) as pool:
+        return pool.map(run_job, jobs, chunksize=1)
+
+# Per map averages over all seeds
+def summarise(results):
+    summary = {}
+    for map_name in sorted(set(result["map"] for result in results)):
+        runs = [result for result in results if result["map"] == map_name]
+        reached = [run["steps_to_target"] for run in runs if run["steps_to_target"] != None]
+        summary[map_name] = {
+            "runs": len(runs),
+            "coverage": float(np.mean([run["coverage"] for run in runs])),
+            "reached_target": len(reached),
+            "steps_to_target": float(np.median(reached)) if len(reached) > 0 else None,
+            "collisions": float(np.mean([run["collisions"] for run in runs])),
+            "frontier_switches": float(np.mean([run["frontier_switches"] for run in runs])),
+            "ms_per_step": float(np.mean([run["ms_per_step"] for run in runs])),
+        }
+    return summary
+
+def print_summary(summary, old_summary=None):
+    print(f"{'map':<22}{'runs':>6}{'coverage':>10}{'>=90%':>7}{'steps to 90%':>14}{'collisions':>12}" + \
+        f"{'switches':>10}{'ms/step':>9}")
+    for map_name, row in summary.items():
+        steps_to_target = f"{row['steps_to_target']:.0f}" if row["steps_to_target"] != None else "-"
+        print(f"{map_name:<22}{row['runs']:>6}{row['coverage'] * 100:>9.1f}%{row['reached_target']:>7}" + \
+            f"{steps_to_target:>14}{row['collisions']:>12.1f}{row['frontier_switches']:>10.1f}{row['ms_per_step']:>9.2f}")
+        if (old_summary != None and map_name in old_summary):
+            old_row = old_summary[map_name]
+            old_steps = f"{old_row['steps_to_target']:.0f}" if old_row["steps_to_target"] != None else "-"
+            print(f"{'  before':<22}{old_row['runs']:>6}{old_row['coverage'] * 100:>9.1f}%{old_row['reached_target']:>7}" + \
+                f"{old_steps:>14}{old_row['collisions']:>12.1f}{old_row['frontier_switches']:>10.1f}" + \
+                f"{old_row['ms_per_step']:>9.2f}")
+
+def get_arg(name, default):
+    if (name in sys.argv):
+        return sys.argv[sys.argv.index(name) + 1]
+    return default
+
+if __name__ == "__main__":
+    num_seeds = int(get_arg("--seeds", 16))
+    num_steps = int(get_arg("--steps", 1000))
+    num_workers = int(get_arg("--workers", multiprocessing.cpu_count()))
+    map_names = get_arg("--maps", "random").split(",")
+    save_path = get_arg("--save", None)
+    compare_path = get_arg("--compare", None)
+
+    start_time = time.perf_counter()
+    results = run_all(map_names, range(num_seeds), num_steps, num_workers)
+    total_time = time.perf_counter() - start_time
+    summary = summarise(results)
+
+    old_summary = None
+    if (compare_path != None):
+        with open(compare_path) as f:
+            old_summary = json.load(f)["summary"]
+    print_summary(summary, old_summary)
+    print(f"{len(results)} runs on {num_workers} workers in {total_time:.1f}s")
+
+    if (save_path != None):
+        with open(save_path, "w") as f:
+            json.dump({"summary": summary, "results": results}, f)
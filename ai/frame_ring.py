@@ -0,0 +1,212 @@
+import os
+import mmap
+import threading
+import tempfile
+import tracemalloc
+import numpy as np
+import cv2
+
+# Ring of preallocated frame buffers in shared memory, so a captured frame is written exactly once and
+# read by inference (in this process or another one) without the copies poke_ai.get_screen and the
+# RetinaNet preprocessing used to make of every frame (alpha channel sliced off, padded with
+# copyMakeBorder, converted to float, resized).
+#
+# Every slot holds:
+#   frames    the padded square frame (uint8), the capture is copied straight into its middle band and
+#             the padding is blanked in place
+#   small     the frame resized to the model's input size (uint8)
+#   tensors   the model input (float32), the resized frame with the ImageNet mean subtracted, as
+#             keras_retinanet's preprocess_image does
+# Resizing before converting to float rounds every pixel to a whole grey level, so the model input ends up
+# within a grey level of what preprocess_image followed by resize_image gives.
+#
+# The header (all int64) holds num_slots, frame_side, input_side, the number of frames written, the slot of
+# the latest frame and then every slot's sequence number, -1 while the slot is being written. A reader opens
+# the ring with the same name and sizes and create=False.
+#
+# Slots are reused in turn, so a frame is only good until the ring comes back around to its slot. Readers in
+# this process that hold on to frames for longer (the pipeline's queues and inference) claim them when they
+# are written and release them when done, and writing skips claimed slots, waiting for one to be released if
+# they all are.
+#
+# Shared memory is a named mapping on Windows and a file in /dev/shm elsewhere, multiprocessing's
+# shared_memory needs Python 3.8.
+
+imagenet_mean_scalar = (103.939, 116.779, 123.68, 0.0) # BGR, keras_retinanet's caffe mode
+header_fields = 5
+
+def open_shared_buffer(name, size, create=True):
+    if (os.name == "nt"):
+        return mmap.mmap(-1, size, tagname=name)
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    with open(os.path.join(directory, name), "w+b" if create else "r+b") as f:
+        if (create == True):
+            f.truncate(size)
+        return mmap.mmap(f.fileno(), size)
+
+class frame_ring:
+    def __init__(self, num_slots=8, game_width=720, game_height=480, input_side=400, name="poke_ai_frames", \
+        create=True):
+        self.num_slots = num_slots
+        self.game_width = game_width
+        self.game_height = game_height
+        self.frame_side = max(game_width, game_height)
+        self.input_side = input_side
+        self.scale = input_side / self.frame_side # Same as resize_image's scale for a square frame
+        # Where the capture goes inside the padded frame, same padding as poke_ai.get_screen
+        self.top = (self.frame_side - game_height) // 2
+        self.left = (self.frame_side - game_width) // 2
+        self.padding = max(self.top, self.left)
+        self.name = name
+        self.create = create
+        self.claims = [0] * num_slots # Claims on every slot, only from this process
+        self.cond = threading.Condition() # Guards the claims and writes from more than one thread
+
+        frame_size = self.frame_side * self.frame_side * 3
+        small_size = input_side * input_side * 3
+        tensor_size = small_size * 4
+        header_size = (header_fields + num_slots) * 8
+        self.buffer = open_shared_buffer(name, header_size + num_slots * (frame_size + small_size + tensor_size), \
+            create)
+
+        self.header = np.frombuffer(self.buffer, dtype=np.int64, count=header_fields + num_slots)
+        self.seqs = self.header[header_fields:]
+        offset = header_size
+        self.frames = np.frombuffer(self.buffer, dtype=np.uint8, count=num_slots * frame_size, offset=offset) \
+            .reshape((num_slots, self.frame_side, self.frame_side, 3))
+        offset += num_slots * frame_size
+        self.small = np.frombuffer(self.buffer, dtype=np.uint8, count=num_slots * small_size, offset=offset) \
+            .reshape((num_slots, input_side, input_side, 3))
+        offset += num_slots * small_size
+        self.tensors = np.frombuffer(self.buffer, dtype=np.float32, count=num_slots * small_size, offset=offset) \
+            .reshape((num_slots, input_side, input_side, 3))
+
+        if (create == True):
+            self.header[:header_fields] = [num_slots, self.frame_side, input_side, 0, -1]
+            self.seqs[:] = -1
+            self.frames[:] = 0
+        elif (list(self.header[:3]) != [num_slots, self.frame_side, input_side]):
+            raise ValueError(f"Frame ring {name} has {list(self.header[:3])} slots/frame side/input side, " + \
+                f"expected {[num_slots, self.frame_side, input_side]}")
+
+    def close(self):
+        self.header = self.seqs = self.frames = self.small = self.tensors = None
+        try:
+            self.buffer.close()
+        except BufferError: # Someone still holds a view on a slot, the mapping goes when they're done
+            pass
+        if (self.create == True and os.name != "nt"):
+            directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            try:
+                os.remove(os.path.join(directory, self.name))
+            except OSError:
+                pass
+
+    @property
+    def num_written(self):
+        return int(self.header[3])
+
+    # Copies a captured frame (BGRA as mss grabs it, or BGR) into the next unclaimed slot, preprocesses it
+    # for the model and returns the slot. With claim the slot is claimed for the caller, who has to
+    # release() it. Nothing is allocated on the way.
+    def write(self, capture, claim=False):
+        with self.cond:
+            self.cond.wait_for(lambda: min(self.claims) == 0)
+            slot = self.num_written % self.num_slots
+            while (self.claims[slot] > 0):
+                slot = (slot + 1) % self.num_slots
+            self.write_slot(slot, capture)
+            if (claim == True):
+                self.claims[slot] += 1
+            return slot
+
+    def write_slot(self, slot, capture):
+        self.seqs[slot] = -1
+        frame = self.frames[slot]
+        # Anything drawn on the slot's last frame (detection boxes) may have spilled into the padding
+        if (self.top > 0):
+            frame[:self.top] = 0
+            frame[self.top + self.game_height:] = 0
+        if (self.left > 0):
+            frame[:, :self.left] = 0
+            frame[:, self.left + self.game_width:] = 0
+        np.copyto(frame[self.top:self.top + self.game_height, self.left:self.left + self.game_width], capture[:, :, :3])
+
+        cv2.resize(frame, (self.input_side, self.input_side), dst=self.small[slot], interpolation=cv2.INTER_LINEAR)
+        # OpenCV converts and subtracts in one pass without the buffers numpy allocates for broadcasting
+        cv2.subtract(self.small[slot], imagenet_mean_scalar, dst=self.tensors[slot], dtype=cv2.CV_32F)
+
+        self.seqs[slot] = self.num_written
+        self.header[4] = slot
+        self.header[3] += 1
+
+    # mss screenshots are BGRA bytes, viewed here without a copy
+    def write_screenshot(self, shot, claim=False):
+        return self.write(np.frombuffer(shot.raw, dtype=np.uint8).reshape((shot.height, shot.width, 4)), claim)
+
+    def release(self, slot):
+        with self.cond:
+            self.claims[slot] = max(0, self.claims[slot] - 1)
+            self.cond.notify_all()
+
+    # Releases the slot frame is a view on, if it is one of the ring's
+    def release_frame(self, frame):
+        slot = self.find_slot(frame)
+        if (slot != None):
+            self.release(slot)
+
+    # Latest complete slot and its sequence number, (None, -1) before the first frame
+    def latest(self):
+        if (self.num_written == 0):
+            return None, -1
+        slot = int(self.header[4])
+        return slot, int(self.seqs[slot])
+
+    # Whether slot still holds frame seq, for readers to check that it wasn't overwritten while they read it
+    def is_current(self, slot, seq):
+        return seq >= 0 and int(self.seqs[slot]) == seq
+
+    # Slot whose frame array is frame (a view returned by frames[slot]), None if it isn't one of the ring's
+    def find_slot(self, frame):
+        if (not isinstance(frame, np.ndarray) or frame.shape != self.frames.shape[1:]):
+            return None
+        address = frame.__array_interface__["data"][0]
+        for slot in range(self.num_slots):
+            if (self.frames[slot].__array_interface__["data"][0] == address):
+                return slot
+        return None
+
+
+# Python memory allocated while running a step (numpy and OpenCV arrays included, both allocate through
+# Python's allocator), using tracemalloc. Slows everything down while it is on, so it is only meant for
+# measuring.
+class allocation_tracker:
+    def __init__(self):
+        self.num_steps = 0
+        self.total_bytes = 0
+        self.max_bytes = 0
+        self.last_bytes = 0
+        self.last_blocks = 0
+
+    def start_step(self):
+        if (not tracemalloc.is_tracing()):
+            tracemalloc.start()
+        tracemalloc.clear_traces() # Also resets the peak
+
+    # Peak memory allocated since start_step, and the number of blocks still alive
+    def end_step(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self.last_blocks = len(tracemalloc.take_snapshot().traces)
+        self.last_bytes = peak
+        self.total_bytes += peak
+        self.max_bytes = max(self.max_bytes, peak)
+        self.num_steps += 1
+        return peak
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def summary(self):
+        mean_bytes = self.total_bytes / self.num_steps if self.num_steps > 0 else 0.0
+        return {"steps": self.num_steps, "mean_kb": mean_bytes / 1024, "max_kb": self.max_bytes / 1024, \
+            "last_kb": self.last_bytes / 1024, "last_live_blocks": self.last_blocks}
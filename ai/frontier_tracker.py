@@ -0,0 +1,129 @@
+import heapq as pq
+
+# Binary min heap where every entry has a key, so that an entry's priority can be changed (in either
+# direction) or the entry removed in O(log n) without searching the heap for it.
+class indexed_heap:
+    def __init__(self):
+        self.heap = [] # [priority, key] pairs
+        self.positions = {} # key -> index of its entry in heap
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    # Adds key, or changes its priority if it is already in the heap
+    def push(self, key, priority):
+        pos = self.positions.get(key)
+        if (pos == None):
+            self.heap.append([priority, key])
+            self.positions[key] = len(self.heap) - 1
+            self.sift_up(len(self.heap) - 1)
+        else:
+            old_priority = self.heap[pos][0]
+            self.heap[pos][0] = priority
+            if (priority < old_priority):
+                self.sift_up(pos)
+            else:
+                self.sift_down(pos)
+
+    def remove(self, key):
+        pos = self.positions.pop(key, None)
+        if (pos == None):
+            return
+        last = self.heap.pop()
+        if (pos == len(self.heap)): # Removed the last entry
+            return
+        old_priority = self.heap[pos][0]
+        self.heap[pos] = last
+        self.positions[last[1]] = pos
+        if (last[0] < old_priority):
+            self.sift_up(pos)
+        else:
+            self.sift_down(pos)
+
+    def get(self, key):
+        return self.heap[self.positions[key]][0]
+
+    # The n entries with the lowest priorities as (priority, key), lowest first. Only looks at the top of
+    # the heap so this is O(n log n) no matter how big the heap is.
+    def smallest(self, n):
+        output = []
+        candidates = [(self.heap[0][0], 0)] if len(self.heap) > 0 else []
+        while (len(candidates) > 0 and len(output) < n):
+            priority, pos = pq.heappop(candidates)
+            output.append((priority, self.heap[pos][1]))
+            for child in (2 * pos + 1, 2 * pos + 2):
+                if (child < len(self.heap)):
+                    pq.heappush(candidates, (self.heap[child][0], child))
+        return output
+
+    def swap(self, i, j):
+        self.heap[i], self.heap[j] = self.heap[j], self.heap[i]
+        self.positions[self.heap[i][1]] = i
+        self.positions[self.heap[j][1]] = j
+
+    def sift_up(self, pos):
+        while (pos > 0):
+            parent = (pos - 1) // 2
+            if (self.heap[pos][0] < self.heap[parent][0]):
+                self.swap(pos, parent)
+                pos = parent
+            else:
+                break
+
+    def sift_down(self, pos):
+        size = len(self.heap)
+        while True:
+            smallest = pos
+            for child in (2 * pos + 1, 2 * pos + 2):
+                if (child < size and self.heap[child][0] < self.heap[smallest][0]):
+                    smallest = child
+            if (smallest == pos):
+                break
+            self.swap(pos, smallest)
+            pos = smallest
+
+
+# Keeps the scored frontiers of the map between calls to get_next_frontier. The mapper reports every area
+# (in world coordinates) whose tiles it changed, and only the tiles in and around those areas are
+# rescored, instead of searching and scoring the whole map each time a new frontier is needed.
+class frontier_tracker:
+    def __init__(self):
+        self.heap = indexed_heap() # (x, y) in world coordinates -> (-score, x, y)
+        self.changed_areas = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def mark_changed(self, area):
+        self.changed_areas.append(area)
+
+    # Areas of the map grid, as (x1, y1, x2, y2) inclusive, with the tiles that have to be rescored: the
+    # changed tiles and the ones next to them (their scores depend on the changed tiles). Each area is
+    # rescored on its own, so that two small changes far apart don't turn into one window over the whole map.
+    def take_changed(self, shape, origin_x, origin_y):
+        areas = []
+        for area in self.changed_areas:
+            x1 = max(area[0] - origin_x - 1, 0)
+            y1 = max(area[1] - origin_y - 1, 0)
+            x2 = min(area[2] - origin_x + 1, shape[1] - 1)
+            y2 = min(area[3] - origin_y + 1, shape[0] - 1)
+            if (x1 <= x2 and y1 <= y2 and not ((x1, y1, x2, y2) in areas)):
+                areas.append((x1, y1, x2, y2))
+        self.changed_areas = []
+        return areas
+
+    def update(self, key, score, is_frontier):
+        if (is_frontier == True):
+            self.heap.push(key, (-score, key[0], key[1]))
+        else:
+            self.heap.remove(key)
+
+    def remove(self, key):
+        self.heap.remove(key)
+
+    # Up to n of the best frontiers as [-score, x, y], best first
+    def best(self, n):
+        return [list(priority) for priority, key in self.heap.smallest(n)]
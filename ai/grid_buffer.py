@@ -0,0 +1,55 @@
+import numpy as np
+
+# Backing storage for a 2D map that keeps growing by a row or column at a time in any of the 4
+# directions. np.append-ing to a plain array copies the whole map on every growth step, so this
+# keeps some spare capacity around the map instead and only reallocates (doubling the capacity)
+# once that runs out. Growth is O(1) amortised and the data never moves relative to the world.
+class grid_buffer:
+    def __init__(self, height, width, channels, dtype=np.uint8):
+        self.height = height
+        self.width = width
+        self.channels = channels
+        self.dtype = dtype
+
+        self.data = np.zeros((height * 2, width * 2, channels), dtype=dtype)
+        # Position of the map's top_left tile inside the backing array
+        self.top = height // 2
+        self.left = width // 2
+
+    # The map itself, as a view into the backing array. Writes to it go straight into the buffer,
+    # but the view has to be fetched again after grow() in case the buffer was reallocated.
+    def view(self):
+        return self.data[self.top:self.top + self.height, self.left:self.left + self.width]
+
+    def grow(self, up=0, right=0, down=0, left=0):
+        new_height = self.height + up + down
+        new_width = self.width + left + right
+
+        if (up > self.top or left > self.left or \
+            self.top + self.height + down > self.data.shape[0] or \
+            self.left + self.width + right > self.data.shape[1]):
+            self.reallocate(new_height, new_width, up, left)
+
+        # Tiles outside the map are never written to, so the newly exposed rows/columns are still zero
+        self.top -= up
+        self.left -= left
+        self.height = new_height
+        self.width = new_width
+
+    def reallocate(self, new_height, new_width, up, left):
+        capacity_y = max(self.data.shape[0], new_height)
+        if (new_height > self.data.shape[0] // 2):
+            capacity_y = max(self.data.shape[0] * 2, new_height * 2)
+        capacity_x = max(self.data.shape[1], new_width)
+        if (new_width > self.data.shape[1] // 2):
+            capacity_x = max(self.data.shape[1] * 2, new_width * 2)
+
+        new_data = np.zeros((capacity_y, capacity_x, self.channels), dtype=self.dtype)
+        # Centre the grown map so there is room to grow further in every direction
+        new_top = (capacity_y - new_height) // 2 + up
+        new_left = (capacity_x - new_width) // 2 + left
+        new_data[new_top:new_top + self.height, new_left:new_left + self.width] = self.view()
+
+        self.data = new_data
+        self.top = new_top
+        self.left = new_left
@@ -0,0 +1,117 @@
+import numpy as np
+import heapq as pq
+from collections import deque
+
+# Moves in the order they are tried, using the controller's encoding: 0 up, 1 right, 2 down, 3 left
+move_steps = [(0, -1), (1, 0), (0, 1), (-1, 0)]
+
+# Shortest path search over a 2D grid of walkable tiles. Instead of carrying a copy of the move list
+# around for every tile in the search, each reached tile only records the move that was used to get
+# to it (in a preallocated array that is reused between searches). The move list is then rebuilt
+# once by walking back from the goal.
+#
+# Breadth first search expands the tiles in the same order as the old level-by-level search, so it
+# returns exactly the same moves. A* (Manhattan distance heuristic) also returns a shortest path but
+# usually reaches the goal after looking at far fewer tiles.
+class grid_search:
+    def __init__(self):
+        self.parent_moves = np.empty(0, dtype=np.int8) # Move used to reach each tile, -1 if not reached
+        self.costs = np.empty(0, dtype=np.int32) # Moves from the start, only used by A*
+        self.num_expanded = 0 # Tiles taken off the queue by the last search
+
+    def reset(self, size):
+        if (self.parent_moves.shape[0] < size):
+            self.parent_moves = np.empty(size, dtype=np.int8)
+            self.costs = np.empty(size, dtype=np.int32)
+        self.parent_moves[:size] = -1
+
+    # walkable is a 2D bool array, start and goal are [x, y]. The start tile doesn't need to be walkable.
+    # Returns the list of moves from start to goal, or None if the goal can't be reached.
+    def find_path(self, walkable, start, goal, use_astar=False):
+        if (list(start) == list(goal)):
+            return []
+        height, width = walkable.shape
+        if (goal[0] < 0 or goal[0] >= width or goal[1] < 0 or goal[1] >= height or not walkable[goal[1], goal[0]]):
+            return None
+
+        self.reset(width * height)
+        walkable = walkable.ravel()
+        start_index = start[1] * width + start[0]
+        goal_index = goal[1] * width + goal[0]
+        self.parent_moves[start_index] = 4 # Anything but -1, never read back
+
+        if (use_astar == True):
+            found = self.astar(walkable, width, height, start_index, goal_index)
+        else:
+            found = self.bfs(walkable, width, height, start_index, goal_index)
+        if (found == False):
+            return None
+        return self.build_path(width, start_index, goal_index)
+
+    def bfs(self, walkable, width, height, start_index, goal_index):
+        parent_moves = self.parent_moves
+        queue = deque([start_index])
+        self.num_expanded = 0
+        while (len(queue) > 0):
+            index = queue.popleft()
+            self.num_expanded += 1
+            if (index == goal_index):
+                return True
+            y, x = divmod(index, width)
+            for move, (dx, dy) in enumerate(move_steps):
+                new_x = x + dx
+                new_y = y + dy
+                if (new_x < 0 or new_x >= width or new_y < 0 or new_y >= height):
+                    continue
+                new_index = new_y * width + new_x
+                if (parent_moves[new_index] == -1 and walkable[new_index]):
+                    parent_moves[new_index] = move
+                    queue.append(new_index)
+        return False
+
+    def astar(self, walkable, width, height, start_index, goal_index):
+        parent_moves = self.parent_moves
+        costs = self.costs
+        goal_y, goal_x = divmod(goal_index, width)
+        start_y, start_x = divmod(start_index, width)
+        costs[start_index] = 0
+        # Entries are (estimated total cost, insertion count, tile), the count keeps ties first in first out
+        heap = [(abs(goal_x - start_x) + abs(goal_y - start_y), 0, start_index)]
+        count = 1
+        closed = set()
+        self.num_expanded = 0
+        while (len(heap) > 0):
+            estimate, order, index = pq.heappop(heap)
+            if (index in closed):
+                continue
+            closed.add(index)
+            self.num_expanded += 1
+            if (index == goal_index):
+                return True
+            y, x = divmod(index, width)
+            new_cost = costs[index] + 1
+            for move, (dx, dy) in enumerate(move_steps):
+                new_x = x + dx
+                new_y = y + dy
+                if (new_x < 0 or new_x >= width or new_y < 0 or new_y >= height):
+                    continue
+                new_index = new_y * width + new_x
+                if (not walkable[new_index] or new_index in closed):
+                    continue
+                if (parent_moves[new_index] == -1 or new_cost < costs[new_index]):
+                    parent_moves[new_index] = move
+                    costs[new_index] = new_cost
+                    pq.heappush(heap, (new_cost + abs(goal_x - new_x) + abs(goal_y - new_y), count, new_index))
+                    count += 1
+        return False
+
+    def build_path(self, width, start_index, goal_index):
+        moves = []
+        index = goal_index
+        while (index != start_index):
+            move = int(self.parent_moves[index])
+            moves.append(move)
+            dx, dy = move_steps[move]
+            index -= dy * width + dx
+        moves.reverse()
+        return moves
@@ -0,0 +1,203 @@
+import os
+import sys
+import time
+import struct
+import tempfile
+import threading
+import numpy as np
+import zmq
+from pipeline import stage_timer
+
+# Detection model server, so that several agents (poke_ai processes, or the agents of a fleet) share a
+# single copy of the model and have their frames inferenced together in batches instead of one at a time.
+#
+# Clients send frames to a ROUTER socket. The server waits for frames until it either has max_batch_size
+# of them or the oldest one has been waiting max_latency seconds, runs them through the detector's
+# detect_batch as one batch and sends every client the detections for its own frame.
+#
+# Messages, little endian:
+#   request   header: request id (u32), height (u32), width (u32), channels (u32), then the frame's bytes
+#             (uint8, height x width x channels)
+#   reply     header: request id (u32), status (u32, 0 ok), number of detections (u32), then the boxes
+#             (float32, n x 4), scores (float32, n) and labels (int32, n), or an error message if the
+#             status isn't 0
+#
+# python inference_server.py [endpoint] [--max-batch 8] [--max-latency 0.02]
+
+default_endpoint = "ipc://" + os.path.join(tempfile.gettempdir(), "poke_ai", "inference").replace("\\", "/")
+request_format = "<IIII"
+reply_format = "<III"
+status_ok = 0
+status_error = 1
+
+class inference_server:
+    # detector is anything with a detect_batch(frames) returning (boxes, scores, labels) for every frame,
+    # standalone_backend.shared_detector for the RetinaNet model
+    def __init__(self, detector, endpoint=default_endpoint, max_batch_size=8, max_latency=0.02):
+        self.detector = detector
+        self.endpoint = endpoint
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        if (endpoint.startswith("ipc://")):
+            os.makedirs(os.path.dirname(endpoint[len("ipc://"):]), exist_ok=True)
+
+        self.batch_sizes = [0] * (max_batch_size + 1) # Number of batches of every size
+        # Queue wait is from the server reading a frame off the socket to its batch starting, frames still
+        # in the socket while a batch runs aren't counted
+        self.timers = {"queue_wait": stage_timer("queue_wait"), "inference": stage_timer("inference")}
+        self.num_requests = 0
+        self.num_rejected = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if (self.thread != None):
+            self.thread.join()
+
+    def run(self):
+        context = zmq.Context()
+        socket = context.socket(zmq.ROUTER)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.bind(self.endpoint)
+        poller = zmq.Poller()
+        poller.register(socket, zmq.POLLIN)
+        pending = [] # (client, request id, frame, receive time)
+        try:
+            while (self.running == True):
+                if (len(pending) == 0):
+                    timeout = 100 # Wakes up now and then to check for stop()
+                else:
+                    timeout = max(0.0, pending[0][3] + self.max_latency - time.perf_counter()) * 1000
+                if (len(poller.poll(timeout)) > 0):
+                    # Take everything that has arrived, up to a full batch
+                    while (len(pending) < self.max_batch_size):
+                        try:
+                            message = socket.recv_multipart(zmq.NOBLOCK, copy=False)
+                        except zmq.Again:
+                            break
+                        request = self.parse_request(message)
+                        if (request != None):
+                            pending.append(request)
+
+                if (len(pending) > 0 and (len(pending) >= self.max_batch_size or \
+                    time.perf_counter() >= pending[0][3] + self.max_latency)):
+                    self.run_batch(socket, pending[:self.max_batch_size])
+                    pending = pending[self.max_batch_size:]
+        finally:
+            socket.close()
+            context.term()
+
+    # Returns (client, request id, frame, receive time), or None for a malformed request
+    def parse_request(self, message):
+        receive_time = time.perf_counter()
+        if (len(message) != 3 or len(message[1].bytes) != struct.calcsize(request_format)):
+            self.num_rejected += 1
+            return None
+        request_id, height, width, channels = struct.unpack(request_format, message[1].bytes)
+        if (len(message[2].buffer) != height * width * channels):
+            self.num_rejected += 1
+            return None
+        frame = np.frombuffer(message[2].buffer, dtype=np.uint8).reshape((height, width, channels))
+        return message[0].bytes, request_id, frame, receive_time
+
+    def run_batch(self, socket, batch):
+        start_time = time.perf_counter()
+        for client, request_id, frame, receive_time in batch:
+            self.timers["queue_wait"].add(start_time - receive_time)
+        self.batch_sizes[len(batch)] += 1
+        self.num_requests += len(batch)
+
+        try:
+            results = self.detector.detect_batch([frame for client, request_id, frame, receive_time in batch])
+        except Exception as e:
+            for client, request_id, frame, receive_time in batch:
+                socket.send_multipart([client, struct.pack(reply_format, request_id, status_error, 0), \
+                    repr(e).encode("utf-8")])
+            return
+        self.timers["inference"].add(time.perf_counter() - start_time)
+
+        for (client, request_id, frame, receive_time), (boxes, scores, labels) in zip(batch, results):
+            socket.send_multipart([client, struct.pack(reply_format, request_id, status_ok, len(scores)), \
+                np.ascontiguousarray(boxes, dtype=np.float32), np.ascontiguousarray(scores, dtype=np.float32), \
+                np.ascontiguousarray(labels, dtype=np.int32)], copy=False)
+
+    def stats(self):
+        num_batches = sum(self.batch_sizes)
+        output = {name: timer.summary() for name, timer in self.timers.items()}
+        output["requests"] = self.num_requests
+        output["rejected"] = self.num_rejected
+        output["batches"] = num_batches
+        output["mean_batch_size"] = self.num_requests / num_batches if num_batches > 0 else 0.0
+        output["batch_sizes"] = {size: count for size, count in enumerate(self.batch_sizes) if count > 0}
+        return output
+
+
+# Client side, with the same detect() as shared_detector so poke_ai can use either. A client must only be
+# used from one thread at a time, every agent should have its own.
+class inference_client:
+    def __init__(self, endpoint=default_endpoint, timeout=5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.context = zmq.Context.instance()
+        self.socket = self.context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(endpoint)
+        self.request_id = 0
+        self.num_calls = 0
+
+    def close(self):
+        self.socket.close()
+
+    # Returns (boxes, scores, labels) for a single uint8 frame, raises TimeoutError if the server doesn't
+    # answer within timeout seconds
+    def detect(self, frame):
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if (frame.ndim == 2):
+            frame = frame[:, :, np.newaxis]
+        self.request_id = (self.request_id + 1) & 0xffffffff
+        self.num_calls += 1
+        self.socket.send_multipart([struct.pack(request_format, self.request_id, *frame.shape), frame], copy=False)
+
+        deadline = time.perf_counter() + self.timeout
+        while True:
+            wait_time = deadline - time.perf_counter()
+            if (wait_time <= 0 or self.socket.poll(int(wait_time * 1000) + 1) == 0):
+                raise TimeoutError(f"No detections from the inference server at {self.endpoint}")
+            message = self.socket.recv_multipart()
+            request_id, status, num_detections = struct.unpack(reply_format, message[0])
+            if (request_id != self.request_id): # Reply to a request that timed out earlier
+                continue
+            if (status != status_ok):
+                raise RuntimeError(f"Inference server failed: {message[1].decode('utf-8')}")
+            boxes = np.frombuffer(message[1], dtype=np.float32).reshape((num_detections, 4))
+            scores = np.frombuffer(message[2], dtype=np.float32)
+            labels = np.frombuffer(message[3], dtype=np.int32)
+            return boxes, scores, labels
+
+def get_arg(name, default):
+    if (name in sys.argv):
+        return sys.argv[sys.argv.index(name) + 1]
+    return default
+
+if __name__ == "__main__":
+    from standalone_backend import shared_detector
+    model_path = "../object_detection/keras-retinanet/inference_graphs/map_detector.h5"
+    endpoint = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].startswith("--") else default_endpoint
+    server = inference_server(shared_detector(model_path), endpoint, int(get_arg("--max-batch", 8)), \
+        float(get_arg("--max-latency", 0.02)))
+    server.start()
+    print(f"Serving detections on {endpoint}")
+    try:
+        while True:
+            time.sleep(30)
+            print(server.stats())
+    except KeyboardInterrupt:
+        pass
+    server.stop()
+    print(server.stats())
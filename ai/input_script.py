@@ -0,0 +1,94 @@
+import struct
+
+# Input scripts let the controller hand the emulator a whole sequence of button presses in one reply,
+# instead of one round trip (and a sleep) per press. The emulator plays the script out frame by frame
+# (DirectInput::readAIButtons in vba-rerecording/src/win32/DirectInput.cpp) and acknowledges it once it
+# is over by sending "script_done" and the script's id in place of its next "check_move" request.
+#
+# A script is a list of steps, each one a set of buttons held for a number of frames (no buttons to wait).
+# Wire format, little endian:
+#   version (u8), reserved (u8), id (u16), number of steps (u16)
+#   then for every step: buttons (u8), frames (u16)
+# A reply of a single byte is still a press of those buttons for one frame.
+
+input_script_version = 1
+header_format = "<BBHH"
+step_format = "<BH"
+max_steps = 256
+script_done_prefix = b"script_done"
+
+# Button bits, as read by DirectInput::readDevice
+button_bits = {"up": 0b01000000, "right": 0b00100000, "down": 0b00010000, "left": 0b00001000, \
+    "a": 0b00000100, "b": 0b00000010}
+# Buttons for the controller's actions (0 up, 1 right, 2 down, 3 left, 4 interact)
+action_button_names = ["up", "right", "down", "left", "a"]
+
+class input_script:
+    # hold_frames and release_frames are the defaults for press(), how long a button is held down and how
+    # long to wait after letting go of it before the next press
+    def __init__(self, hold_frames=2, release_frames=6):
+        self.hold_frames = hold_frames
+        self.release_frames = release_frames
+        self.steps = [] # [buttons, frames]
+
+    def __len__(self):
+        return len(self.steps)
+
+    # Presses the named buttons (or a single name) together
+    def press(self, buttons, hold_frames=None, release_frames=None):
+        if (isinstance(buttons, str)):
+            buttons = [buttons]
+        bits = 0
+        for name in buttons:
+            bits |= button_bits[name]
+        self.add_step(bits, self.hold_frames if hold_frames == None else hold_frames)
+        self.wait(self.release_frames if release_frames == None else release_frames)
+        return self
+
+    def press_action(self, action, hold_frames=None, release_frames=None):
+        return self.press(action_button_names[action], hold_frames, release_frames)
+
+    def wait(self, frames):
+        return self.add_step(0, frames)
+
+    def add_step(self, bits, frames):
+        if (frames <= 0):
+            return self
+        # Consecutive steps with the same buttons are merged, frames are limited to a u16
+        if (len(self.steps) > 0 and self.steps[-1][0] == bits and self.steps[-1][1] + frames <= 0xffff):
+            self.steps[-1][1] += frames
+        else:
+            self.steps.append([bits, frames])
+        return self
+
+    # Length of the script in frames
+    def num_frames(self):
+        return sum(frames for bits, frames in self.steps)
+
+    def to_bytes(self, script_id):
+        if (len(self.steps) == 0 or len(self.steps) > max_steps):
+            raise ValueError(f"Input scripts need 1 to {max_steps} steps, got {len(self.steps)}")
+        message = struct.pack(header_format, input_script_version, 0, script_id & 0xffff, len(self.steps))
+        return message + b"".join(struct.pack(step_format, bits, frames) for bits, frames in self.steps)
+
+# Returns (script_id, [(buttons, frames), ...]) for a script message
+def parse_script(message):
+    header_size = struct.calcsize(header_format)
+    step_size = struct.calcsize(step_format)
+    if (len(message) < header_size):
+        raise ValueError("Input script too short")
+    version, reserved, script_id, num_steps = struct.unpack_from(header_format, message)
+    if (version != input_script_version or num_steps == 0 or num_steps > max_steps or \
+        len(message) != header_size + num_steps * step_size):
+        raise ValueError("Invalid input script")
+    steps = [struct.unpack_from(step_format, message, header_size + i * step_size) for i in range(num_steps)]
+    return script_id, steps
+
+def pack_script_done(script_id):
+    return script_done_prefix + struct.pack("<H", script_id & 0xffff)
+
+# Script id of a "script_done" request, None for any other request
+def parse_script_done(request):
+    if (len(request) != len(script_done_prefix) + 2 or not request.startswith(script_done_prefix)):
+        return None
+    return struct.unpack_from("<H", request, len(script_done_prefix))[0]
@@ -0,0 +1,48 @@
+import numpy as np
+
+# The mapper's map grid stores what is on each tile as a small integer id (channel TILE) along with
+# whether the tile has been seen by the player (channel VISITED), instead of the colours it is drawn
+# with. Colours are only produced by render_map() when the map actually has to be displayed.
+
+# Channels of the map grid
+TILE = 0
+VISITED = 1
+
+# Tile ids, the objects are the detection labels shifted up by one
+EMPTY = 0
+POKECEN = 1
+POKEMART = 2
+NPC = 3
+HOUSE = 4
+GYM = 5
+EXIT = 6
+WALL = 7
+PLAYER = 8
+
+# BGR colour of each tile id
+tile_colours = np.array([
+    [0, 0, 0], # empty, black (white once visited)
+    [0, 0, 255], # pokecen, red
+    [255, 0, 0], # pokemart, blue
+    [66, 135, 245], # npc, orange
+    [30, 57, 102], # house, brown
+    [96, 102, 30], # gym, turqoise
+    [33, 255, 185], # exit, yellow
+    [105, 105, 105], # wall/boundary, grey
+    [149, 255, 0], # player, green
+], dtype=np.uint8)
+visited_colour = [255, 255, 255]
+frontier_colour = [234, 0, 255]
+
+# Tile id for a detection label (0 pokecen ... 5 exit, 6 wall/boundary), None for unknown labels
+def label_to_tile(label):
+    if (label >= 0 and label <= 6):
+        return label + 1
+    return None
+
+# Colour image (BGR) of a map grid. Visited tiles with nothing on them are white.
+def render_map(map_grid):
+    tiles = map_grid[:,:,TILE]
+    image = tile_colours[tiles]
+    image[(tiles == EMPTY) & (map_grid[:,:,VISITED] == 1)] = visited_colour
+    return image
@@ -1,6 +1,9 @@
 import numpy as np
 import math
 from path_finder import path_finder
+from object_store import object_store
+from grid_buffer import grid_buffer
+from map_tiles import TILE, VISITED, EMPTY, NPC, EXIT, WALL, PLAYER, label_to_tile
 
 # Think of this object as something akin to SLAM. This will basically simultaenously
 # localize the player character and map out its surroundings. This live map will be
@@ -19,10 +22,15 @@ class live_map:
         self.tile_size = int(w / (self.grid_x - 1)) # real-world size of square tiles
 
         ### Internals used by mapper ###
-        # The detected map represented as a 2D array
-        self.prev_map_grid = np.full((self.grid_y - 1, self.grid_x - 1, 4), [0, 0, 0, 0], dtype=np.uint8) 
-        self.cur_map_grid = np.full((self.grid_y - 1, self.grid_x - 1, 4), [0, 0, 0, 0], dtype=np.uint8)
+        # The detected map represented as a 2D array of tile ids and visited flags (see map_tiles.py and
+        # cur_map_grid below), kept inside a buffer with spare room around it so that growing the map
+        # doesn't copy it every time
+        self.map_buffer = grid_buffer(self.grid_y - 1, self.grid_x - 1, 2)
+        self.prev_map_grid = self.cur_map_grid
         
+        # Objects, frontiers etc. are all kept in world coordinates, i.e. tiles relative to the starting
+        # point. These never change as the map grows, subtracting map_min_offset_x/y from them gives the
+        # matching position in cur_map_grid.
         # Coordinates of top_left game view tile in relation to starting point in global map
         self.map_offset_x = 0 
         self.map_offset_y = 0
@@ -31,8 +39,13 @@ class live_map:
         self.map_max_offset_x = 14
         self.map_min_offset_y = 0
         self.map_max_offset_y = 10
-        # List of all detected in terms of their global coordinates
-        self.object_list = []
+        # All detected objects in terms of their world coordinates
+        self.object_list = object_store()
+        # Areas (in world coordinates) whose tiles have to be redrawn on the next step, only these are
+        # redrawn instead of the whole map
+        self.dirty_areas = []
+        # World position of the player tile drawn on the map, None until the first draw
+        self.player_tile = None
         # List of tiles that are actually walls/boundaries
         self.boundary_points = []
 
@@ -43,33 +56,94 @@ class live_map:
 
         # Setting up path finder
         self.pf = path_finder()
+        self.pf.mark_changed([0, 0, 14, 10]) # The whole map, so that all of its frontiers get scored
         self.move_list = []
 
+    # The global map as a 2D array, the top_left tile is at map_min_offset_x/y in world coordinates
+    @property
+    def cur_map_grid(self):
+        return self.map_buffer.view()
 
-    # Not the fastest function, is essentially a O(n^2) solution that fills in
-    # the tiles covered by detected objects
-    def fill_area(self, area_bound, symbol):
-        if (np.array_equal(symbol, [66, 135, 245])): # npc
-            self.cur_map_grid[area_bound[3]][area_bound[2]][:3] = [66, 135, 245]
+    # True for a tile the player has seen that has nothing on it
+    def is_visited_empty(self, tile):
+        return tile[TILE] == EMPTY and tile[VISITED] == 1
+
+    # Converts a box in world coordinates to its position in cur_map_grid
+    def world_to_grid(self, box):
+        return [box[0] - self.map_min_offset_x, box[1] - self.map_min_offset_y, \
+            box[2] - self.map_min_offset_x, box[3] - self.map_min_offset_y]
+
+
+    # Fills in the tiles covered by a detected object. NPCs only take up their bot_right tile and exits
+    # only their top row's corners. Tiles already holding an NPC are never painted over by anything but
+    # another NPC. Only the part of the object inside clip_area (grid coordinates) is drawn if given.
+    def fill_area(self, area_bound, tile, clip_area=None):
+        if (tile == NPC):
+            self.fill_rect([area_bound[2], area_bound[3], area_bound[2], area_bound[3]], tile, False, clip_area)
         
-        #elif (np.array_equal(symbol, [105, 105, 105])): # boundary
-        #    self.cur_map_grid[area_bound[3]][area_bound[2]][:3] = [105, 105, 105]
+        #elif (tile == WALL): # boundary
+        #    self.cur_map_grid[area_bound[3]][area_bound[2]][TILE] = WALL
         
-        elif (np.array_equal(symbol, [33, 255, 185])): # exit
-            if (not np.array_equal(self.cur_map_grid[area_bound[1]][area_bound[0]][:3], [66, 135, 245])):
-                self.cur_map_grid[area_bound[1]][area_bound[0]][:3] = [33, 255, 185]
-            if (not np.array_equal(self.cur_map_grid[area_bound[1]][area_bound[2]][:3], [66, 135, 245])):
-                self.cur_map_grid[area_bound[1]][area_bound[2]][:3] = [33, 255, 185]
+        elif (tile == EXIT):
+            self.fill_rect([area_bound[0], area_bound[1], area_bound[0], area_bound[1]], tile, True, clip_area)
+            self.fill_rect([area_bound[2], area_bound[1], area_bound[2], area_bound[1]], tile, True, clip_area)
         
         else:
-            x = area_bound[0] 
-            while (x <= area_bound[2]):
-                y = area_bound[1]
-                while (y <= area_bound[3]):
-                    if (not np.array_equal(self.cur_map_grid[y][x][:3], [66, 135, 245])):
-                        self.cur_map_grid[y][x][:3] = symbol
-                    y += 1
-                x += 1
+            self.fill_rect(area_bound, tile, True, clip_area)
+
+    def fill_rect(self, rect, tile, keep_npcs, clip_area=None):
+        grid = self.cur_map_grid
+        x1 = max(rect[0], 0)
+        y1 = max(rect[1], 0)
+        x2 = min(rect[2], grid.shape[1] - 1)
+        y2 = min(rect[3], grid.shape[0] - 1)
+        if (clip_area != None):
+            x1 = max(x1, clip_area[0])
+            y1 = max(y1, clip_area[1])
+            x2 = min(x2, clip_area[2])
+            y2 = min(y2, clip_area[3])
+        if (x1 > x2 or y1 > y2):
+            return
+
+        region = grid[y1:y2 + 1, x1:x2 + 1, TILE]
+        if (keep_npcs == True):
+            region[region != NPC] = tile
+        else:
+            region[:] = tile
+
+    # Redraws the tiles of every area marked as dirty since the last step. Each area is cleared and the
+    # objects overlapping it are painted back in the order they were found, which gives the same result
+    # as clearing the whole map and painting every object again. Tiles outside the dirty areas keep their
+    # ids from the previous step and the visited flags are never touched.
+    def redraw_dirty_areas(self):
+        for area in self.dirty_areas:
+            clip_area = self.world_to_grid(area)
+            grid = self.cur_map_grid
+            x1 = max(clip_area[0], 0)
+            y1 = max(clip_area[1], 0)
+            x2 = min(clip_area[2], grid.shape[1] - 1)
+            y2 = min(clip_area[3], grid.shape[0] - 1)
+            if (x1 > x2 or y1 > y2):
+                continue
+            grid[y1:y2 + 1, x1:x2 + 1, TILE] = EMPTY
+            self.pf.mark_changed(area)
+
+            for obj_id in self.object_list.query(area[0], area[1], area[2], area[3]):
+                label, box = self.object_list.get(obj_id)
+                tile = label_to_tile(label)
+                if (tile != None):
+                    self.fill_area(self.world_to_grid(box), tile, clip_area)
+        self.dirty_areas = []
+
+    # Clears and repaints every object, used when the whole map has to be redrawn
+    def redraw_all(self):
+        self.cur_map_grid[:,:,TILE] = EMPTY
+        self.pf.mark_changed([self.map_min_offset_x, self.map_min_offset_y, self.map_max_offset_x, self.map_max_offset_y])
+        for label, box in self.object_list:
+            tile = label_to_tile(label)
+            if (tile != None):
+                self.fill_area(self.world_to_grid(box), tile)
+        self.dirty_areas = []
 
 
     # Output of inferencing on each input frame is in terms of the frame's pixel coordinates, for our
@@ -111,15 +185,15 @@ class live_map:
             else:
                 coords[3] = math.ceil(q) - 1
 
-            # Converting tiles in terms of local coordinates to global coordinates of entire map
-            coords[0] += (self.map_offset_x - self.map_min_offset_x)
-            coords[1] += (self.map_offset_y - self.map_min_offset_y)
-            coords[2] += (self.map_offset_x - self.map_min_offset_x)
-            coords[3] += (self.map_offset_y - self.map_min_offset_y)
+            # Converting tiles in terms of local coordinates to world coordinates
+            coords[0] += self.map_offset_x
+            coords[1] += self.map_offset_y
+            coords[2] += self.map_offset_x
+            coords[3] += self.map_offset_y
 
             # Skipping appending converted tile if it is just the main agent detected as a NPC
-            if (coords[2] == self.map_offset_x - self.map_min_offset_x + 7) and \
-                (coords[3] == self.map_offset_y - self.map_min_offset_y + 5):
+            if (coords[2] == self.map_offset_x + 7) and \
+                (coords[3] == self.map_offset_y + 5):
                 continue
 
             tiles.append((label, coords))
@@ -136,8 +210,8 @@ class live_map:
             if (self.map_offset_y - 1 < self.map_min_offset_y):
                 self.grid_y += 1
                 self.map_min_offset_y -= 1
-                append_arr = np.full((1, self.grid_x - 1, 4), [0, 0, 0, 0], dtype=np.uint8)
-                self.cur_map_grid = np.append(append_arr, self.cur_map_grid, axis=0)
+                self.map_buffer.grow(up=1)
+                self.pf.mark_changed([self.map_min_offset_x, self.map_min_offset_y, self.map_max_offset_x, self.map_min_offset_y])
                 self.map_offset_y -= 1
 
                 is_appending = True
@@ -149,8 +223,8 @@ class live_map:
             if (self.map_offset_x + 1 + 14 > self.map_max_offset_x):
                 self.grid_x += 1
                 self.map_max_offset_x += 1
-                append_arr = np.full((self.grid_y - 1, 1, 4), [0, 0, 0, 0], dtype=np.uint8)
-                self.cur_map_grid = np.append(self.cur_map_grid, append_arr, axis=1)
+                self.map_buffer.grow(right=1)
+                self.pf.mark_changed([self.map_max_offset_x, self.map_min_offset_y, self.map_max_offset_x, self.map_max_offset_y])
                 self.map_offset_x += 1
 
                 is_appending = True
@@ -162,8 +236,8 @@ class live_map:
             if (self.map_offset_y + 1 + 10 > self.map_max_offset_y):
                 self.grid_y += 1
                 self.map_max_offset_y += 1
-                append_arr = np.full((1, self.grid_x - 1, 4), [0, 0, 0, 0], dtype=np.uint8)
-                self.cur_map_grid = np.append(self.cur_map_grid, append_arr, axis=0)
+                self.map_buffer.grow(down=1)
+                self.pf.mark_changed([self.map_min_offset_x, self.map_max_offset_y, self.map_max_offset_x, self.map_max_offset_y])
                 self.map_offset_y += 1
 
                 is_appending = True
@@ -175,8 +249,8 @@ class live_map:
             if (self.map_offset_x - 1 < self.map_min_offset_x):
                 self.grid_x += 1
                 self.map_min_offset_x -= 1
-                append_arr = np.full((self.grid_y - 1, 1, 4), [0, 0, 0, 0], dtype=np.uint8)
-                self.cur_map_grid = np.append(append_arr, self.cur_map_grid, axis=1)
+                self.map_buffer.grow(left=1)
+                self.pf.mark_changed([self.map_min_offset_x, self.map_min_offset_y, self.map_min_offset_x, self.map_max_offset_y])
                 self.map_offset_x -= 1
 
                 is_appending = True
@@ -187,113 +261,65 @@ class live_map:
         else:
             pass
 
-        # Adjusting global coordinates if map is being appended in any of the 4 directions
-        # In other words, if player character is stepping into unmapped territory. This is
-        # important because all the objects' coordinates will change relative to a map that
-        # increases in size
+        # Objects and frontiers are kept in world coordinates so nothing needs to be moved around when
+        # the map grows, the path finder only needs to know where the map now starts
         if (is_appending == True):
-            # Yes there is a reason why "right" and "down" are blank
-            for label, box in self.object_list:
-                if (key_pressed == 0):
-                    box[1] += 1
-                    box[3] += 1
-                elif (key_pressed == 1):
-                    pass
-                elif (key_pressed == 2):
-                    pass
-                elif (key_pressed == 3):
-                    box[0] += 1
-                    box[2] += 1
-                else:
-                    pass
-            
-            # Modifying global pos of next frontier as well
-            if (key_pressed == 0):
-                self.pf.next_frontier[2] += 1
-            elif (key_pressed == 3):
-                self.pf.next_frontier[1] += 1
-            
-            # Modifying global pos of unreachable frontiers as well
-            temp_set = set()
-            for u_frontier in self.pf.unreachable_frontiers:
-                if (key_pressed == 0):
-                    #self.pf.unreachable_frontiers.remove(u_frontier)
-                    x = u_frontier[0]
-                    y = u_frontier[1] + 1
-                    #u_frontier[1] += 1
-                    temp_set.add((x, y))
-                elif (key_pressed == 3):
-                    #u_frontier[0] += 1
-                    #self.pf.unreachable_frontiers.remove(u_frontier)
-                    x = u_frontier[0] + 1
-                    y = u_frontier[1]
-                    temp_set.add((x, y))
-            self.pf.unreachable_frontiers = temp_set
+            self.pf.set_origin(self.map_min_offset_x, self.map_min_offset_y)
 
 
     # This function handles detection of new objects and uses this new information to further built
     # the global map
     def add_to_object_list(self, key_pressed, bounding_box_list):
-        # Reset map_colour to blank so we can draw our objects after their global coordinates have been changed.
-        # This does not alter the visited/unvisited labels as we need this for our frontier detection.
-        self.cur_map_grid[:,:,:3] = [0, 0, 0]
-
         # Function to handle changes in global coordinates if map_grid needs to be appended to
         self.append_handler(key_pressed)
 
         # Get newly detected objects in terms of tiles
         tiles = self.convert_points_to_grid(key_pressed, bounding_box_list)
 
-        # O(n^2) solution for keeping track of new and old objects. Perhaps a faster method exists?
         # This basically gets the latest detected objects and checks whether they are in fact the same
-        # as previously detected objects or are completely new objects
+        # as previously detected objects or are completely new objects. The object store only has to look
+        # at objects filed near the new object's corners, so this doesn't slow down as the map grows.
         temp_object_list = [] # Temp list to store newly detected objects
         for new_label, new_box in tiles: # Iterating through objects detected this frame
-            is_found = False
-
-            for label, box in self.object_list: # Iterating through previously detected objects
-                # This conditional checks whether a new object is the same as an old object by checking if the top_left or
-                # bot_right points reside inside an old object's area
- 
-                if (new_box[0] >= box[0] and new_box[0] <= box[2] and new_box[1] >= box[1] and new_box[1] <= box[3]) or \
-                    (new_box[2] >= box[0] and new_box[2] <= box[2] and new_box[3] >= box[1] and new_box[3] <= box[3]):
-                    # If this is true then the two objects are indeed the same, now we need to decide whether we keep
-                    # the old object or the new one. This is based on the area (size) of the object. We keep the one
-                    # with the larger area.
-                    new_area = (new_box[2] - new_box[0]) * (new_box[3] - new_box[1])
-                    og_area = (box[2] - box[0]) * (box[3] - box[1])
-                    if (new_area > og_area):
-                        box[:] = new_box[:]
-                    # Else we keep the original object as it is
-
-                    # The so-called newly detected object is in-fact an old object, we can safely break from this loop
-                    is_found = True
-                    break
+            # A new object is the same as an old object if its top_left or bot_right points reside inside
+            # the old object's area
+            match = self.object_list.find_match(new_box)
+
+            if (match != None):
+                # If this is true then the two objects are indeed the same, now we need to decide whether we keep
+                # the old object or the new one. This is based on the area (size) of the object. We keep the one
+                # with the larger area.
+                label, box = self.object_list.get(match)
+                new_area = (new_box[2] - new_box[0]) * (new_box[3] - new_box[1])
+                og_area = (box[2] - box[0]) * (box[3] - box[1])
+                if (new_area > og_area):
+                    self.object_list.update_box(match, new_box)
+                    # Both the tiles the object used to cover and the ones it covers now need redrawing
+                    self.dirty_areas.append(box)
+                    self.dirty_areas.append(new_box)
+                # Else we keep the original object as it is
 
             # If object is not found, i.e., it is a new object, prepare it for adding to the main object_list
-            if (is_found == False):
+            else:
                 temp_object_list.append((new_label, new_box))
         
         # Add newly found objects to list
-        self.object_list.extend(temp_object_list)
+        for new_label, new_box in temp_object_list:
+            self.object_list.add(new_label, new_box)
+            self.dirty_areas.append(new_box)
 
 
+    # Marks the tiles inside the current game view as visited, tiles along the edges of the view aren't
+    # marked. Visited tiles with nothing on them are the ones rendered white.
     def draw_frontiers(self, top_x, top_y):        
         self.local_top_x = top_x
         self.local_top_y = top_y
         self.local_bot_x = top_x + 14
         self.local_bot_y = top_y + 10
         
-        for i in range(0, len(self.cur_map_grid)):
-            for j in range(0, len(self.cur_map_grid[i])):
-                if (j > self.local_top_x and j < self.local_bot_x) and \
-                    (i > self.local_top_y and i < self.local_bot_y):
-                    self.cur_map_grid[i][j][3] = 1
-                    if (np.array_equal(self.cur_map_grid[i][j][:3], [0, 0, 0])):
-                        self.cur_map_grid[i][j] = [255, 255, 255, 1]
-                elif (self.cur_map_grid[i][j][3] == 1):
-                    if (np.array_equal(self.cur_map_grid[i][j][:3], [0, 0, 0])):
-                        self.cur_map_grid[i][j][:3] = [255, 255, 255]
+        self.cur_map_grid[self.local_top_y + 1:self.local_bot_y, self.local_top_x + 1:self.local_bot_x, VISITED] = 1
+        self.pf.mark_changed([self.local_top_x + 1 + self.map_min_offset_x, self.local_top_y + 1 + self.map_min_offset_y, \
+            self.local_bot_x - 1 + self.map_min_offset_x, self.local_bot_y - 1 + self.map_min_offset_y])
 
 
     # This is called from main.py to draw our global map. Inputs are the bounding boxes raw data from
@@ -320,16 +346,16 @@ class live_map:
             self.boundary_points = []
             # Collision has occurred
             if (key_pressed == 0):
-                if (np.array_equal(self.prev_map_grid[(self.map_offset_y - self.map_min_offset_y) + 4][(self.map_offset_x - self.map_min_offset_x) + 7][:3], [255, 255, 255])):
+                if (self.is_visited_empty(self.prev_map_grid[(self.map_offset_y - self.map_min_offset_y) + 4][(self.map_offset_x - self.map_min_offset_x) + 7])):
                     self.boundary_points.append(((self.map_offset_x - self.map_min_offset_x) + 7, (self.map_offset_y - self.map_min_offset_y) + 4))
             elif (key_pressed == 1):
-                if (np.array_equal(self.prev_map_grid[(self.map_offset_y - self.map_min_offset_y) + 5][(self.map_offset_x - self.map_min_offset_x) + 8][:3], [255, 255, 255])):
+                if (self.is_visited_empty(self.prev_map_grid[(self.map_offset_y - self.map_min_offset_y) + 5][(self.map_offset_x - self.map_min_offset_x) + 8])):
                     self.boundary_points.append(((self.map_offset_x - self.map_min_offset_x) + 8, (self.map_offset_y - self.map_min_offset_y) + 5))
             elif (key_pressed == 2):
-                if (np.array_equal(self.prev_map_grid[(self.map_offset_y - self.map_min_offset_y) + 6][(self.map_offset_x - self.map_min_offset_x) + 7][:3], [255, 255, 255])):
+                if (self.is_visited_empty(self.prev_map_grid[(self.map_offset_y - self.map_min_offset_y) + 6][(self.map_offset_x - self.map_min_offset_x) + 7])):
                     self.boundary_points.append(((self.map_offset_x - self.map_min_offset_x) + 7, (self.map_offset_y - self.map_min_offset_y) + 6))
             elif (key_pressed == 3):
-                if (np.array_equal(self.prev_map_grid[(self.map_offset_y - self.map_min_offset_y) + 5][(self.map_offset_x - self.map_min_offset_x) + 6][:3], [255, 255, 255])):
+                if (self.is_visited_empty(self.prev_map_grid[(self.map_offset_y - self.map_min_offset_y) + 5][(self.map_offset_x - self.map_min_offset_x) + 6])):
                     self.boundary_points.append(((self.map_offset_x - self.map_min_offset_x) + 6, (self.map_offset_y - self.map_min_offset_y) + 5))
             else:
                 pass
@@ -338,9 +364,15 @@ class live_map:
         if (has_collision_occured == True):
             for point in self.boundary_points:
                 coords = [point[0], point[1], point[0], point[1]]
-                if not ((6, coords) in self.object_list):
-                    self.object_list.append((6, coords))
-                self.fill_area(coords, [105, 105, 105])
+                world_coords = [point[0] + self.map_min_offset_x, point[1] + self.map_min_offset_y, \
+                    point[0] + self.map_min_offset_x, point[1] + self.map_min_offset_y]
+                if not ((6, world_coords) in self.object_list):
+                    self.object_list.add(6, world_coords)
+                self.fill_area(coords, WALL)
+                # Drawn on top of everything for now, objects found after this wall get painted back over
+                # it when the area is redrawn on the next step
+                self.dirty_areas.append(world_coords)
+                self.pf.mark_changed(world_coords)
 
             # Used for anything that needs to compare previous map state with new map state
             self.prev_map_grid = self.cur_map_grid
@@ -362,30 +394,15 @@ class live_map:
             # Use bounding box list to add to our list of global objects
             self.add_to_object_list(key_pressed, bounding_box_list)
 
-            # This block handles drawing of tiles in the map with different colours on the grayscale spectrum
-            symbol = None
-            for label, box in self.object_list:
-                if (label == 0): # pokecen
-                    symbol = [0, 0, 255] # red
-                elif (label == 1): # pokemart
-                    symbol = [255, 0, 0] # blue
-                elif (label == 2): # npc
-                    symbol = [66, 135, 245] # orange
-                elif (label == 3): # house
-                    symbol = [30, 57, 102] # brown
-                elif (label == 4): # gym
-                    symbol = [96, 102, 30] # turqoise
-                elif (label == 5): # exit
-                    symbol = [33, 255, 185] # yellow
-                elif (label == 6): # wall/boundary
-                    symbol = [105, 105, 105] # grey
-                #elif (label == 7): # grass
-                #    symbol = [33, 166, 28] # green
-
-                self.fill_area(box, symbol)
+            # Redraw the tiles touched by new or changed objects, along with the tile the player was drawn on
+            if (self.player_tile != None):
+                self.dirty_areas.append(self.player_tile)
+            self.redraw_dirty_areas()
+
             # Draw player character position for localization purpose # green
+            self.player_tile = [self.map_offset_x + 7, self.map_offset_y + 5, self.map_offset_x + 7, self.map_offset_y + 5]
             self.cur_map_grid[(self.map_offset_y - self.map_min_offset_y) + 5]\
-                [(self.map_offset_x - self.map_min_offset_x) + 7][:3] = [149, 255, 0]
+                [(self.map_offset_x - self.map_min_offset_x) + 7][TILE] = PLAYER
 
             # Draw frontiers on map
             self.draw_frontiers((self.map_offset_x - self.map_min_offset_x), \
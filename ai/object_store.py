@@ -0,0 +1,99 @@
+import math
+
+# Spatial index over the objects found by the mapper. Boxes are [x1, y1, x2, y2] in tiles (both
+# corners inclusive) and every object is filed under each bucket_size x bucket_size block of
+# tiles its box touches, so finding the objects at a given tile only needs a single dictionary
+# lookup instead of a scan over everything that has been detected so far.
+class object_store:
+    def __init__(self, bucket_size=8):
+        self.bucket_size = bucket_size
+        self.objects = {} # id -> [label, box], in the order the objects were added
+        self.buckets = {} # (bucket_x, bucket_y) -> set of ids
+        self.exact = {} # (label, box as tuple) -> number of such objects, for membership checks
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.objects)
+
+    # Yields (label, box) in the order the objects were added. The boxes are copies, use
+    # update_box() to change an object.
+    def __iter__(self):
+        for label, box in list(self.objects.values()):
+            yield label, list(box)
+
+    def __contains__(self, item):
+        label, box = item
+        return self.exact.get((label, tuple(box)), 0) > 0
+
+    def get(self, obj_id):
+        label, box = self.objects[obj_id]
+        return label, list(box)
+
+    def bucket_range(self, box):
+        return range(math.floor(box[0] / self.bucket_size), math.floor(box[2] / self.bucket_size) + 1), \
+            range(math.floor(box[1] / self.bucket_size), math.floor(box[3] / self.bucket_size) + 1)
+
+    def index(self, obj_id):
+        label, box = self.objects[obj_id]
+        range_x, range_y = self.bucket_range(box)
+        for bucket_x in range_x:
+            for bucket_y in range_y:
+                self.buckets.setdefault((bucket_x, bucket_y), set()).add(obj_id)
+        key = (label, tuple(box))
+        self.exact[key] = self.exact.get(key, 0) + 1
+
+    def unindex(self, obj_id):
+        label, box = self.objects[obj_id]
+        range_x, range_y = self.bucket_range(box)
+        for bucket_x in range_x:
+            for bucket_y in range_y:
+                bucket = self.buckets[(bucket_x, bucket_y)]
+                bucket.discard(obj_id)
+                if (len(bucket) == 0):
+                    del self.buckets[(bucket_x, bucket_y)]
+        key = (label, tuple(box))
+        self.exact[key] -= 1
+        if (self.exact[key] == 0):
+            del self.exact[key]
+
+    # (id, [label, box]) for every object filed under the bucket holding the given tile
+    def objects_at(self, x, y):
+        bucket = self.buckets.get((math.floor(x / self.bucket_size), math.floor(y / self.bucket_size)), ())
+        return [(obj_id, self.objects[obj_id]) for obj_id in bucket]
+
+    def add(self, label, box):
+        obj_id = self.next_id
+        self.next_id += 1
+        self.objects[obj_id] = [label, list(box)]
+        self.index(obj_id)
+        return obj_id
+
+    def update_box(self, obj_id, box):
+        self.unindex(obj_id)
+        self.objects[obj_id][1] = list(box)
+        self.index(obj_id)
+
+    # Returns the id of the oldest object whose area contains the top_left or bot_right corner of
+    # box, or None if there isn't one. This is what the mapper uses to decide whether a detection
+    # is an object it has already seen.
+    def find_match(self, box):
+        match = None
+        for x, y in ((box[0], box[1]), (box[2], box[3])):
+            for obj_id, (label, other) in self.objects_at(x, y):
+                if (x >= other[0] and x <= other[2] and y >= other[1] and y <= other[3]):
+                    if (match == None or obj_id < match):
+                        match = obj_id
+        return match
+
+    # Ids of all objects whose boxes overlap the given area, in the order they were added
+    def query(self, x1, y1, x2, y2):
+        area = [x1, y1, x2, y2]
+        range_x, range_y = self.bucket_range(area)
+        found = set()
+        for bucket_x in range_x:
+            for bucket_y in range_y:
+                for obj_id in self.buckets.get((bucket_x, bucket_y), ()):
+                    box = self.objects[obj_id][1]
+                    if (box[0] <= area[2] and box[2] >= area[0] and box[1] <= area[3] and box[3] >= area[1]):
+                        found.add(obj_id)
+        return sorted(found)
@@ -37,8 +37,12 @@ BFS:
 """
 
 import numpy as np
+import cv2
 import random
-import heapq as pq
+from grid_search import grid_search
+from frontier_tracker import frontier_tracker
+from dstar_lite import dstar_lite
+from map_tiles import TILE, VISITED, EMPTY, POKECEN, POKEMART, NPC, HOUSE, GYM, WALL
 
 class path_finder:
     def __init__(self):
@@ -48,246 +52,134 @@ class path_finder:
         self.local_bot_y = 0
 
         self.map_grid = None
-        self.frontier_list = []
+        self.search = grid_search() # Used for paths to frontiers
+        self.use_astar = False # Breadth first search otherwise
+        # Planner used to get back on track after collisions. It keeps its search towards next_frontier
+        # between collisions so each replan only repairs the search around the newly found boundaries.
+        self.planner = None
+        self.use_incremental_replan = True
+        self.frontiers = frontier_tracker() # Every unvisited tile, scored and kept up to date as the map changes
+        # next_frontier ([-score, x, y]) and unreachable_frontiers are in world coordinates (relative to the
+        # starting point) so they stay valid when the map grows. origin_x/y is the world position of the
+        # map grid's top_left tile, the search itself runs on map grid positions.
         self.unreachable_frontiers = set()
         self.next_frontier = None
+        self.origin_x = 0
+        self.origin_y = 0
 
         self.consecutive_movements = 0
         self.consecutive_collisions = 0
         self.consecutive_collisions_limit = 5
 
-    def get_frontier_score(self, query_pos):
-        if (np.array_equal(query_pos[:3], [0, 0, 0])): # Unvisited
-            return 20
-        elif (np.array_equal(query_pos[:3], [255, 255, 255])): # Visited
-            return 0
-        elif (np.array_equal(query_pos[:3], [96, 102, 30])): # Gym
-            return 100
-        elif (np.array_equal(query_pos[:3], [30, 57, 102])): # House
-            return 70
-        elif (np.array_equal(query_pos[:3], [0, 0, 255])): # Pokecen
-            return 55
-        elif (np.array_equal(query_pos[:3], [255, 0, 0])): # Pokemart
-            return 40
-        elif (np.array_equal(query_pos[:3], [105, 105, 105])): # Wall/Boundary
-            return -40
-        elif (np.array_equal(query_pos[:3], [66, 135, 245])): # NPC
-            return 65
-
-    def find_frontier_bfs(self, cur_pos):
-        frontier_breadth_list = []
-        score = 0
-
-        # Up direction
-        if (cur_pos[1] - 1 >= 0): # Checking if not out of bounds of 2d map_grid array
-            score += self.get_frontier_score(self.map_grid[cur_pos[1] - 1][cur_pos[0]])
-            # Check if unvisited by BFS
-            if (self.map_grid[cur_pos[1] - 1][cur_pos[0]][3] != 3):
-                # Point needs to be a black, unvisited point. Otherwise we will collide into a building
-                if (np.array_equal(self.map_grid[cur_pos[1] - 1][cur_pos[0]][:3], [0, 0, 0])):
-                    self.map_grid[cur_pos[1] - 1][cur_pos[0]][3] = 3
-                    frontier_breadth_list.append([cur_pos[0], cur_pos[1] - 1])
-        
-        # Right direction
-        if (cur_pos[0] + 1 <= self.map_grid.shape[1] - 1):
-            score += self.get_frontier_score(self.map_grid[cur_pos[1]][cur_pos[0] + 1])
-            if (self.map_grid[cur_pos[1]][cur_pos[0] + 1][3] != 3):
-                if (np.array_equal(self.map_grid[cur_pos[1]][cur_pos[0] + 1][:3], [0, 0, 0])):
-                    self.map_grid[cur_pos[1]][cur_pos[0] + 1][3] = 3
-                    frontier_breadth_list.append([cur_pos[0] + 1, cur_pos[1]])
-
-        # Down direction
-        if (cur_pos[1] + 1 <= self.map_grid.shape[0] - 1):
-            score += self.get_frontier_score(self.map_grid[cur_pos[1] + 1][cur_pos[0]])
-            if (self.map_grid[cur_pos[1] + 1][cur_pos[0]][3] != 3):
-                if (np.array_equal(self.map_grid[cur_pos[1] + 1][cur_pos[0]][:3], [0, 0, 0])):
-                    self.map_grid[cur_pos[1] + 1][cur_pos[0]][3] = 3
-                    frontier_breadth_list.append([cur_pos[0], cur_pos[1] + 1])
-
-        # Left direction
-        if (cur_pos[0] - 1 >= 0):
-            score += self.get_frontier_score(self.map_grid[cur_pos[1]][cur_pos[0] - 1])
-            if (self.map_grid[cur_pos[1]][cur_pos[0] - 1][3] != 3):
-                if (np.array_equal(self.map_grid[cur_pos[1]][cur_pos[0] - 1][:3], [0, 0, 0])):
-                    self.map_grid[cur_pos[1]][cur_pos[0] - 1][3] = 3
-                    frontier_breadth_list.append([cur_pos[0] - 1, cur_pos[1]])
-
-        # Top left
-        if (cur_pos[1] - 1 >= 0 and cur_pos[0] - 1 >= 0):
-            score += self.get_frontier_score(self.map_grid[cur_pos[1] - 1][cur_pos[0] - 1])
-            if (self.map_grid[cur_pos[1] - 1][cur_pos[0] - 1][3] != 3):
-                if (np.array_equal(self.map_grid[cur_pos[1] - 1][cur_pos[0] - 1][:3], [0, 0, 0])):
-                    self.map_grid[cur_pos[1] - 1][cur_pos[0]][3] = 3
-                    frontier_breadth_list.append([cur_pos[0] - 1, cur_pos[1] - 1])
-
-        # Top right
-        if (cur_pos[1] - 1 >= 0 and cur_pos[0] + 1 <= self.map_grid.shape[1] - 1):
-            score += self.get_frontier_score(self.map_grid[cur_pos[1] - 1][cur_pos[0] + 1])
-            if (self.map_grid[cur_pos[1] - 1][cur_pos[0] + 1][3] != 3):
-                if (np.array_equal(self.map_grid[cur_pos[1] - 1][cur_pos[0] + 1][:3], [0, 0, 0])):
-                    self.map_grid[cur_pos[1] - 1][cur_pos[0] + 1][3] = 3
-                    frontier_breadth_list.append([cur_pos[0] + 1, cur_pos[1] - 1])
-
-        # Bottom left
-        if (cur_pos[1] + 1 <= self.map_grid.shape[0] - 1 and cur_pos[0] - 1 >= 0):
-            score += self.get_frontier_score(self.map_grid[cur_pos[1] + 1][cur_pos[0] - 1])
-            if (self.map_grid[cur_pos[1] + 1][cur_pos[0] - 1][3] != 3):
-                if (np.array_equal(self.map_grid[cur_pos[1] + 1][cur_pos[0] - 1][:3], [0, 0, 0])):
-                    self.map_grid[cur_pos[1] + 1][cur_pos[0] - 1][3] = 3
-                    frontier_breadth_list.append([cur_pos[0] - 1, cur_pos[1] + 1])
-
-        # Bottom right
-        if (cur_pos[1] + 1 <= self.map_grid.shape[0] - 1 and cur_pos[0] + 1 <= self.map_grid.shape[1] - 1):
-            score += self.get_frontier_score(self.map_grid[cur_pos[1] + 1][cur_pos[0] + 1])
-            if (self.map_grid[cur_pos[1] + 1][cur_pos[0] + 1][3] != 3):
-                if (np.array_equal(self.map_grid[cur_pos[1] + 1][cur_pos[0] + 1][:3], [0, 0, 0])):
-                    self.map_grid[cur_pos[1] + 1][cur_pos[0] + 1][3] = 3
-                    frontier_breadth_list.append([cur_pos[0] + 1, cur_pos[1] + 1])
-
-        # Pushing current frontier to priority queue, only if frontier is reachable
-        if (not ((cur_pos[0], cur_pos[1]) in self.unreachable_frontiers)):
-            pq.heappush(self.frontier_list, [-score, cur_pos[0], cur_pos[1]])
-        
-        return frontier_breadth_list # Returns list of points we've reached at our current search depth
-    
-    def ffb_wrapper(self, cur_pos):
-        points = [cur_pos]
-        # Marking the current point as visited by our BFS. Visited = 3 (just an arbitrary number lol)
-        self.map_grid[cur_pos[1]][cur_pos[0]][3] = 3
-        while True:
-            level_points = []
-            for point in points:
-                temp_points = self.find_frontier_bfs(point)
-                level_points.extend(temp_points)
-            
-            if (len(level_points) == 0):
-                return
-            else:
-                points = level_points
-
-    def move_to_frontier_bfs(self, cur_pos, end_pos, move_list):
-        if (cur_pos[:] == end_pos[:]):
-            return True, [[cur_pos, move_list]]
-
-        breadth_list = []
-        #can_continue = False
-
-        # Up direction
-        if (cur_pos[1] - 1 >= 0): # Checking if not out of bounds of 2d array
-            # Check if unvisited by BFS
-            if (self.map_grid[cur_pos[1] - 1][cur_pos[0]][3] != 3):
-                # Point needs to be a black or white unvisited point. Otherwise we will collide into a building
-                if (np.array_equal(self.map_grid[cur_pos[1] - 1][cur_pos[0]][:3], [255, 255, 255]) or \
-                    np.array_equal(self.map_grid[cur_pos[1] - 1][cur_pos[0]][:3], [0, 0, 0])):
-                    self.map_grid[cur_pos[1] - 1][cur_pos[0]][3] = 3
-                    temp_move_list = move_list.copy()
-                    temp_move_list.append(0)
-                    breadth_list.append([[cur_pos[0], cur_pos[1] - 1], temp_move_list])
-                    #can_continue = True
-
-        # Right direction
-        if (cur_pos[0] + 1 <= self.map_grid.shape[1] - 1):
-            if (self.map_grid[cur_pos[1]][cur_pos[0] + 1][3] != 3):
-                if (np.array_equal(self.map_grid[cur_pos[1]][cur_pos[0] + 1][:3], [255, 255, 255]) or \
-                    np.array_equal(self.map_grid[cur_pos[1]][cur_pos[0] + 1][:3], [0, 0, 0])):
-                    self.map_grid[cur_pos[1]][cur_pos[0] + 1][3] = 3
-                    temp_move_list = move_list.copy()
-                    temp_move_list.append(1)
-                    breadth_list.append([[cur_pos[0] + 1, cur_pos[1]], temp_move_list])
-                    #can_continue = True
-
-        # Down direction
-        if (cur_pos[1] + 1 <= self.map_grid.shape[0] - 1):
-            if (self.map_grid[cur_pos[1] + 1][cur_pos[0]][3] != 3):
-                if (np.array_equal(self.map_grid[cur_pos[1] + 1][cur_pos[0]][:3], [255, 255, 255]) or \
-                    np.array_equal(self.map_grid[cur_pos[1] + 1][cur_pos[0]][:3], [0, 0, 0])):
-                    self.map_grid[cur_pos[1] + 1][cur_pos[0]][3] = 3
-                    temp_move_list = move_list.copy()
-                    temp_move_list.append(2)
-                    breadth_list.append([[cur_pos[0], cur_pos[1] + 1], temp_move_list])
-                    #can_continue = True
-
-        # Left direction
-        if (cur_pos[0] - 1 >= 0):
-            if (self.map_grid[cur_pos[1]][cur_pos[0] - 1][3] != 3):
-                if (np.array_equal(self.map_grid[cur_pos[1]][cur_pos[0] - 1][:3], [255, 255, 255]) or \
-                    np.array_equal(self.map_grid[cur_pos[1]][cur_pos[0] - 1][:3], [0, 0, 0])):
-                    self.map_grid[cur_pos[1]][cur_pos[0] - 1][3] = 3
-                    temp_move_list = move_list.copy()
-                    temp_move_list.append(3)
-                    breadth_list.append([[cur_pos[0] - 1, cur_pos[1]], temp_move_list])
-                    #can_continue = True
-
-        # Returns whether our frontier point has been found, along with the list of points at our current BFS search level
-        return False, breadth_list#, can_continue
-
+    def set_origin(self, origin_x, origin_y):
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+
+    # Position of next_frontier in the current map grid
+    def get_frontier_grid_pos(self):
+        return [self.next_frontier[1] - self.origin_x, self.next_frontier[2] - self.origin_y]
+
+    # Score a tile adds to each of the (up to 8) frontiers around it, by tile id. Visited empty tiles
+    # are worth 0 instead of 20, see get_score_map.
+    tile_scores = np.zeros(9, dtype=np.float32)
+    tile_scores[EMPTY] = 20 # Unvisited
+    tile_scores[GYM] = 100
+    tile_scores[HOUSE] = 70
+    tile_scores[POKECEN] = 55
+    tile_scores[POKEMART] = 40
+    tile_scores[WALL] = -40 # Wall/Boundary
+    tile_scores[NPC] = 65
+    # Sums up the scores of the 8 tiles around a frontier
+    score_kernel = np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]], dtype=np.float32)
+
+    def get_score_map(self, map_grid):
+        tiles = map_grid[:,:,TILE]
+        score_map = self.tile_scores[tiles]
+        score_map[(tiles == EMPTY) & (map_grid[:,:,VISITED] == 1)] = 0 # Visited
+        return score_map
+
+    # Empty tiles that the player hasn't seen yet
+    def get_unvisited_mask(self, map_grid):
+        return (map_grid[:,:,TILE] == EMPTY) & (map_grid[:,:,VISITED] != 1)
+
+    def start_search(self, og_map_grid):
+        self.map_grid = og_map_grid
+
+    # Called by the mapper with every area (world coordinates) where it has changed tiles
+    def mark_changed(self, area):
+        self.frontiers.mark_changed(area)
+
+    # Rescores the tiles around everything that has changed since the last update. Every unvisited tile
+    # is a frontier, scored by the tiles around it, and the others are dropped from the frontiers.
+    def update_frontiers(self):
+        for x1, y1, x2, y2 in self.frontiers.take_changed(self.map_grid.shape, self.origin_x, self.origin_y):
+            self.rescore_area(x1, y1, x2, y2)
+
+    # Scores a window around the area, with a tile of margin so that the kernel sees the real neighbours of
+    # tiles on the edge of the area
+    def rescore_area(self, x1, y1, x2, y2):
+        wx1 = max(x1 - 1, 0)
+        wy1 = max(y1 - 1, 0)
+        wx2 = min(x2 + 1, self.map_grid.shape[1] - 1)
+        wy2 = min(y2 + 1, self.map_grid.shape[0] - 1)
+        window = self.map_grid[wy1:wy2 + 1, wx1:wx2 + 1]
+        frontier_scores = cv2.filter2D(self.get_score_map(window), -1, self.score_kernel, borderType=cv2.BORDER_CONSTANT)
+        unvisited = self.get_unvisited_mask(window)
+
+        for y in range(y1 - wy1, y2 - wy1 + 1):
+            for x in range(x1 - wx1, x2 - wx1 + 1):
+                key = (x + wx1 + self.origin_x, y + wy1 + self.origin_y)
+                is_frontier = bool(unvisited[y][x]) and not (key in self.unreachable_frontiers)
+                self.frontiers.update(key, int(frontier_scores[y][x]), is_frontier)
+
+    def mark_unreachable(self):
+        key = (self.next_frontier[1], self.next_frontier[2])
+        self.unreachable_frontiers.add(key)
+        self.frontiers.remove(key)
+
+    # Appends the moves needed to get from cur_pos to end_pos over empty tiles to move_list. Returns None
+    # if end_pos can't be reached.
     def mtfb_wrapper(self, cur_pos, end_pos, move_list):
-        points = [[cur_pos, move_list]]
-        # Marking the current point as visited by our BFS. Visited = 3 (just an arbitrary number lol)
-        self.map_grid[cur_pos[1]][cur_pos[0]][3] = 3
-        while True:
-            level_points = []
-            #can_continue = False
-            for point in points:
-                is_found, temp_points = self.move_to_frontier_bfs(point[0], end_pos, point[1])
-                level_points.extend(temp_points)
-
-                #if (can_continue == False):
-                #    return False
-
-                if (is_found == True):
-                    return temp_points[0][1]
-
-            points = level_points
+        walkable = self.map_grid[:,:,TILE] == EMPTY
+        path = self.search.find_path(walkable, cur_pos, end_pos, self.use_astar)
+        if (path == None):
+            return None
+        return move_list + path
         
     def get_next_frontier(self, top_x, top_y, og_map_grid):
-        self.map_grid = og_map_grid.copy()
+        self.start_search(og_map_grid)
+
+        print("Finding next frontier to move to...")
+        self.update_frontiers()
         
-        # Getting a random unvisited black point to start our search for best frontier from.
-        x = 0
-        y = 0
+        cur_pos = [top_x + 7, top_y + 5] # Our agent's current global position
         while True:
-            x = random.randint(0, self.map_grid.shape[1] - 1)
-            y = random.randint(0, self.map_grid.shape[0] - 1)
-            if (np.array_equal(self.map_grid[y][x][:3], [0, 0, 0])):
+            # Getting frontier with highest score
+            # We introduce a bit of randomness here because otherwise the pq makes the root the top left corner point always.
+            best_frontiers = self.frontiers.best(8)
+            if (len(best_frontiers) == 0):
+                print("No reachable frontiers found")
+                return []
+            self.next_frontier = best_frontiers[random.randint(0, len(best_frontiers) - 1)]
+            print("Next frontier found at: " + str(self.next_frontier))
+
+            # Get list of moves required to reach our selected frontier
+            print("Getting predicted moves to frontier...")
+            move_list = self.mtfb_wrapper(cur_pos, self.get_frontier_grid_pos(), [])
+            if (move_list != None):
                 break
-            else:
-                continue
-        cur_pos = [x, y]
-        print("Frontier BFS start point: " + str(cur_pos))
 
-        print("Finding next frontier to move to...")
-        # Resetting frontier pq to ensure we do not double count with our previous frontiers.
-        self.frontier_list = []
-        # Getting pq of best frontiers to go to
-        self.ffb_wrapper(cur_pos)
-        
-        # Getting frontier with highest score
-        # We introduce a bit of randomness here because otherwise the pq makes the root the top left corner point always.
-        frontier_index = 0
-        if (len(self.frontier_list) < 8):
-            frontier_index = random.randint(0, len(self.frontier_list) - 1)
-        else:
-            frontier_index = random.randint(0, 7)
-        self.next_frontier = self.frontier_list[frontier_index] 
-        print("Next frontier found at: " + str(self.next_frontier))
-
-        # Get list of moves required to reach our selected frontier
-        self.map_grid = og_map_grid.copy()
-        print("Getting predicted moves to frontier...")
-        move_list = []
-        cur_pos = [top_x + 7, top_y + 5] # Resetting cur_pos variable to our agent's current global position
-        # Getting move_list of moves required to get to our chosen frontier
-        move_list = self.mtfb_wrapper(cur_pos, self.next_frontier[1:], move_list)
-        #if (move_list == False):
-        #    continue
+            # No path to this frontier, drop it and pick another one
+            print("Frontier is unreachable, picking another one...")
+            self.mark_unreachable()
+
         print(move_list)
         print("Path found. Executing...")
 
         return move_list
 
     def frontier_path_collision_handler(self, og_map_grid, top_x, top_y):
-        self.map_grid = og_map_grid.copy()
+        self.start_search(og_map_grid)
         cur_pos = [top_x + 7, top_y + 5]
 
         self.consecutive_collisions += 1
@@ -299,15 +191,27 @@ class path_finder:
             self.consecutive_collisions = 0
             print("Too many consecutive collisions!")
             print("Switching focus to new frontier...")
-            self.unreachable_frontiers.add((self.next_frontier[1], self.next_frontier[2]))
+            self.mark_unreachable()
             return False
         else:
             print("Starting course correction...")
             print("Continuing movement to frontier: " + str(self.next_frontier))
             # Getting new list of moves after considering any new developments in the map
             print("Getting correct moves to frontier...")
-            new_moves = []
-            new_moves = self.mtfb_wrapper(cur_pos, self.next_frontier[1:], new_moves)
+            if (self.use_incremental_replan == True):
+                goal = (self.next_frontier[1], self.next_frontier[2])
+                if (self.planner == None or self.planner.goal != goal):
+                    self.planner = dstar_lite(goal)
+                new_moves = self.planner.plan(self.map_grid[:,:,TILE] == EMPTY, self.origin_x, self.origin_y, \
+                    [cur_pos[0] + self.origin_x, cur_pos[1] + self.origin_y])
+            else:
+                new_moves = self.mtfb_wrapper(cur_pos, self.get_frontier_grid_pos(), [])
+            if (new_moves == None):
+                # The map has changed and there is no longer a way to the frontier
+                print("Frontier is unreachable, switching focus to new frontier...")
+                self.consecutive_collisions = 0
+                self.mark_unreachable()
+                return False
             print(new_moves)
             
             return new_moves
\ No newline at end of file
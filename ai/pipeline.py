@@ -0,0 +1,287 @@
+import threading
+import time
+from collections import deque
+
+# Bounded FIFO used to hand work from one pipeline stage to the next. When the consumer falls
+# behind, the oldest entry is thrown away instead of blocking the producer, so the consumer
+# always ends up working on the freshest frame available. on_drop, if given, is called with every
+# item that is thrown away (by put or clear) instead of being handed out.
+class drop_oldest_queue:
+    def __init__(self, maxsize=2, on_drop=None):
+        self.items = deque(maxlen=maxsize)
+        self.cond = threading.Condition()
+        self.num_dropped = 0
+        self.on_drop = on_drop
+
+    def put(self, item):
+        dropped = None
+        with self.cond:
+            if (len(self.items) == self.items.maxlen):
+                self.num_dropped += 1
+                dropped = self.items[0]
+            self.items.append(item) # deque with maxlen discards from the left for us
+            self.cond.notify()
+        if (dropped != None and self.on_drop != None):
+            self.on_drop(dropped)
+
+    # Returns None if nothing arrived before the timeout
+    def get(self, timeout=None):
+        with self.cond:
+            if not self.cond.wait_for(lambda: len(self.items) > 0, timeout):
+                return None
+            return self.items.popleft()
+
+    def clear(self):
+        with self.cond:
+            dropped = list(self.items)
+            self.items.clear()
+        if (self.on_drop != None):
+            for item in dropped:
+                self.on_drop(item)
+
+    def __len__(self):
+        return len(self.items)
+
+
+# Running latency counters for a single stage of the pipeline
+class stage_timer:
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.count = 0
+            self.total_time = 0.0
+            self.last_time = 0.0
+            self.max_time = 0.0
+
+    def add(self, duration):
+        with self.lock:
+            self.count += 1
+            self.total_time += duration
+            self.last_time = duration
+            if (duration > self.max_time):
+                self.max_time = duration
+
+    def summary(self):
+        with self.lock:
+            mean_time = self.total_time / self.count if self.count > 0 else 0.0
+            return {"count": self.count, "mean_ms": mean_time * 1000, "last_ms": self.last_time * 1000, \
+                "max_ms": self.max_time * 1000}
+
+
+# Single result handed from the inference worker to the mapping stage
+class detection_result:
+    def __init__(self, seq, capture_time, frame, predictions, has_detections):
+        self.seq = seq # Capture sequence number of the frame these detections were run on
+        self.capture_time = capture_time
+        self.frame = frame
+        self.predictions = predictions
+        self.has_detections = has_detections
+
+
+# Runs screen capture and object detection on their own threads so that the mapping/decision
+# stage (the caller of get()) never has to wait for the sum of all three stages. The stages
+# are connected by drop_oldest_queues, so a slow stage only ever makes the others skip frames.
+# The next frame is captured as soon as the inference stage takes one off its queue, so one frame is
+# always in flight: capture overlaps inference, and the capture thread doesn't spin grabbing frames
+# that would just be dropped.
+#
+# capture_factory is called once inside the capture thread and must return a function that
+# grabs a single frame (screen capturers like mss are not safe to share between threads).
+# detect_func takes a frame and returns (frame, predictions, has_detections) without touching
+# any shared state.
+#
+# If either worker thread raises, the pipeline stops and the exception is raised again by get().
+#
+# release_func, if given, is called with every captured frame once the pipeline is done with it: when it
+# is dropped or thrown away along the way, or, for frames handed out by get(), on the next call to get().
+# Frames in reused buffers (like frame_ring's slots) are claimed when captured and released here.
+class detection_pipeline:
+    def __init__(self, capture_factory, detect_func, queue_size=2, release_func=None):
+        self.capture_factory = capture_factory
+        self.detect_func = detect_func
+        self.release_func = release_func
+
+        self.frame_queue = drop_oldest_queue(queue_size, lambda item: self.release(item[2]))
+        self.detection_queue = drop_oldest_queue(queue_size, lambda result: self.release(result.frame))
+        self.held_result = None # Last result handed out by get(), its frame is released on the next get()
+        self.timers = {"capture": stage_timer("capture"), "inference": stage_timer("inference"), \
+            "mapping": stage_timer("mapping")}
+
+        self.seq_lock = threading.Lock()
+        self.frame_seq = 0 # Sequence number given to the next captured frame
+        self.frame_wanted = threading.Event() # Set by the inference stage when it takes a frame
+        self.active = threading.Event() # Cleared while paused (e.g. during battles)
+        self.stopped = threading.Event()
+        self.error = None # Exception that stopped a worker thread
+        self.threads = []
+        self.start_time = None
+
+    def start(self):
+        if (len(self.threads) > 0):
+            return
+        self.stopped.clear()
+        self.active.set()
+        self.error = None
+        self.start_time = time.perf_counter()
+        self.threads = [threading.Thread(target=self.run_stage, args=(self.capture_loop,), name="capture", \
+            daemon=True), threading.Thread(target=self.run_stage, args=(self.inference_loop,), name="inference", \
+            daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.active.set() # Wake up paused threads so they can exit
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.threads = []
+
+    # Stops capturing and inferencing without tearing down the threads. Anything still queued
+    # is stale by the time we resume, so it is thrown away.
+    def pause(self):
+        self.active.clear()
+        self.frame_queue.clear()
+        self.detection_queue.clear()
+
+    def resume(self):
+        self.frame_queue.clear()
+        self.detection_queue.clear()
+        self.active.set()
+
+    def is_paused(self):
+        return not self.active.is_set()
+
+    # Sequence number that the next captured frame will receive. Used by the caller to ask for
+    # frames that were captured only after some event (like a key press) has happened.
+    def next_seq(self):
+        with self.seq_lock:
+            return self.frame_seq
+
+    # Runs a worker loop. If it raises (a failed grab, a model error), the error is kept for get() and the
+    # other thread is stopped too.
+    def run_stage(self, loop):
+        try:
+            loop()
+        except Exception as error:
+            self.error = error
+            self.stopped.set()
+            self.active.set()
+
+    def capture_loop(self):
+        capture = self.capture_factory()
+        while not self.stopped.is_set():
+            if (not self.frame_wanted.wait(timeout=0.1)):
+                continue
+            self.active.wait()
+            if (self.stopped.is_set()):
+                break
+            self.frame_wanted.clear()
+
+            start_time = time.perf_counter()
+            frame = capture()
+            with self.seq_lock:
+                seq = self.frame_seq
+                self.frame_seq += 1
+            self.timers["capture"].add(time.perf_counter() - start_time)
+
+            self.frame_queue.put((seq, start_time, frame))
+
+    def release(self, frame):
+        if (self.release_func != None and frame is not None):
+            self.release_func(frame)
+
+    def inference_loop(self):
+        while not self.stopped.is_set():
+            if (len(self.frame_queue) == 0):
+                self.frame_wanted.set()
+            item = self.frame_queue.get(timeout=0.1)
+            if (item == None):
+                continue
+            self.frame_wanted.set() # Capture the next frame while this one is inferenced
+            seq, capture_time, frame = item
+            if (not self.active.is_set()):
+                self.release(frame)
+                continue
+
+            start_time = time.perf_counter()
+            frame, predictions, has_detections = self.detect_func(frame)
+            self.timers["inference"].add(time.perf_counter() - start_time)
+
+            if (not self.active.is_set()): # Paused while this frame was being inferenced
+                self.release(frame)
+                continue
+            self.detection_queue.put(detection_result(seq, capture_time, frame, predictions, has_detections))
+
+    # Blocks until a detection result for a frame with a sequence number of at least min_seq
+    # (and captured no earlier than min_time) is available. Older results are discarded. The result's
+    # frame is good until the next call. Raises the exception that stopped a worker thread, returns None
+    # if the pipeline was stopped or nothing came before the timeout.
+    def get(self, min_seq=0, min_time=0.0, timeout=None):
+        if (self.held_result != None):
+            self.release(self.held_result.frame)
+            self.held_result = None
+        if (timeout != None):
+            deadline = time.perf_counter() + timeout
+        while True:
+            if (self.error != None):
+                raise self.error
+            if (self.stopped.is_set() and len(self.detection_queue) == 0):
+                return None
+            wait_time = 0.1 # Wakes up every so often to check on the worker threads
+            if (timeout != None):
+                remaining = deadline - time.perf_counter()
+                if (remaining <= 0):
+                    return None
+                wait_time = min(wait_time, remaining)
+            result = self.detection_queue.get(timeout=wait_time)
+            if (result == None):
+                continue
+            if (result.seq >= min_seq and result.capture_time >= min_time):
+                self.held_result = result
+                return result
+            self.release(result.frame)
+
+    def stats(self):
+        output = {}
+        for name, timer in self.timers.items():
+            output[name] = timer.summary()
+        output["dropped_frames"] = self.frame_queue.num_dropped
+        output["dropped_detections"] = self.detection_queue.num_dropped
+
+        # Steady state throughput is bounded by the slowest stage instead of the sum of all stages
+        slowest = max(summary["mean_ms"] for summary in output.values() if isinstance(summary, dict))
+        output["bottleneck_steps_per_sec"] = 1000 / slowest if slowest > 0 else 0.0
+        if (self.start_time != None):
+            elapsed = time.perf_counter() - self.start_time
+            output["mapping_steps_per_sec"] = self.timers["mapping"].count / elapsed if elapsed > 0 else 0.0
+        return output
+
+
+# Counts events (like avoided model calls) and reports how many happened in the last minute
+class rate_counter:
+    def __init__(self, window=60.0):
+        self.window = window
+        self.lock = threading.Lock()
+        self.events = deque() # (timestamp, count) pairs inside the window
+        self.total = 0
+
+    def add(self, count=1):
+        now = time.perf_counter()
+        with self.lock:
+            self.total += count
+            self.events.append((now, count))
+            self.trim(now)
+
+    def trim(self, now):
+        while (len(self.events) > 0 and now - self.events[0][0] > self.window):
+            self.events.popleft()
+
+    def per_minute(self):
+        with self.lock:
+            self.trim(time.perf_counter())
+            count = sum(count for timestamp, count in self.events)
+        return count * (60.0 / self.window)
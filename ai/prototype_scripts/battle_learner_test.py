@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import numpy as np
+import cv2
+
+from keras.models import Sequential
+from keras.layers import Dense
+from keras.optimizers import Adam
+
+sys.path.append("..")
+from battle_ai.battle_ai import battle_ai
+
+# Compares how long the battle loop's frames take with training done in between turns, as battle_ai does by
+# default, and with the background learner (battle_learner.py). The battle loop is stood in for by a frame
+# loop doing about as much image work as main_battle_loop does per frame, with a turn (a prediction for
+# the action and a new transition) every turn_frames frames. Reports the frame times and the learner's
+# steps per second and weight staleness.
+#
+# python battle_learner_test.py [num_frames] [turn_frames]
+
+# Same model as poke_ai uses
+def make_battle_model():
+    battle_model = Sequential()
+    battle_model.add(Dense(24, input_dim=2, activation='relu'))
+    battle_model.add(Dense(24, activation='relu'))
+    battle_model.add(Dense(4, activation='linear'))
+    battle_model.compile(loss='mse', optimizer=Adam(lr=0.001))
+    return battle_model
+
+def make_transition(rng):
+    init_state = rng.randint(0, 142, (1, 2)).astype(np.float64)
+    next_state = np.maximum(init_state - rng.randint(0, 40, (1, 2)), 0)
+    done = bool(next_state[0][0] == 0 or next_state[0][1] == 0)
+    reward = (init_state[0][1] - next_state[0][1]) - (init_state[0][0] - next_state[0][0])
+    return (init_state, rng.randint(0, 4), reward, next_state, done)
+
+# Returns the time every frame took
+def run_battle_loop(ai, num_frames, turn_frames):
+    rng = np.random.RandomState(0)
+    frame = rng.randint(0, 256, (720, 720, 3)).astype(np.uint8)
+    frame_times = []
+    for i in range(num_frames):
+        start_time = time.perf_counter()
+        # HP detection and the template matching of main_battle_loop
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        cv2.inRange(hsv, (87, 0, 0), (164, 74, 91))
+        if (i % turn_frames == 0):
+            init_state, action, reward, next_state, done = make_transition(rng)
+            if (ai.learner != None):
+                ai.learner.sync_weights(ai.battle_model)
+            ai.battle_model.predict(init_state)
+            with ai.memory_lock:
+                ai.battle_data.append(init_state, action, reward, next_state, done)
+            if (ai.learner == None):
+                ai.do_training_step()
+        frame_times.append(time.perf_counter() - start_time)
+    return np.array(frame_times)
+
+def describe(frame_times):
+    return f"{np.mean(frame_times) * 1000:.2f} ms mean, {np.percentile(frame_times, 99) * 1000:.2f} ms 99th " + \
+        f"percentile, {np.max(frame_times) * 1000:.2f} ms worst"
+
+if __name__ == "__main__":
+    num_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    turn_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    os.chdir("..") # battle_ai loads its template images relative to ai/
+    rng = np.random.RandomState(1)
+    transitions = [make_transition(rng) for i in range(200)]
+
+    for background_learner in [False, True]:
+        ai = battle_ai(make_battle_model(), replay_path=None, background_learner=background_learner)
+        for transition in transitions:
+            ai.battle_data.append(*transition)
+        ai.do_training_step() # Keras builds its functions on the first call
+        frame_times = run_battle_loop(ai, num_frames, turn_frames)
+        name = "Background learner" if background_learner == True else "Training between turns"
+        print(f"{name}: {describe(frame_times)}")
+        if (ai.learner != None):
+            print(ai.learner.stats())
+        ai.stop()
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import random
+import numpy as np
+
+from keras.models import Sequential
+from keras.layers import Dense
+from keras.optimizers import Adam
+
+sys.path.append("..")
+from battle_ai.battle_ai import battle_ai
+
+# Times battle_ai.do_training_step, which runs the model once over the whole minibatch of next states and
+# once over the initial states, against the old version that called predict twice for every transition
+# (32 predict calls for a batch of 16). Both are run on the same battle model and the same randomly made
+# up transitions, and the targets they train on are checked to be the same.
+#
+# python battle_training_benchmark.py [num_steps] [batch_size]
+
+# Same model as poke_ai uses
+def make_battle_model():
+    battle_model = Sequential()
+    battle_model.add(Dense(24, input_dim=2, activation='relu'))
+    battle_model.add(Dense(24, activation='relu'))
+    battle_model.add(Dense(4, activation='linear'))
+    battle_model.compile(loss='mse', optimizer=Adam(lr=0.001))
+    return battle_model
+
+def make_transition(rng):
+    init_state = rng.randint(0, 142, (1, 2)).astype(np.float64)
+    next_state = np.maximum(init_state - rng.randint(0, 40, (1, 2)), 0)
+    done = bool(next_state[0][0] == 0 or next_state[0][1] == 0)
+    reward = (init_state[0][1] - next_state[0][1]) - (init_state[0][0] - next_state[0][0])
+    return (init_state, rng.randint(0, 4), reward, next_state, done)
+
+# do_training_step as it was, one transition at a time
+def old_training_targets(ai, training_batch):
+    train_state_arr = []
+    train_target_arr = []
+    for init_state, action, reward, next_state, done in training_batch:
+        target_reward = reward
+        if (done == False):
+            target_reward = (reward + ai.gamma * np.amax(ai.battle_model.predict(next_state)[0]))
+        reward_prediction = ai.battle_model.predict(init_state)
+        reward_prediction[0][action] = target_reward
+        train_state_arr.append(init_state[0])
+        train_target_arr.append(reward_prediction[0])
+    return np.array(train_state_arr), np.array(train_target_arr)
+
+def old_training_step(ai, transitions):
+    training_batch = random.sample(transitions, ai.train_batch_size)
+    train_state_arr, train_target_arr = old_training_targets(ai, training_batch)
+    history = ai.battle_model.fit(train_state_arr, train_target_arr, epochs=1, verbose=0)
+    return history.history["loss"][0]
+
+def time_steps(training_step, num_steps):
+    training_step() # Keras builds its functions on the first call
+    start_time = time.perf_counter()
+    for i in range(num_steps):
+        training_step()
+    return num_steps / (time.perf_counter() - start_time)
+
+if __name__ == "__main__":
+    num_steps = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    os.chdir("..") # battle_ai loads its template images relative to ai/
+    ai = battle_ai(make_battle_model(), replay_path=None)
+    ai.train_batch_size = batch_size
+    rng = np.random.RandomState(0)
+    transitions = [make_transition(rng) for i in range(1000)]
+    for transition in transitions:
+        ai.battle_data.append(*transition)
+
+    batch = transitions[:batch_size]
+    old_states, old_targets = old_training_targets(ai, batch)
+    new_targets, td_errors = ai.compute_targets(np.concatenate([t[0] for t in batch]), \
+        np.array([t[1] for t in batch]), np.array([t[2] for t in batch], dtype=np.float32), \
+        np.concatenate([t[3] for t in batch]), np.array([t[4] for t in batch]))
+    print(f"Largest difference between the old and new targets: {np.max(np.abs(old_targets - new_targets)):.2e}")
+
+    old_rate = time_steps(lambda: old_training_step(ai, transitions), num_steps)
+    new_rate = time_steps(ai.do_training_step, num_steps)
+    print(f"Batch of {batch_size}: {old_rate:.1f} training steps/s one transition at a time, " + \
+        f"{new_rate:.1f} batched ({new_rate / old_rate:.1f}x)")
@@ -0,0 +1,60 @@
+import sys
+import time
+import random
+import numpy as np
+
+sys.path.append("..")
+from async_controller import threaded_controller
+from emulator_stub import emulator_stub
+from simulator import map_simulator, make_random_world
+
+# Drives the emulator stand-in (emulator_stub.py, running at 60 fps) with the asyncio controller and
+# reports how long each movement takes. A movement can't be faster than the game allows, 16 frames
+# (267 ms) for a step and another 8 frames (133 ms) to turn first. backend_controller sleeps 280 ms
+# between the turn and the step on top of that and needs the RAM read twice.
+#
+# Also stops the stand-in half way through to check that a hung emulator only makes movements time out
+# instead of freezing the controller.
+#
+# python controller_latency_test.py [num_movements]
+
+if __name__ == "__main__":
+    num_movements = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    sim = map_simulator(make_random_world(0))
+    emulator = emulator_stub(sim)
+    emulator.start()
+    ctrl = threaded_controller(press_timeout=0.5, movement_timeout=0.5)
+
+    rng = random.Random(0)
+    latencies = {"step": [], "turn and step": [], "collision": []}
+    for i in range(num_movements):
+        start_dir = ctrl.ctrl.cur_dir
+        start_pos = (sim.x, sim.y)
+        start_time = time.perf_counter()
+        key_pressed, ram_vals = ctrl.perform_movement(rng.randint(0, 3))
+        latency = time.perf_counter() - start_time
+        if ((sim.x, sim.y) == start_pos):
+            latencies["collision"].append(latency)
+        elif (start_dir == key_pressed):
+            latencies["step"].append(latency)
+        else:
+            latencies["turn and step"].append(latency)
+        if (ram_vals[0] != sim.x % 256 or ram_vals[1] != sim.y % 256):
+            print(f"Movement {i}: RAM {ram_vals[:2]} doesn't match the player at {sim.x, sim.y}")
+
+    for name, values in latencies.items():
+        if (len(values) > 0):
+            print(f"{name:>14}: {len(values):>3} movements, {np.mean(values) * 1000:.0f} ms mean, " + \
+                f"{np.max(values) * 1000:.0f} ms max")
+    print(f"{emulator.num_presses} presses reached the emulator, {ctrl.num_timeouts} timeouts")
+
+    # Hung emulator
+    emulator.running = False
+    emulator.thread.join()
+    start_time = time.perf_counter()
+    ctrl.perform_movement(0)
+    print(f"Movement with a hung emulator returned after {(time.perf_counter() - start_time) * 1000:.0f} ms, " + \
+        f"{ctrl.num_timeouts} timeouts")
+
+    ctrl.stop()
+    emulator.stop()
@@ -0,0 +1,86 @@
+import sys
+import time
+
+sys.path.append("..")
+from controller_pool import controller_pool, fleet_scheduler
+from emulator_stub import emulator_stub
+from simulator import map_simulator, make_random_world, padding
+from mapper import live_map
+from map_tiles import TILE, EMPTY
+
+# Runs a fleet of exploring agents against emulator stand-ins (emulator_stub.py, 60 fps), one per agent,
+# over both transports, and reports the total movements per second for 1 agent and for num_agents
+# agents. Every agent maps its own world from its simulator's detections, in place of the shared detection
+# model. Also checks that every controller only ever sees the RAM of its own emulator.
+#
+# python fleet_test.py [num_agents] [seconds]
+
+class exploring_agent:
+    def __init__(self, ctrl, sim):
+        self.ctrl = ctrl
+        self.sim = sim
+        self.mp = live_map(720, 480, padding, ctrl.get_ram_vals())
+        self.mp.draw_map(None, sim.get_detections(), ctrl.get_ram_vals())
+        self.actions = self.mp.get_movelist()
+        self.action_index = -1
+        self.num_mismatches = 0
+
+    # A cut down poke_ai.run_step, one movement per step
+    def run_step(self):
+        self.action_index += 1
+        if (self.action_index >= len(self.actions)):
+            self.action_index = 0
+            self.actions = self.mp.get_movelist()
+        key_pressed, ram_vals = self.ctrl.perform_movement(self.actions[self.action_index])
+        if (ram_vals[0] != self.sim.x % 256 or ram_vals[1] != self.sim.y % 256):
+            self.num_mismatches += 1
+        map_grid, collision_type = self.mp.draw_map(key_pressed, self.sim.get_detections(), ram_vals)
+
+        frontier_x, frontier_y = self.mp.pf.get_frontier_grid_pos()
+        if (map_grid[frontier_y][frontier_x][TILE] != EMPTY):
+            self.action_index = -1
+            self.actions = self.mp.get_movelist()
+        if (collision_type == "normal_collision"):
+            self.actions = self.mp.pf.frontier_path_collision_handler(map_grid, \
+                (self.mp.map_offset_x - self.mp.map_min_offset_x), (self.mp.map_offset_y - self.mp.map_min_offset_y))
+            if (self.actions == False):
+                self.actions = self.mp.get_movelist()
+            self.action_index = -1
+
+def run_fleet(num_agents, transport, seconds):
+    pool = controller_pool(num_agents, transport, async_controller=True)
+    emulators = []
+    for i in range(num_agents):
+        sim = map_simulator(make_random_world(i))
+        emulators.append(emulator_stub(sim, pool.endpoints[i]["input_connect"], pool.endpoints[i]["ram_bind"]))
+        emulators[-1].start()
+
+    fleet = fleet_scheduler(lambda index: exploring_agent(pool[index], emulators[index].sim), num_agents)
+    fleet.start()
+    time.sleep(seconds)
+    fleet.stop(5.0)
+    stats = fleet.stats()
+    mismatches = sum(agent.num_mismatches for agent in fleet.agents if agent != None)
+
+    pool.stop()
+    for emulator in emulators:
+        emulator.stop()
+    return stats, mismatches
+
+if __name__ == "__main__":
+    num_agents = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    ok = True
+    for transport in ["tcp", "ipc"]:
+        single_rate = None
+        for agents in [1, num_agents]:
+            stats, mismatches = run_fleet(agents, transport, seconds)
+            rate = stats["total_steps_per_second"]
+            if (single_rate == None):
+                single_rate = rate
+            print(f"{transport}, {agents} agents: {sum(stats['steps'])} movements, {rate:.2f}/s " + \
+                f"({rate / single_rate:.2f}x), {mismatches} RAM mismatches, errors {stats['errors']}")
+            if (mismatches > 0 or any(error != None for error in stats["errors"])):
+                ok = False
+    if (ok == False):
+        sys.exit(1)
@@ -0,0 +1,88 @@
+import sys
+import time
+import numpy as np
+
+sys.path.append("..")
+from frame_ring import frame_ring
+from pipeline import detection_pipeline
+
+# Runs a frame_ring through detection_pipeline the way poke_ai does with pipelined=True and
+# shared_frames=True, and checks that no frame is written over while it is being inferenced, queued or held
+# by the mapping stage. The ring is kept under pressure: it has fewer slots than the pipeline can hold frames
+# (one in flight, one being inferenced, queue_size waiting for mapping and the one mapping holds), and
+# mapping holds every frame for several model calls, so frames wait in the full detection queue while
+# capture keeps going.
+#
+# Without slot claims (the ring as it was first written) capture goes round the ring over frames that are
+# still in use, and the run with claims has to see none of that. Exits with 1 if a claimed frame changed,
+# or if no unclaimed frame did (the ring wasn't under pressure and the run proved nothing).
+#
+# python frame_ring_pipeline_test.py [num_results] [detect_ms]
+
+capture_time = 0.005
+queue_size = 2
+num_slots = 4
+mapping_calls = 3 # Model calls' worth of time mapping holds each frame for
+
+def run(claim_slots, num_results, detect_time):
+    ring = frame_ring(num_slots, name="poke_ai_frame_ring_pipeline_test")
+    changed = {"inference": 0, "mapping": 0}
+
+    def capture_factory():
+        capture = np.zeros((ring.game_height, ring.game_width, 4), dtype=np.uint8)
+        def capture_frame():
+            time.sleep(capture_time)
+            capture[:] = ring.num_written % 200 + 20 # Every frame looks different
+            slot = ring.write(capture, claim_slots)
+            return ring.frames[slot]
+        return capture_frame
+
+    # Remembers which write the frame's slot holds, "inferences" it and checks nothing was written over it
+    # meanwhile
+    def detect(frame):
+        slot = ring.find_slot(frame)
+        seq = int(ring.seqs[slot])
+        time.sleep(detect_time)
+        if (ring.is_current(slot, seq) == False):
+            changed["inference"] += 1
+        return frame, (slot, seq), True
+
+    pipeline = detection_pipeline(capture_factory, detect, queue_size, ring.release_frame if claim_slots else None)
+    pipeline.start()
+    for i in range(num_results):
+        if (i == num_results // 2):
+            pipeline.pause() # Like a battle starting, the queued frames are thrown away
+            time.sleep(0.05)
+            pipeline.resume()
+        result = pipeline.get(timeout=10.0)
+        if (result == None):
+            print("Timed out waiting for a detection, the ring ran out of slots")
+            changed["mapping"] += 1
+            break
+        slot, seq = result.predictions
+        time.sleep(detect_time * mapping_calls) # Mapping and showing the frame
+        if (ring.is_current(slot, seq) == False):
+            changed["mapping"] += 1
+    pipeline.stop()
+    stats = pipeline.stats()
+    pipeline.release(pipeline.held_result.frame if pipeline.held_result != None else None)
+    ring.close()
+    return changed, stats
+
+if __name__ == "__main__":
+    num_results = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    detect_time = (int(sys.argv[2]) if len(sys.argv) > 2 else 40) / 1000
+    ok = True
+    for claim_slots in [False, True]:
+        changed, stats = run(claim_slots, num_results, detect_time)
+        name = "Claimed slots" if claim_slots == True else "Unclaimed slots"
+        print(f"{name}: {changed['inference']} of {num_results} frames changed while being inferenced, " + \
+            f"{changed['mapping']} while held by mapping, {stats['capture']['count']} frames captured")
+        num_changed = changed["inference"] + changed["mapping"]
+        if (claim_slots == True and num_changed > 0):
+            ok = False
+        if (claim_slots == False and num_changed == 0):
+            print("No unclaimed frame was written over, the ring wasn't under pressure")
+            ok = False
+    if (ok == False):
+        sys.exit(1)
@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import multiprocessing
+import numpy as np
+import cv2
+
+sys.path.append("..")
+from frame_ring import frame_ring, allocation_tracker
+
+# Compares getting a captured frame ready for the detection model the old way (poke_ai.get_screen followed
+# by keras_retinanet's preprocess_image and resize_image) with writing it into a frame_ring, reporting the
+# time and the memory allocated per frame. Checks that both give the same padded frame and the same model
+# input, within the grey level the ring's rounding allows, and that another process can read the ring's
+# frames.
+#
+# Screenshots are recorded gameplay frames wrapped up like the BGRA ones mss grabs.
+#
+# python frame_ring_test.py [num_frames]
+
+frames_dir = "gameplay_frames"
+
+class fake_screenshot:
+    def __init__(self, bgr):
+        self.height, self.width = bgr.shape[:2]
+        self.raw = bytearray(cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA).tobytes())
+
+# poke_ai.get_screen, then preprocess_image and resize_image as in keras_retinanet (caffe mode, min side 400)
+def old_prepare(shot):
+    frame = np.array(np.frombuffer(shot.raw, dtype=np.uint8).reshape((shot.height, shot.width, 4)))
+    frame = frame[:, :, :3]
+    padding = int((shot.width - shot.height) / 2)
+    frame = cv2.copyMakeBorder(frame, padding, padding, 0, 0, cv2.BORDER_CONSTANT, (0, 0, 0))
+    image = frame.astype(np.float32)
+    image[..., 0] -= 103.939
+    image[..., 1] -= 116.779
+    image[..., 2] -= 123.68
+    scale = 400 / min(image.shape[:2])
+    image = cv2.resize(image, None, fx=scale, fy=scale)
+    return frame, image
+
+def read_latest(name, queue):
+    ring = frame_ring(name=name, create=False)
+    slot, seq = ring.latest()
+    queue.put((seq, float(ring.tensors[slot].sum()), ring.is_current(slot, seq)))
+    ring.close()
+
+def load_screenshots(limit=20):
+    names = sorted(name for name in os.listdir(frames_dir) if name.endswith(".jpg"))[:limit]
+    shots = []
+    for name in names:
+        image = cv2.imread(os.path.join(frames_dir, name))
+        if (image is not None):
+            shots.append(fake_screenshot(cv2.resize(image, (720, 480))))
+    if (len(shots) == 0):
+        shots.append(fake_screenshot(np.random.RandomState(0).randint(0, 256, (480, 720, 3)).astype(np.uint8)))
+    return shots
+
+def measure(prepare, shots, num_frames):
+    tracker = allocation_tracker()
+    for i in range(num_frames):
+        tracker.start_step()
+        prepare(shots[i % len(shots)])
+        tracker.end_step()
+    tracker.stop()
+
+    start_time = time.perf_counter()
+    for i in range(num_frames):
+        prepare(shots[i % len(shots)])
+    return (time.perf_counter() - start_time) / num_frames, tracker.summary()
+
+if __name__ == "__main__":
+    num_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    shots = load_screenshots()
+    ring = frame_ring(name="poke_ai_frame_ring_test")
+
+    max_diff = 0.0
+    for shot in shots:
+        frame, image = old_prepare(shot)
+        slot = ring.write_screenshot(shot)
+        assert np.array_equal(ring.frames[slot], frame), "Padded frames differ"
+        max_diff = max(max_diff, float(np.max(np.abs(ring.tensors[slot] - image))))
+    print(f"{len(shots)} frames, model input at most {max_diff:.3f} away from preprocess_image + resize_image")
+
+    old_time, old_allocations = measure(old_prepare, shots, num_frames)
+    new_time, new_allocations = measure(ring.write_screenshot, shots, num_frames)
+    print(f"Old: {old_time * 1000:.2f} ms per frame, {old_allocations['mean_kb']:.0f} KB allocated per frame")
+    print(f"Frame ring: {new_time * 1000:.2f} ms per frame, {new_allocations['mean_kb']:.1f} KB allocated per frame")
+
+    queue = multiprocessing.Queue()
+    reader = multiprocessing.Process(target=read_latest, args=(ring.name, queue))
+    reader.start()
+    seq, checksum, current = queue.get(timeout=10)
+    reader.join()
+    slot, expected_seq = ring.latest()
+    same = (seq == expected_seq and current == True and checksum == float(ring.tensors[slot].sum()))
+    print(f"Other process read frame {seq}: {'same' if same else 'different'} model input")
+    ring.close()
+    if (max_diff > 1.0 or same == False):
+        sys.exit(1)
@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import numpy as np
+import cv2
+
+sys.path.append("..")
+from battle_ai.hp_reader import hp_reader
+
+# Compares battle_ai's HP reading as it was (HSV and contours over the whole padded frame) with hp_reader,
+# over the recorded gameplay frames:
+#  - as they are, how often both read the same HPs (outside of battles, dark scenery in the boxes can
+#    pass for a bar to either)
+#  - with the HP panels of the battle screen drawn in, bars of known HP in them, how often each reads the
+#    right HPs and how often they read the same
+# and the time each takes per frame.
+#
+# python hp_reader_test.py [max_frames]
+
+frames_dir = "gameplay_frames"
+full_hp = 141
+# Panel the bar is drawn in (where the game's is on the padded frame) and left end and rows of the inside of
+# the bar, inside hp_reader's boxes
+my_bar = ((378, 342, 690, 456), 530, 392, 398)
+opponent_bar = ((39, 168, 339, 264), 150, 222, 228)
+
+# battle_ai.update_hps as it was, starting from full HPs. Returns (my_hp, opponent_hp).
+def old_update_hps(frame):
+    pokemon_hp = full_hp
+    opponent_hp = full_hp
+    black_lower_bound = (87, 0, 0)
+    black_upper_bound = (164, 74, 91)
+    black_detection_img = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    black_detection_img = cv2.inRange(black_detection_img, black_lower_bound, black_upper_bound)
+    contours, hierarchy = cv2.findContours(black_detection_img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    for cnt in contours:
+        if (cv2.contourArea(cnt) > 0):
+            M = cv2.moments(cnt)
+            centroid_x = int(M['m10']/M['m00'])
+            centroid_y = int(M['m01']/M['m00'])
+            if (centroid_x >= 510 and centroid_x <= 680 and centroid_y >= 370 and centroid_y <= 420):
+                leftmost = tuple(cnt[cnt[:,:,0].argmin()][0])
+                rightmost = tuple(cnt[cnt[:,:,0].argmax()][0])
+                pokemon_hp = 141 - (rightmost[0] - leftmost[0])
+            elif (centroid_x >= 140 and centroid_x <= 310 and centroid_y >= 200 and centroid_y <= 250):
+                leftmost = tuple(cnt[cnt[:,:,0].argmin()][0])
+                rightmost = tuple(cnt[cnt[:,:,0].argmax()][0])
+                opponent_hp = 141 - (rightmost[0] - leftmost[0])
+    return max(pokemon_hp, 0), max(opponent_hp, 0)
+
+def new_update_hps(reader, frame):
+    my_hp, opponent_hp = reader.read(frame)
+    return (my_hp if my_hp != None else full_hp), (opponent_hp if opponent_hp != None else full_hp)
+
+# Draws a bar with hp left, green up to hp and dark (in update_hps' HSV range) after, on a light panel
+def draw_bar(frame, bar, hp):
+    panel, left, top, bottom = bar
+    right = left + full_hp # Last column of the inside
+    dark = cv2.cvtColor(np.uint8([[[120, 40, 60]]]), cv2.COLOR_HSV2BGR)[0][0].tolist()
+    cv2.rectangle(frame, panel[:2], panel[2:], (216, 248, 248), -1)
+    cv2.rectangle(frame, (left - 3, top - 3), (right + 3, bottom + 2), (80, 80, 80), 1)
+    cv2.rectangle(frame, (left, top), (right, bottom - 1), (96, 208, 112), -1)
+    if (hp < full_hp):
+        # The formula counts the empty part as 141 - hp columns between its ends
+        cv2.rectangle(frame, (left + hp, top), (right, bottom - 1), dark, -1)
+
+def load_frames(max_frames):
+    names = sorted((name for name in os.listdir(frames_dir) if name.endswith(".jpg")), \
+        key=lambda name: int(name[:-4]))[:max_frames]
+    return [cv2.imread(os.path.join(frames_dir, name)) for name in names]
+
+def time_per_frame(read, frames):
+    times = []
+    for frame in frames:
+        start_time = time.perf_counter()
+        read(frame)
+        times.append(time.perf_counter() - start_time)
+    return np.mean(times), np.percentile(times, 99)
+
+if __name__ == "__main__":
+    max_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    frames = load_frames(max_frames)
+    reader = hp_reader(frames[0].shape[1])
+
+    same = sum(old_update_hps(frame) == new_update_hps(reader, frame) for frame in frames)
+    no_bar = sum(new_update_hps(reader, frame) == (full_hp, full_hp) for frame in frames)
+    print(f"{len(frames)} gameplay frames: same HPs read from {same}, hp_reader found no bars in {no_bar}")
+
+    rng = np.random.RandomState(0)
+    battle_frames = []
+    truths = []
+    for frame in frames:
+        frame = frame.copy()
+        truth = (int(rng.randint(0, full_hp + 1)), int(rng.randint(0, full_hp + 1)))
+        draw_bar(frame, my_bar, truth[0])
+        draw_bar(frame, opponent_bar, truth[1])
+        battle_frames.append(frame)
+        truths.append(truth)
+    old_hps = [old_update_hps(frame) for frame in battle_frames]
+    new_hps = [new_update_hps(reader, frame) for frame in battle_frames]
+    old_right = sum(hps == truth for hps, truth in zip(old_hps, truths))
+    new_right = sum(hps == truth for hps, truth in zip(new_hps, truths))
+    battle_same = sum(old == new for old, new in zip(old_hps, new_hps))
+    print(f"With HP bars drawn in: old reads the right HPs from {old_right}, hp_reader from {new_right}, " + \
+        f"the same from {battle_same}")
+
+    old_mean, old_p99 = time_per_frame(old_update_hps, battle_frames)
+    new_mean, new_p99 = time_per_frame(reader.read, battle_frames)
+    print(f"Old: {old_mean * 1000:.3f} ms per frame ({old_p99 * 1000:.3f} ms 99th percentile)")
+    print(f"hp_reader: {new_mean * 1000:.3f} ms per frame ({new_p99 * 1000:.3f} ms 99th percentile), " + \
+        f"{old_mean / new_mean:.0f}x faster")
+    if (new_right < old_right or new_mean > 0.001):
+        sys.exit(1)
@@ -0,0 +1,80 @@
+import sys
+import time
+import threading
+import numpy as np
+
+sys.path.append("..")
+from inference_server import inference_server, inference_client
+
+# Runs num_clients agents sending frames to an inference_server as fast as they get detections back, once
+# with batching turned off (max_batch_size 1, like agents taking turns on a shared model) and once
+# batching up to num_clients frames, and reports frames per second, batch sizes, queue wait and the
+# latency seen by the clients. Checks that every client gets the detections for its own frame.
+#
+# The RetinaNet model isn't needed, it is stood in for by a single dense layer over a downsampled frame,
+# which like the real model does much better on a batch than on one frame at a time.
+#
+# python inference_server_test.py [num_clients] [seconds]
+
+endpoint = "tcp://127.0.0.1:5570"
+
+class dense_detector:
+    def __init__(self, num_detections=300):
+        rng = np.random.RandomState(0)
+        self.num_detections = num_detections
+        self.weights = rng.standard_normal((90 * 90 * 3, num_detections * 6)).astype(np.float32)
+
+    def detect_batch(self, frames):
+        features = np.stack([frame[::8, ::8].reshape(-1) for frame in frames]).astype(np.float32) / 255
+        outputs = (features @ self.weights).reshape((len(frames), self.num_detections, 6))
+        results = []
+        for frame, output in zip(frames, outputs):
+            boxes = output[:, :4].copy()
+            boxes[0] = frame[0, 0, 0] # Lets the client check that it got its own frame's detections back
+            results.append((boxes, output[:, 4], output[:, 5].astype(np.int32)))
+        return results
+
+def run_clients(num_clients, seconds, latencies, errors):
+    def client_loop(index):
+        client = inference_client(endpoint)
+        frame = np.random.RandomState(index).randint(0, 256, (720, 720, 3)).astype(np.uint8)
+        end_time = time.perf_counter() + seconds
+        while (time.perf_counter() < end_time):
+            frame[0, 0, 0] = (int(frame[0, 0, 0]) + 1) % 256
+            start_time = time.perf_counter()
+            boxes, scores, labels = client.detect(frame)
+            latencies.append(time.perf_counter() - start_time)
+            if (boxes[0, 0] != frame[0, 0, 0] or len(scores) != 300 or len(labels) != 300):
+                errors.append(index)
+        client.close()
+
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(num_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+if __name__ == "__main__":
+    num_clients = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    detector = dense_detector()
+    ok = True
+    for max_batch_size in [1, num_clients]:
+        server = inference_server(detector, endpoint, max_batch_size=max_batch_size, max_latency=0.01)
+        server.start()
+        latencies = []
+        errors = []
+        run_clients(num_clients, seconds, latencies, errors)
+        server.stop()
+
+        stats = server.stats()
+        print(f"max batch {max_batch_size}: {len(latencies) / seconds:.1f} frames/s, " + \
+            f"client latency {np.mean(latencies) * 1000:.1f} ms mean {np.percentile(latencies, 95) * 1000:.1f} ms p95, " + \
+            f"mean batch {stats['mean_batch_size']:.2f}")
+        print(f"    batch sizes {stats['batch_sizes']}")
+        print(f"    queue wait {stats['queue_wait']['mean_ms']:.2f} ms mean {stats['queue_wait']['max_ms']:.2f} ms max, " + \
+            f"inference {stats['inference']['mean_ms']:.2f} ms per batch, {len(errors)} wrong replies")
+        if (len(errors) > 0 or stats["rejected"] > 0):
+            ok = False
+    if (ok == False):
+        sys.exit(1)
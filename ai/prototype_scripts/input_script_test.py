@@ -0,0 +1,88 @@
+import sys
+import time
+
+sys.path.append("..")
+from async_controller import threaded_controller
+from emulator_stub import emulator_stub
+from input_script import input_script, button_bits
+
+# Selects each of the 4 battle moves on the emulator stand-in (emulator_stub.py, 60 fps), once the old way
+# (a round trip and a 0.25 s sleep per key, like battle_ai.action_performer used to) and once as a single
+# input script with the timings battle_ai now uses. Checks that the emulator saw the same keys in the same
+# order and that the script's keys landed exactly the scripted number of frames apart, and reports how
+# long each took. Then gives a script too little time, so that its acknowledgement comes in after
+# run_script has timed out, and checks that a press queued meanwhile still reaches the emulator.
+#
+# python input_script_test.py
+
+key_wait_time = 0.25
+# Keys pressed to select each move: fight, reset the selector to the top_left move, move to it, select it
+move_keys = [["a", "up", "left", "a"], ["a", "up", "left", "right", "a"], ["a", "up", "left", "down", "a"], \
+    ["a", "up", "left", "down", "right", "a"]]
+action_for_key = {"up": 0, "right": 1, "down": 2, "left": 3, "a": 4}
+
+def select_move_old(ctrl, keys):
+    for key in keys:
+        time.sleep(key_wait_time)
+        ctrl.call(ctrl.ctrl.press, action_for_key[key])
+
+def make_script(keys):
+    script = input_script(hold_frames=2, release_frames=6)
+    script.wait(6)
+    script.press(keys[0], release_frames=15)
+    for key in keys[1:]:
+        script.press(key)
+    return script
+
+def pressed_keys(press_log):
+    names = {bits: name for name, bits in button_bits.items()}
+    return [names[buttons] for frame, buttons in press_log]
+
+if __name__ == "__main__":
+    emulator = emulator_stub()
+    emulator.start()
+    ctrl = threaded_controller()
+    ok = True
+
+    for move_index, keys in enumerate(move_keys):
+        emulator.press_log = []
+        start_time = time.perf_counter()
+        select_move_old(ctrl, keys)
+        old_time = time.perf_counter() - start_time
+        time.sleep(0.1) # The last key only reaches the emulator on its next frame
+        old_keys = pressed_keys(emulator.press_log)
+
+        emulator.press_log = []
+        script = make_script(keys)
+        start_time = time.perf_counter()
+        acknowledged = ctrl.run_script(script)
+        new_time = time.perf_counter() - start_time
+        new_keys = pressed_keys(emulator.press_log)
+        gaps = [emulator.press_log[i][0] - emulator.press_log[i - 1][0] for i in range(1, len(emulator.press_log))]
+
+        expected_gaps = [2 + 15] + [2 + 6] * (len(keys) - 2)
+        if (acknowledged == False or old_keys != keys or new_keys != keys or gaps != expected_gaps):
+            ok = False
+            print(f"Move {move_index}: old {old_keys}, script {new_keys} {gaps}, acknowledged {acknowledged}")
+        print(f"Move {move_index}: {len(keys)} keys, {old_time * 1000:.0f} ms one at a time, " + \
+            f"{new_time * 1000:.0f} ms as a script ({script.num_frames()} frames, 1 round trip)")
+
+    print(f"{emulator.num_scripts} scripts played, {ctrl.num_timeouts} timeouts")
+
+    emulator.press_log = []
+    script = make_script(move_keys[0])
+    ctrl.ctrl.script_id += 1
+    acknowledged = ctrl.call(ctrl.ctrl.send_command, script.to_bytes(ctrl.ctrl.script_id), ctrl.ctrl.script_id, \
+        0.2)
+    # Waiting for the emulator's next request while the script is still playing out, which is its late
+    # acknowledgement
+    ctrl.call(ctrl.ctrl.press, action_for_key["a"])
+    time.sleep(0.1)
+    late_keys = pressed_keys(emulator.press_log)
+    print(f"Script that timed out: acknowledged {acknowledged}, emulator saw {late_keys}")
+    if (acknowledged == True or late_keys != move_keys[0] + ["a"]):
+        ok = False
+    ctrl.stop()
+    emulator.stop()
+    if (ok == False):
+        sys.exit(1)
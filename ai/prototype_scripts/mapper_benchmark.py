@@ -0,0 +1,89 @@
+import sys
+import time
+import random
+import numpy as np
+
+sys.path.append("..")
+from mapper import live_map
+from map_tiles import tile_colours, label_to_tile, render_map
+
+# Compares the old per-tile rasteriser, which painted colours straight onto the map, with the vectorised
+# one that paints tile ids on a large map.
+# Run from this directory: python mapper_benchmark.py
+
+map_size = 200 # Tiles per side
+num_objects = 1500
+num_repeats = 5
+
+# The old fill_area, kept here so both versions can be timed against each other
+def old_fill_area(map_grid, area_bound, symbol):
+    if (np.array_equal(symbol, [66, 135, 245])): # npc
+        map_grid[area_bound[3]][area_bound[2]][:3] = [66, 135, 245]
+    elif (np.array_equal(symbol, [33, 255, 185])): # exit
+        if (not np.array_equal(map_grid[area_bound[1]][area_bound[0]][:3], [66, 135, 245])):
+            map_grid[area_bound[1]][area_bound[0]][:3] = [33, 255, 185]
+        if (not np.array_equal(map_grid[area_bound[1]][area_bound[2]][:3], [66, 135, 245])):
+            map_grid[area_bound[1]][area_bound[2]][:3] = [33, 255, 185]
+    else:
+        x = area_bound[0]
+        while (x <= area_bound[2]):
+            y = area_bound[1]
+            while (y <= area_bound[3]):
+                if (not np.array_equal(map_grid[y][x][:3], [66, 135, 245])):
+                    map_grid[y][x][:3] = symbol
+                y += 1
+            x += 1
+
+def old_draw(mp, map_grid):
+    map_grid[:,:,:3] = [0, 0, 0]
+    for label, box in mp.object_list:
+        old_fill_area(map_grid, mp.world_to_grid(box), list(tile_colours[label_to_tile(label)]))
+
+def make_map():
+    random.seed(0)
+    mp = live_map(720, 480, 120, [0, 0, 1, 0, 0, 0])
+    mp.map_buffer.grow(right=map_size - 15, down=map_size - 11)
+    mp.map_max_offset_x = map_size - 1
+    mp.map_max_offset_y = map_size - 1
+
+    for i in range(num_objects):
+        label = random.randint(0, 6)
+        x = random.randint(0, map_size - 5)
+        y = random.randint(0, map_size - 4)
+        if (label == 2 or label == 6):
+            box = [x, y, x, y]
+        else:
+            box = [x, y, x + random.randint(0, 4), y + random.randint(0, 3)]
+        mp.object_list.add(label, box)
+    return mp
+
+def time_it(func):
+    start_time = time.perf_counter()
+    for i in range(num_repeats):
+        func()
+    return (time.perf_counter() - start_time) / num_repeats * 1000
+
+mp = make_map()
+
+old_grid = np.zeros((map_size, map_size, 4), dtype=np.uint8)
+old_ms = time_it(lambda: old_draw(mp, old_grid))
+old_grid = old_grid[:,:,:3]
+
+new_ms = time_it(mp.redraw_all)
+new_grid = render_map(mp.cur_map_grid)
+
+# A typical mapping step only finds a handful of new or grown objects and moves the player by one tile
+def incremental_step():
+    for i in range(5):
+        x = random.randint(0, map_size - 5)
+        y = random.randint(0, map_size - 4)
+        mp.dirty_areas.append([x, y, x + 3, y + 2])
+    mp.dirty_areas.append([100, 100, 100, 100])
+    mp.redraw_dirty_areas()
+incremental_ms = time_it(incremental_step)
+
+print(f"{map_size}x{map_size} tiles, {num_objects} objects")
+print(f"Old full redraw: {old_ms:.2f} ms")
+print(f"New full redraw: {new_ms:.2f} ms ({old_ms / new_ms:.1f}x)")
+print(f"Incremental redraw: {incremental_ms:.2f} ms ({old_ms / incremental_ms:.1f}x)")
+print("Outputs identical: " + str(np.array_equal(old_grid, new_grid) and np.array_equal(new_grid, render_map(mp.cur_map_grid))))
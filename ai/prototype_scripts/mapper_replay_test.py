@@ -0,0 +1,134 @@
+import sys
+import time
+import random
+import pickle
+import numpy as np
+
+sys.path.append("..")
+from mapper import live_map
+from map_tiles import VISITED
+
+# Replays a recorded sequence of key presses, detections and RAM values through live_map, once with
+# the old per-tile draw_frontiers and once with the current one. Checks that both produce exactly the
+# same map on every step and reports how long mapping took.
+#
+# python mapper_replay_test.py                  Replays a synthetic recording
+# python mapper_replay_test.py --save rec.pkl   Also saves the synthetic recording
+# python mapper_replay_test.py rec.pkl          Replays a saved recording
+#
+# A recording is a pickled dict: {"init_ram": ram, "steps": [(key_pressed, detections, ram), ...]}
+# where detections is the list of (label, box) that poke_ai hands to draw_map.
+
+tile_size = 48
+padding = 120
+
+class old_live_map(live_map):
+    # The old draw_frontiers, kept here so both versions can be compared
+    def draw_frontiers(self, top_x, top_y):
+        self.local_top_x = top_x
+        self.local_top_y = top_y
+        self.local_bot_x = top_x + 14
+        self.local_bot_y = top_y + 10
+
+        for i in range(0, len(self.cur_map_grid)):
+            for j in range(0, len(self.cur_map_grid[i])):
+                if (j > self.local_top_x and j < self.local_bot_x) and \
+                    (i > self.local_top_y and i < self.local_bot_y):
+                    self.cur_map_grid[i][j][VISITED] = 1
+
+# Walks the player around a randomly generated town, recording what the detector would have seen
+def make_recording(num_steps=600, width=120, height=90, seed=0):
+    rng = random.Random(seed)
+    blocked = np.zeros((height, width), dtype=bool)
+    objects = []
+    for i in range(60):
+        x = rng.randint(1, width - 6)
+        y = rng.randint(1, height - 5)
+        objects.append((rng.choice([0, 1, 3, 3, 4]), x, y, x + 3, y + 2))
+        blocked[y:y + 3, x:x + 4] = True
+    for i in range(80):
+        x = rng.randint(1, width - 2)
+        y = rng.randint(1, height - 2)
+        objects.append((2, x, y, x, y))
+        blocked[y, x] = True
+
+    player_x = width // 2
+    player_y = height // 2
+    blocked[player_y, player_x] = False
+
+    def get_ram(collision):
+        return [player_x % 256, player_y % 256, 1, 0, 0, collision]
+
+    def get_detections():
+        view_x = player_x - 7
+        view_y = player_y - 5
+        detections = []
+        for label, x1, y1, x2, y2 in objects:
+            x1 = max(x1 - view_x, 0)
+            y1 = max(y1 - view_y, 0)
+            x2 = min(x2 - view_x, 14)
+            y2 = min(y2 - view_y, 10)
+            if (x1 > x2 or y1 > y2):
+                continue
+            box = np.array([x1 * tile_size + rng.uniform(-8, 8), y1 * tile_size + padding + rng.uniform(-8, 8), \
+                (x2 + 1) * tile_size + rng.uniform(-8, 8), (y2 + 1) * tile_size + padding + rng.uniform(-8, 8)])
+            detections.append((label, box))
+        return detections
+
+    recording = {"init_ram": get_ram(0), "steps": [(None, get_detections(), get_ram(0))]}
+    key_pressed = 0
+    for i in range(num_steps):
+        # Keep walking in the same direction for a while so that the map actually grows
+        if (rng.random() < 0.15):
+            key_pressed = rng.randint(0, 3)
+        dx, dy = [(0, -1), (1, 0), (0, 1), (-1, 0)][key_pressed]
+        new_x = player_x + dx
+        new_y = player_y + dy
+        if (new_x < 0 or new_y < 0 or new_x >= width or new_y >= height or blocked[new_y, new_x]):
+            recording["steps"].append((key_pressed, get_detections(), get_ram(1)))
+            key_pressed = rng.randint(0, 3)
+        else:
+            player_x = new_x
+            player_y = new_y
+            recording["steps"].append((key_pressed, get_detections(), get_ram(0)))
+    return recording
+
+def replay(map_class, recording):
+    mp = map_class(720, 480, padding, recording["init_ram"])
+    grids = []
+    start_time = time.perf_counter()
+    for key_pressed, detections, ram in recording["steps"]:
+        map_grid, collision_type = mp.draw_map(key_pressed, detections, ram)
+        grids.append((map_grid.copy(), collision_type))
+    return grids, time.perf_counter() - start_time
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--save"]
+    if ("--save" in sys.argv):
+        recording = make_recording()
+        with open(args[0], "wb") as f:
+            pickle.dump(recording, f)
+    elif (len(args) > 0):
+        with open(args[0], "rb") as f:
+            recording = pickle.load(f)
+    else:
+        recording = make_recording()
+
+    old_grids, old_time = replay(old_live_map, recording)
+    new_grids, new_time = replay(live_map, recording)
+
+    num_steps = len(recording["steps"])
+    mismatch = None
+    for i in range(num_steps):
+        if (old_grids[i][1] != new_grids[i][1] or not np.array_equal(old_grids[i][0], new_grids[i][0])):
+            mismatch = i
+            break
+
+    print(f"Replayed {num_steps} steps, final map is {new_grids[-1][0].shape[1]}x{new_grids[-1][0].shape[0]} tiles")
+    print(f"Old draw_frontiers: {old_time / num_steps * 1000:.2f} ms per step")
+    print(f"New draw_frontiers: {new_time / num_steps * 1000:.2f} ms per step ({old_time / new_time:.1f}x)")
+    if (mismatch == None):
+        print("Maps identical on every step")
+    else:
+        print(f"Maps differ from step {mismatch}")
+        sys.exit(1)
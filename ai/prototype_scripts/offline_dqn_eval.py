@@ -0,0 +1,190 @@
+import os
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+from keras.models import Sequential
+from keras.layers import Dense
+from keras.optimizers import Adam
+
+sys.path.append("..")
+from battle_ai.battle_ai import battle_ai
+from battle_ai.replay_memory import replay_memory
+
+# Measures how many training steps battle_ai's DQN needs with and without a target network and Double-DQN,
+# training on saved transitions instead of battles in the emulator. Every configuration starts from the
+# same initial weights and trains on the same transitions, and every eval_interval steps is scored on:
+#  - the Bellman residual on held out transitions (the newest fifth), r + gamma * max Q(s') - Q(s, a)
+#  - the mean of max Q(s) over them, which runs away when the targets chase the model
+#  - with simulated battles, the mean reward the greedy policy gets in eval_battles battles
+#
+# Without a replay memory saved by battle_ai (standalone_backend.py --replay-memory), transitions come from a
+# simple simulated battle where one move is the best on average, played with random moves. Steps to
+# converge is then the first step at which the greedy policy gets within 5% of always using that move.
+#
+# python offline_dqn_eval.py [replay_memory.npz] [num_steps] [eval_interval]
+
+configs = [
+    ("No target network", {}),
+    ("Hard target updates", {"target_update": "hard", "target_update_interval": 100}),
+    ("Soft target updates", {"target_update": "soft", "target_tau": 0.01}),
+    ("Double DQN, hard updates", {"target_update": "hard", "target_update_interval": 100, "double_dqn": True}),
+    ("Double DQN, soft updates", {"target_update": "soft", "target_tau": 0.01, "double_dqn": True}),
+]
+eval_battles = 200
+
+# Same model as poke_ai uses
+def make_battle_model():
+    battle_model = Sequential()
+    battle_model.add(Dense(24, input_dim=2, activation='relu'))
+    battle_model.add(Dense(24, activation='relu'))
+    battle_model.add(Dense(4, activation='linear'))
+    battle_model.compile(loss='mse', optimizer=Adam(lr=0.001))
+    return battle_model
+
+# A 1v1 battle in HP only, as battle_ai sees it. Our move hits for damage with probability accuracy,
+# then the opponent hits back if it's still standing. Rewards are worked out the same way as battle_ai's.
+class battle_simulator:
+    move_damage = np.array([12.0, 20.0, 45.0, 30.0])
+    move_accuracy = np.array([1.0, 0.9, 0.5, 0.85]) # The last move is the best on average
+    opponent_damage = (8, 24)
+
+    def __init__(self, seed):
+        self.rng = np.random.RandomState(seed)
+
+    # Plays a turn of every battle in states (n, 2) at once, returns (next_states, rewards, dones)
+    def step(self, states, actions):
+        hits = self.rng.uniform(size=len(actions)) < self.move_accuracy[actions]
+        next_states = states.copy()
+        next_states[:, 1] = np.maximum(states[:, 1] - np.round(self.move_damage[actions]) * hits, 0)
+        opponent_hits = self.rng.randint(self.opponent_damage[0], self.opponent_damage[1] + 1, len(actions))
+        next_states[:, 0] = np.where(next_states[:, 1] > 0, np.maximum(states[:, 0] - opponent_hits, 0), \
+            states[:, 0])
+        rewards = (states[:, 1] - next_states[:, 1]) - (states[:, 0] - next_states[:, 0])
+        rewards += np.where(next_states[:, 1] <= 0, 200, np.where(next_states[:, 0] <= 0, -200, 0))
+        dones = (next_states[:, 0] <= 0) | (next_states[:, 1] <= 0)
+        return next_states, rewards, dones
+
+    def new_states(self, n):
+        return np.full((n, 2), 141.0)
+
+    # Random moves, like battle_ai with epsilon at 1, in the order battle_ai would have stored them
+    def make_transitions(self, num_transitions):
+        memory = replay_memory(num_transitions)
+        state = self.new_states(1)
+        while (len(memory) < num_transitions):
+            action = self.rng.randint(0, 4, 1)
+            next_state, reward, done = self.step(state, action)
+            memory.append(state, action[0], reward[0], next_state, done[0])
+            state = self.new_states(1) if done[0] == True else next_state
+        return memory
+
+    # Mean reward per battle of choose_actions(states) over num_battles battles
+    def mean_battle_reward(self, choose_actions, num_battles):
+        states = self.new_states(num_battles)
+        total_rewards = np.zeros(num_battles)
+        ongoing = np.ones(num_battles, dtype=np.bool_)
+        for turn in range(100):
+            if (np.any(ongoing) == False):
+                break
+            next_states, rewards, dones = self.step(states[ongoing], choose_actions(states[ongoing]))
+            total_rewards[ongoing] += rewards
+            states[ongoing] = next_states
+            ongoing[np.flatnonzero(ongoing)[dones]] = False
+        return float(np.mean(total_rewards))
+
+# The transitions in a replay memory from oldest to newest
+def ordered_transitions(memory):
+    order = (np.arange(len(memory)) + (memory.position - len(memory))) % memory.capacity
+    return memory.init_states[order], memory.actions[order], memory.rewards[order], memory.next_states[order], \
+        memory.dones[order]
+
+def load_transitions(path):
+    with np.load(path) as data:
+        capacity = len(data["actions"])
+    memory = replay_memory(capacity)
+    memory.load(path)
+    return memory
+
+def bellman_residual(model, gamma, init_states, actions, rewards, next_states, dones):
+    next_values = np.amax(model.predict_on_batch(next_states), axis=1)
+    targets = np.where(dones, rewards, rewards + gamma * next_values)
+    predictions = model.predict_on_batch(init_states)
+    return float(np.mean((targets - predictions[np.arange(len(actions)), actions]) ** 2)), \
+        float(np.mean(np.amax(predictions, axis=1)))
+
+def evaluate_config(options, initial_weights, train, held_out, num_steps, eval_interval, simulator, \
+    target_reward):
+    model = make_battle_model()
+    model.set_weights(initial_weights)
+    ai = battle_ai(model, memory_capacity=len(train[1]), replay_path=None, **options)
+    for transition in zip(*train):
+        ai.battle_data.append(*transition)
+    np.random.seed(0)
+    ai.battle_data.rng = np.random.RandomState(0) # Every configuration sees the same minibatches
+
+    rows = []
+    converged_step = None
+    start_time = time.perf_counter()
+    for step in range(num_steps + 1):
+        if (step % eval_interval == 0):
+            residual, mean_max_q = bellman_residual(model, ai.gamma, *held_out)
+            battle_reward = None
+            if (simulator != None):
+                battle_reward = simulator.mean_battle_reward( \
+                    lambda states: np.argmax(model.predict_on_batch(states), axis=1), eval_battles)
+                if (converged_step == None and battle_reward >= target_reward - 0.05 * abs(target_reward)):
+                    converged_step = step
+            rows.append((step, residual, mean_max_q, battle_reward))
+        if (step < num_steps):
+            ai.do_training_step(model, ai.target_net)
+    return rows, converged_step, (time.perf_counter() - start_time) / max(num_steps, 1)
+
+if __name__ == "__main__":
+    replay_path = None
+    args = sys.argv[1:]
+    if (len(args) > 0 and args[0].endswith(".npz")):
+        replay_path = os.path.abspath(args.pop(0))
+    num_steps = int(args[0]) if len(args) > 0 else 2000
+    eval_interval = int(args[1]) if len(args) > 1 else 100
+    os.chdir("..") # battle_ai loads its template images relative to ai/
+
+    simulator = None
+    target_reward = None
+    if (replay_path != None):
+        memory = load_transitions(replay_path)
+        print(f"{len(memory)} transitions from {replay_path}")
+    else:
+        simulator = battle_simulator(0)
+        memory = simulator.make_transitions(3000)
+        target_reward = simulator.mean_battle_reward(lambda states: np.full(len(states), 3), 2000)
+        print(f"{len(memory)} simulated transitions, always using the best move gets {target_reward:.1f} " + \
+            "per battle")
+
+    transitions = ordered_transitions(memory)
+    split = int(len(memory) * 0.8)
+    train = [array[:split] for array in transitions]
+    held_out = [array[split:] for array in transitions]
+
+    tf.set_random_seed(0)
+    np.random.seed(0)
+    initial_weights = make_battle_model().get_weights()
+
+    for name, options in configs:
+        if (simulator != None):
+            simulator.rng = np.random.RandomState(1) # Same evaluation battles for every configuration
+        rows, converged_step, step_time = evaluate_config(options, initial_weights, train, held_out, \
+            num_steps, eval_interval, simulator, target_reward)
+        print("")
+        print(f"{name} ({step_time * 1000:.1f} ms per training step)")
+        for step, residual, mean_max_q, battle_reward in rows:
+            line = f"  step {step:5d}: Bellman residual {residual:9.1f}, mean max Q {mean_max_q:7.1f}"
+            if (battle_reward != None):
+                line += f", greedy battle reward {battle_reward:6.1f}"
+            print(line)
+        if (simulator != None):
+            if (converged_step != None):
+                print(f"  Steps to converge: {converged_step}")
+            else:
+                print(f"  Did not converge within {num_steps} steps")
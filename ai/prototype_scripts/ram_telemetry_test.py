@@ -0,0 +1,66 @@
+import sys
+import time
+import timeit
+import numpy as np
+
+sys.path.append("..")
+from ram_telemetry import ram_subscriber, pack_ram_frame, decode_ram_frame
+from emulator_stub import emulator_stub
+
+# Checks the binary RAM telemetry against the emulator stand-in (emulator_stub.py, 60 fps) and times it
+# against the old string protocol:
+#   - decoding a frame compared to ord() over a 6 character string
+#   - reading the RAM, which used to drain 10 messages (10 frames) from the socket every time
+#   - wait_for_newer, which should return on the next frame
+#
+# python ram_telemetry_test.py
+
+def old_decode(string):
+    vals = [0,0,0,0,0,0]
+    for i in range(0,6):
+        if (i + 1) > len(string):
+            break
+        vals[i] = ord(string[i])
+    return vals
+
+if __name__ == "__main__":
+    values = [12, 34, 2, 1, 1, 1]
+    frame = pack_ram_frame(7, 1234, values)
+    record = decode_ram_frame(frame)
+    assert record["seq"] == 7 and record["frame"] == 1234 and record["values"].tolist() == values
+    string = "".join(chr(val) for val in values)
+    num_decodes = 100000
+    old_time = timeit.timeit(lambda: old_decode(string), number=num_decodes) / num_decodes
+    new_time = timeit.timeit(lambda: decode_ram_frame(frame), number=num_decodes) / num_decodes
+    print(f"Decode: string {old_time * 1e6:.2f} us, binary frame {new_time * 1e6:.2f} us")
+
+    emulator = emulator_stub()
+    emulator.start()
+    ram = ram_subscriber("tcp://localhost:5556")
+    ram.start()
+    first = ram.wait_for_newer(timeout=2.0)
+    assert first != None, "No RAM frames received"
+
+    num_reads = 10000
+    start_time = time.perf_counter()
+    for i in range(num_reads):
+        vals = ram.get_ram_vals()
+    read_time = (time.perf_counter() - start_time) / num_reads
+    print(f"get_ram_vals: {read_time * 1e6:.2f} us (draining 10 messages at 60 fps took ~{10 / 60 * 1000:.0f} ms)")
+
+    waits = []
+    for i in range(60):
+        snapshot = ram.latest()
+        start_time = time.perf_counter()
+        newer = ram.wait_for_newer(snapshot.frame, timeout=1.0)
+        waits.append(time.perf_counter() - start_time)
+        assert newer != None and newer.frame > snapshot.frame
+    print(f"wait_for_newer: {np.mean(waits) * 1000:.1f} ms mean, {np.max(waits) * 1000:.1f} ms max " + \
+        f"(a frame is {1000 / 60:.1f} ms)")
+
+    emulator.stop()
+    ram.stop()
+    last = ram.latest()
+    print(f"{ram.num_received} frames received up to frame {last.frame}, {ram.num_dropped} dropped, " + \
+        f"{ram.num_rejected} rejected")
+    assert last.to_list() == emulator.sim.get_ram_vals()
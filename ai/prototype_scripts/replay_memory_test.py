@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+import numpy as np
+
+sys.path.append("..")
+from battle_ai.replay_memory import replay_memory
+
+# Compares battle_ai's replay_memory with the list of (init_state, action, reward, next_state, done) tuples
+# it replaced: memory used per transition, and the time to sample a minibatch and stack it into arrays
+# ready for the model. Also checks that prioritized sampling follows the priorities and that a memory
+# comes back the same after save() and load().
+#
+# python replay_memory_test.py [num_transitions]
+
+batch_size = 16
+
+def make_transition(rng):
+    init_state = rng.randint(0, 142, (1, 2)).astype(np.float64)
+    next_state = np.maximum(init_state - rng.randint(0, 40, (1, 2)), 0)
+    done = bool(next_state[0][0] == 0 or next_state[0][1] == 0)
+    reward = (init_state[0][1] - next_state[0][1]) - (init_state[0][0] - next_state[0][0])
+    return (init_state, rng.randint(0, 4), reward, next_state, done)
+
+# Memory still allocated after making num_transitions transitions and adding them to a memory, that is
+# what the memory holds on to
+def allocated_bytes(append, num_transitions):
+    rng = np.random.RandomState(0)
+    tracemalloc.start()
+    for i in range(num_transitions):
+        append(make_transition(rng))
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+def time_appending(append, transitions):
+    start_time = time.perf_counter()
+    for transition in transitions:
+        append(transition)
+    return (time.perf_counter() - start_time) / len(transitions)
+
+def old_sample(battle_data):
+    training_batch = random.sample(battle_data, batch_size)
+    return np.concatenate([init_state for init_state, action, reward, next_state, done in training_batch]), \
+        np.array([action for init_state, action, reward, next_state, done in training_batch]), \
+        np.array([reward for init_state, action, reward, next_state, done in training_batch]), \
+        np.concatenate([next_state for init_state, action, reward, next_state, done in training_batch]), \
+        np.array([done for init_state, action, reward, next_state, done in training_batch])
+
+def time_sampling(sample, num_samples=2000):
+    start_time = time.perf_counter()
+    for i in range(num_samples):
+        sample()
+    return (time.perf_counter() - start_time) / num_samples
+
+if __name__ == "__main__":
+    num_transitions = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rng = np.random.RandomState(0)
+    transitions = [make_transition(rng) for i in range(num_transitions)]
+    ok = True
+
+    old_bytes = allocated_bytes([].append, num_transitions)
+    memory = replay_memory(num_transitions, seed=0)
+    memory_bytes = sum(array.nbytes for array in [memory.init_states, memory.actions, memory.rewards, \
+        memory.next_states, memory.dones])
+    new_bytes = allocated_bytes(lambda transition: memory.append(*transition), num_transitions)
+    print(f"{num_transitions} transitions: list of tuples {old_bytes / num_transitions:.0f} bytes each, " + \
+        f"replay_memory {memory_bytes / num_transitions:.0f} bytes each (preallocated, " + \
+        f"{new_bytes / num_transitions:.1f} more allocated while appending)")
+
+    battle_data = []
+    old_append = time_appending(battle_data.append, transitions)
+    memory = replay_memory(num_transitions, seed=0)
+    new_append = time_appending(lambda transition: memory.append(*transition), transitions)
+    print(f"Appending: {old_append * 1e6:.2f} us to the list, {new_append * 1e6:.2f} us to replay_memory")
+
+    old_time = time_sampling(lambda: old_sample(battle_data))
+    new_time = time_sampling(lambda: memory.sample(batch_size))
+    prioritized = replay_memory(num_transitions, prioritized=True, seed=0)
+    for transition in transitions:
+        prioritized.append(*transition)
+    prioritized_time = time_sampling(lambda: prioritized.sample(batch_size))
+    print(f"Sampling {batch_size} into arrays: {old_time * 1e6:.1f} us from the list, {new_time * 1e6:.1f} us " + \
+        f"uniform, {prioritized_time * 1e6:.1f} us prioritized")
+
+    # One transition in 100 gets a big TD error, they should be sampled in proportion to their priorities
+    td_errors = np.where(np.arange(num_transitions) % 100 == 0, 100.0, 0.1)
+    prioritized.update_priorities(np.arange(num_transitions), td_errors)
+    sampled = np.concatenate([prioritized.sample(batch_size)[0] for i in range(500)])
+    share = np.mean(sampled % 100 == 0)
+    priorities = (np.abs(td_errors) + prioritized.priority_epsilon) ** prioritized.alpha
+    expected = priorities[::100].sum() / priorities.sum()
+    print(f"Prioritized: {share:.3f} of samples from high priority transitions, expected {expected:.3f}")
+    if (abs(share - expected) > 0.05):
+        ok = False
+
+    path = os.path.join(tempfile.gettempdir(), "replay_memory_test.npz")
+    prioritized.save(path)
+    loaded = replay_memory(num_transitions, prioritized=True, seed=0)
+    loaded.load(path)
+    same = len(loaded) == len(prioritized) and np.array_equal(loaded.rewards, prioritized.rewards) and \
+        np.array_equal(loaded.init_states, prioritized.init_states) and \
+        np.allclose(loaded.tree.tree, prioritized.tree.tree)
+    print(f"Saved to {os.path.getsize(path) / 1024:.0f} KB and loaded back: {'same' if same else 'different'}")
+    os.remove(path)
+    if (same == False or ok == False):
+        sys.exit(1)
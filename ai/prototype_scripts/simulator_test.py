@@ -0,0 +1,52 @@
+import sys
+import io
+import time
+import random
+import contextlib
+import numpy as np
+
+sys.path.append("..")
+from simulator import map_simulator, load_training_map
+from exploration_runner import explore
+
+# Explores some of the maps in object_detection/training_maps with live_map and path_finder driving the
+# headless simulator, the same way poke_ai.run_step drives the emulator. Reports coverage, how many
+# steps per second mapping and path finding manage without an emulator and how fast the simulator is on
+# its own.
+#
+# python simulator_test.py                              littleroot, route101 and petalburg
+# python simulator_test.py oldale.DIB.png rustboro.DIB.png
+# python simulator_test.py --labels maps.csv littleroot.DIB.png
+
+num_steps = 2000
+
+# Random walk, only the simulator itself
+def time_simulator(world, num_steps):
+    sim = map_simulator(world, box_noise=8)
+    start_time = time.perf_counter()
+    for i in range(num_steps):
+        sim.perform_movement()
+        sim.get_detections()
+    return num_steps / (time.perf_counter() - start_time)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    labels_csv = None
+    if ("--labels" in args):
+        labels_csv = args[args.index("--labels") + 1]
+        args.remove("--labels")
+        args.remove(labels_csv)
+    map_names = args if len(args) > 0 else ["littleroot.DIB.png", "route101.DIB.png", "petalburg.DIB.png"]
+
+    for map_name in map_names:
+        random.seed(0)
+        world = load_training_map(map_name, labels_csv)
+        sim = map_simulator(world, box_noise=8)
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()): # path_finder prints every decision
+            mp = explore(sim, num_steps)
+        total_time = time.perf_counter() - start_time
+
+        print(f"{map_name}: {world.width}x{world.height} tiles, {np.count_nonzero(world.reachable)} reachable")
+        print(f"  {sim.num_steps} steps, {sim.num_collisions} collisions, {sim.coverage() * 100:.1f}% covered")
+        print(f"  {sim.num_steps / total_time:.0f} steps per second, simulator alone {time_simulator(world, 20000):.0f}")
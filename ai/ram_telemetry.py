@@ -0,0 +1,136 @@
+import struct
+import threading
+import time
+import numpy as np
+import zmq
+
+# Binary RAM telemetry published by the emulator's RAM watch (RamFrame in
+# vba-rerecording/src/win32/Dialogs/ramwatch.cpp), replacing the old 6 character string. Every frame is
+# little endian:
+#   version     u8   ram_frame_version, frames with any other version are rejected
+#   num_values  u8   6
+#   reserved    u16
+#   seq         u32  incremented for every frame sent, a gap means frames were dropped
+#   frame       u32  emulator frame the values were read on
+#   values      6 x u8, the same values get_ram_vals has always returned: [x, y, direction, trainer
+#               battle flag, wild battle flag, collision flag]
+
+ram_frame_version = 1
+ram_frame_format = "<BBHII6B"
+ram_frame_size = struct.calcsize(ram_frame_format)
+ram_frame_dtype = np.dtype([("version", "u1"), ("num_values", "u1"), ("reserved", "<u2"), ("seq", "<u4"), \
+    ("frame", "<u4"), ("values", "u1", (6,))])
+
+def pack_ram_frame(seq, frame, values):
+    return struct.pack(ram_frame_format, ram_frame_version, 6, 0, seq & 0xffffffff, frame & 0xffffffff, *values)
+
+# Decodes a frame without copying it, the returned record is a view on buffer (anything supporting the
+# buffer protocol, bytes, memoryview, zmq.Frame.buffer...)
+def decode_ram_frame(buffer):
+    if (len(buffer) != ram_frame_size):
+        raise ValueError(f"RAM frame is {len(buffer)} bytes, expected {ram_frame_size}")
+    record = np.frombuffer(buffer, dtype=ram_frame_dtype, count=1)[0]
+    if (record["version"] != ram_frame_version):
+        raise ValueError(f"RAM frame version {record['version']}, expected {ram_frame_version}")
+    return record
+
+# Latest state of the RAM, as a decoded frame along with when it arrived
+class ram_snapshot:
+    def __init__(self, record, receive_time):
+        self.record = record
+        self.receive_time = receive_time
+
+    @property
+    def seq(self):
+        return int(self.record["seq"])
+
+    @property
+    def frame(self):
+        return int(self.record["frame"])
+
+    @property
+    def values(self):
+        return self.record["values"]
+
+    # Values as the 6 int list backend_controller.get_ram_vals returns
+    def to_list(self):
+        return self.values.tolist()
+
+
+# Keeps the latest RAM snapshot up to date on a background thread, so reading it is O(1) instead of
+# draining the socket on every read
+class ram_subscriber:
+    def __init__(self, endpoint="tcp://localhost:5556", context=None):
+        self.endpoint = endpoint
+        self.context = context if context != None else zmq.Context.instance()
+        self.cond = threading.Condition()
+        self.snapshot = None
+
+        self.num_received = 0
+        self.num_dropped = 0 # Frames missing from the sequence numbers
+        self.num_rejected = 0 # Frames that couldn't be decoded
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if (self.thread != None):
+            self.thread.join()
+
+    def run(self):
+        # The socket is only ever used from this thread
+        socket = self.context.socket(zmq.SUB)
+        socket.setsockopt(zmq.SUBSCRIBE, b"")
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.endpoint)
+        poller = zmq.Poller()
+        poller.register(socket, zmq.POLLIN)
+        try:
+            while (self.running == True):
+                if (len(poller.poll(100)) == 0): # Wakes up now and then to check for stop()
+                    continue
+                message = socket.recv(copy=False)
+                try:
+                    record = decode_ram_frame(message.buffer)
+                except ValueError:
+                    self.num_rejected += 1
+                    continue
+                self.update(ram_snapshot(record, time.perf_counter()))
+        finally:
+            socket.close()
+
+    def update(self, snapshot):
+        with self.cond:
+            if (self.snapshot != None):
+                gap = (snapshot.seq - self.snapshot.seq - 1) & 0xffffffff
+                if (gap < 0x80000000): # Otherwise an old frame arrived late, or the emulator restarted
+                    self.num_dropped += gap
+            self.snapshot = snapshot
+            self.num_received += 1
+            self.cond.notify_all()
+
+    # Latest snapshot, None if nothing has arrived yet
+    def latest(self):
+        return self.snapshot
+
+    # Waits for a snapshot read on a later emulator frame than frame (-1 for any). Returns it, or None on
+    # timeout.
+    def wait_for_newer(self, frame=-1, timeout=None):
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.snapshot != None and self.snapshot.frame > frame, timeout):
+                return None
+            return self.snapshot
+
+    def get_ram_vals(self, timeout=None):
+        snapshot = self.snapshot
+        if (snapshot == None):
+            snapshot = self.wait_for_newer(timeout=timeout)
+            if (snapshot == None):
+                return [0, 0, 0, 0, 0, 0]
+        return snapshot.to_list()
@@ -0,0 +1,274 @@
+import os
+import csv
+import random
+import numpy as np
+import cv2
+from grid_search import move_steps
+from map_tiles import tile_colours, label_to_tile
+
+# Headless stand-in for the emulator, so that live_map and path_finder can be run (and timed) without
+# VBA-rr, screen capture or ZeroMQ. The player walks around a ground truth tile grid, and the simulator
+# serves the same things the real setup does:
+#   - get_ram_vals() returns the same 6 values as backend_controller.get_ram_vals, [x, y, direction,
+#     trainer battle flag, wild battle flag, collision flag]
+#   - perform_movement(action) takes the same 0-4 actions and returns (key_pressed, ram_vals)
+#   - get_detections() returns the (label, box) list that poke_ai hands to live_map.draw_map, with the
+#     boxes in the coordinates of the padded 720x720 frame
+#   - get_screen() returns the padded frame itself
+#
+# Tiles that are blocked but not covered by a labelled object (trees, fences, water...) are never
+# detected, the player only finds out about them by walking into them, like with the real detector.
+
+tile_size = 48 # Size of a tile on the 720x480 game window
+padding = 120 # Black bars above and below the game window to make it square
+view_width = 15
+view_height = 11
+view_player_x = 7 # Player's position in the view
+view_player_y = 5
+
+# Directions in the RAM (1 down, 2 up, 3 left, 4 right) by action (0 up, 1 right, 2 down, 3 left)
+ram_directions = [2, 4, 1, 3]
+
+training_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "object_detection")
+default_maps_dir = os.path.join(training_dir, "training_maps")
+default_labels_path = os.path.join(training_dir, "training_csvs", "labels.csv")
+
+# Labels the player can walk through, exits (doors) and grass
+passable_labels = [5, 7]
+# Average BGR colours of the tiles the player can walk on in the training maps: grass, sand path and
+# tall grass
+hoenn_ground_colours = [[161, 192, 114], [125, 196, 211], [82, 166, 95]]
+
+class grid_world:
+    # blocked is a 2D bool array of the tiles the player can't walk onto, objects a list of
+    # (label, x1, y1, x2, y2) in tiles (inclusive) that the detector sees, start the player's starting
+    # tile as (x, y) and image an optional BGR picture of the world, tile_pixels pixels per tile
+    def __init__(self, blocked, objects, start=None, image=None, tile_pixels=16):
+        self.blocked = blocked
+        self.height, self.width = blocked.shape
+        self.objects = objects
+        self.tile_pixels = tile_pixels
+        # Object tiles as an array so that the objects in view can be found without a loop
+        self.object_labels = np.array([obj[0] for obj in objects], dtype=np.int32)
+        self.object_bounds = np.array([obj[1:] for obj in objects], dtype=np.int32).reshape(-1, 4)
+
+        if (start == None):
+            start = self.find_start()
+        self.start = (start[0], start[1])
+        # Tiles the player can get to from the start, what coverage is measured against
+        num_labels, components = cv2.connectedComponents((~blocked).astype(np.uint8), connectivity=4)
+        self.reachable = components == components[self.start[1], self.start[0]]
+
+        if (image is None):
+            image = self.draw_image()
+        self.image = image
+
+    # Walkable tile closest to the middle of the largest area the player can walk around in
+    def find_start(self):
+        num_labels, components = cv2.connectedComponents((~self.blocked).astype(np.uint8), connectivity=4)
+        sizes = np.bincount(components[~self.blocked])
+        ys, xs = np.nonzero(components == sizes.argmax())
+        closest = np.argmin(np.abs(xs - self.width // 2) + np.abs(ys - self.height // 2))
+        return (int(xs[closest]), int(ys[closest]))
+
+    # Picture of the world for get_screen when there is no map image, objects drawn in their map colours
+    # and the other blocked tiles grey
+    def draw_image(self):
+        tiles = np.full((self.height, self.width, 3), 100, dtype=np.uint8)
+        tiles[self.blocked] = 40
+        for label, x1, y1, x2, y2 in self.objects:
+            tile = label_to_tile(label)
+            if (tile != None):
+                tiles[y1:y2 + 1, x1:x2 + 1] = tile_colours[tile]
+        return cv2.resize(tiles, (self.width * self.tile_pixels, self.height * self.tile_pixels), \
+            interpolation=cv2.INTER_NEAREST)
+
+# Map ids for the labels in labels.csv, e.g. {"pokecen": 0, ...}
+def load_label_ids(labels_path=default_labels_path):
+    with open(labels_path) as f:
+        return {row[0]: int(row[1]) for row in csv.reader(f) if len(row) == 2}
+
+# Loads one of the town/route pictures in object_detection/training_maps as a grid_world. Objects come
+# from the rows of labels_csv (filename,width,height,class,xmin,ymin,xmax,ymax in map pixels) whose
+# filename is the map's. Every labelled object except exits and grass blocks its tiles.
+#
+# The rest of the blocked tiles are guessed from the picture. A tile is walkable if its average colour is
+# within ground_tolerance (summed over B, G and R) of one of walkable_colours, by default the grass,
+# sand path and tall grass of the Hoenn maps, or of the most common tile colour on the map (the ground of
+# towns with their own tileset) unless that is water.
+def load_training_map(map_path, labels_csv=None, labels_path=default_labels_path, start=None, \
+    tile_pixels=16, ground_tolerance=30, walkable_colours=hoenn_ground_colours):
+    if not os.path.exists(map_path):
+        map_path = os.path.join(default_maps_dir, map_path)
+    image = cv2.imread(map_path)
+    if (image is None):
+        raise FileNotFoundError(map_path)
+    height = image.shape[0] // tile_pixels
+    width = image.shape[1] // tile_pixels
+    image = image[:height * tile_pixels, :width * tile_pixels]
+
+    # Average colour of every tile
+    tile_means = image.reshape(height, tile_pixels, width, tile_pixels, 3).mean(axis=(1, 3))
+    quantised = (tile_means // 8).astype(np.int32)
+    colour_keys = (quantised[:,:,0] << 10) | (quantised[:,:,1] << 5) | quantised[:,:,2]
+    keys, counts = np.unique(colour_keys, return_counts=True)
+    ground = tile_means[colour_keys == keys[counts.argmax()]].mean(axis=0)
+    walkable = np.zeros((height, width), dtype=bool)
+    if not (ground[0] > ground[1] and ground[0] > ground[2]): # Mostly blue, water
+        walkable |= np.abs(tile_means - ground).sum(axis=2) < ground_tolerance
+    for colour in walkable_colours:
+        walkable |= np.abs(tile_means - np.array(colour)).sum(axis=2) < ground_tolerance
+    blocked = ~walkable
+
+    objects = []
+    if (labels_csv != None):
+        label_ids = load_label_ids(labels_path)
+        filename = os.path.basename(map_path)
+        with open(labels_csv) as f:
+            for row in csv.DictReader(f):
+                if (row["filename"] != filename or not (row["class"] in label_ids)):
+                    continue
+                label = label_ids[row["class"]]
+                x1 = max(int(float(row["xmin"])) // tile_pixels, 0)
+                y1 = max(int(float(row["ymin"])) // tile_pixels, 0)
+                x2 = min((int(float(row["xmax"])) - 1) // tile_pixels, width - 1)
+                y2 = min((int(float(row["ymax"])) - 1) // tile_pixels, height - 1)
+                objects.append((label, x1, y1, x2, y2))
+                blocked[y1:y2 + 1, x1:x2 + 1] = not (label in passable_labels)
+
+    return grid_world(blocked, objects, start, image, tile_pixels)
+
+# Randomly generated town: buildings (4x3 tiles) and NPCs that the detector sees, and single blocked tiles
+# that it doesn't, all inside a border of blocked tiles
+def make_random_world(seed, width=60, height=45, num_buildings=12, num_npcs=15, num_walls=60):
+    rng = random.Random(seed)
+    blocked = np.zeros((height, width), dtype=bool)
+    blocked[0,:] = blocked[-1,:] = blocked[:,0] = blocked[:,-1] = True
+    objects = []
+    for i in range(num_buildings):
+        x = rng.randint(2, width - 7)
+        y = rng.randint(2, height - 6)
+        objects.append((rng.choice([0, 1, 3, 3, 3, 4]), x, y, x + 3, y + 2))
+        blocked[y:y + 3, x:x + 4] = True
+    for i in range(num_npcs):
+        x = rng.randint(1, width - 2)
+        y = rng.randint(1, height - 2)
+        objects.append((2, x, y, x, y))
+        blocked[y, x] = True
+    for i in range(num_walls):
+        blocked[rng.randint(1, height - 2), rng.randint(1, width - 2)] = True
+    return grid_world(blocked, objects)
+
+class map_simulator:
+    # box_noise is how many pixels (at most) each side of a detection box is moved by, the real detector
+    # is never exact. wild_battle_rate is the chance of a wild battle after each step on grass, the wild
+    # battle flag then stays set until end_battle() is called.
+    def __init__(self, world, seed=0, box_noise=0, wild_battle_rate=0.0):
+        self.world = world
+        self.rng = random.Random(seed)
+        self.box_noise = box_noise
+        self.wild_battle_rate = wild_battle_rate
+
+        self.x, self.y = world.start
+        self.direction = 1 # Facing down
+        self.collision = 0
+        self.wild_battle = 0
+        self.num_steps = 0
+        self.num_collisions = 0
+        # Tiles that have been inside the player's view
+        self.seen = np.zeros(world.blocked.shape, dtype=bool)
+        self.mark_seen()
+
+    def get_ram_vals(self):
+        return [self.x % 256, self.y % 256, self.direction, 0, self.wild_battle, self.collision]
+
+    def is_blocked(self, x, y):
+        if (x < 0 or y < 0 or x >= self.world.width or y >= self.world.height):
+            return True
+        return bool(self.world.blocked[y, x])
+
+    def on_grass(self):
+        for label, x1, y1, x2, y2 in self.world.objects:
+            if (label == 7 and x1 <= self.x <= x2 and y1 <= self.y <= y2):
+                return True
+        return False
+
+    def mark_seen(self):
+        x1 = max(self.x - view_player_x, 0)
+        y1 = max(self.y - view_player_y, 0)
+        self.seen[y1:self.y - view_player_y + view_height, x1:self.x - view_player_x + view_width] = True
+
+    # Same as backend_controller.perform_movement, turns to face the direction if needed and takes a step.
+    # action -1 is a random movement.
+    def perform_movement(self, action=-1):
+        if (action == -1):
+            action = self.rng.randint(0, 3)
+        if (action == 4):
+            return self.interact(), self.get_ram_vals()
+
+        self.num_steps += 1
+        self.direction = ram_directions[action]
+        dx, dy = move_steps[action]
+        if (self.is_blocked(self.x + dx, self.y + dy)):
+            self.collision = 1
+            self.num_collisions += 1
+        else:
+            self.collision = 0
+            self.x += dx
+            self.y += dy
+            self.mark_seen()
+            if (self.wild_battle_rate > 0 and self.on_grass() and self.rng.random() < self.wild_battle_rate):
+                self.wild_battle = 1
+        return action, self.get_ram_vals()
+
+    def interact(self):
+        return 4
+
+    def end_battle(self):
+        self.wild_battle = 0
+
+    # Detections of the objects in view as (label, box), box being [x1, y1, x2, y2] in the padded frame
+    def get_detections(self):
+        view_x = self.x - view_player_x
+        view_y = self.y - view_player_y
+        bounds = self.world.object_bounds - np.array([view_x, view_y, view_x, view_y])
+        # Clipped to the view
+        bounds[:, :2] = np.maximum(bounds[:, :2], 0)
+        bounds[:, 2] = np.minimum(bounds[:, 2], view_width - 1)
+        bounds[:, 3] = np.minimum(bounds[:, 3], view_height - 1)
+        in_view = np.nonzero((bounds[:, 0] <= bounds[:, 2]) & (bounds[:, 1] <= bounds[:, 3]))[0]
+
+        detections = []
+        for i in in_view.tolist():
+            x1, y1, x2, y2 = bounds[i].tolist()
+            # The game window shows the player's tile in the middle, half a tile lower than the grid
+            box = np.array([x1 * tile_size, (y1 - 0.5) * tile_size + padding, \
+                (x2 + 1) * tile_size, (y2 + 0.5) * tile_size + padding], dtype=np.float32)
+            if (self.box_noise > 0):
+                box += np.array([self.rng.uniform(-self.box_noise, self.box_noise) for j in range(4)], dtype=np.float32)
+            detections.append((int(self.world.object_labels[i]), box))
+        return detections
+
+    # The padded 720x720 frame poke_ai.get_screen would return
+    def get_screen(self):
+        tile_pixels = self.world.tile_pixels
+        view = np.zeros((view_height * tile_pixels, view_width * tile_pixels, 3), dtype=np.uint8)
+        # Part of the view that is inside the map
+        x1 = max(self.x - view_player_x, 0)
+        y1 = max(self.y - view_player_y, 0)
+        x2 = min(self.x - view_player_x + view_width, self.world.width)
+        y2 = min(self.y - view_player_y + view_height, self.world.height)
+        view_x = x1 - (self.x - view_player_x)
+        view_y = y1 - (self.y - view_player_y)
+        view[view_y * tile_pixels:(view_y + y2 - y1) * tile_pixels, view_x * tile_pixels:(view_x + x2 - x1) * tile_pixels] = \
+            self.world.image[y1 * tile_pixels:y2 * tile_pixels, x1 * tile_pixels:x2 * tile_pixels]
+        view = cv2.resize(view, (view_width * tile_size, view_height * tile_size), interpolation=cv2.INTER_NEAREST)
+
+        frame = np.zeros((view_width * tile_size, view_width * tile_size, 3), dtype=np.uint8)
+        # Only 10 rows fit in the game window, the top and bottom rows are cut in half
+        frame[padding:padding + 10 * tile_size] = view[tile_size // 2:tile_size // 2 + 10 * tile_size]
+        return frame
+
+    # Fraction of the reachable tiles that have been in view
+    def coverage(self):
+        return np.count_nonzero(self.seen & self.world.reachable) / np.count_nonzero(self.world.reachable)
@@ -18,22 +18,137 @@ from mss import mss
 import pyautogui as pag
 import time
 import sys
+import os
 
 # Custom imports
 from mapper import live_map
+from map_tiles import TILE, EMPTY, render_map, frontier_colour
 from auto_controller import backend_controller as controller
+from async_controller import threaded_controller
 from battle_ai.battle_ai import battle_ai
+from pipeline import detection_pipeline, rate_counter
+from detection_cache import detection_cache
+from controller_pool import controller_pool, fleet_scheduler
+from inference_server import inference_client
+from frame_ring import frame_ring, allocation_tracker
 
 import threading
 
+# The object detection model. A single one is shared by every agent of a fleet (see
+# controller_pool.fleet_scheduler) instead of each of them loading their own copy, with calls to it
+# serialised by a lock. Agents in other processes share one through inference_server.py instead.
+class shared_detector:
+    def __init__(self, model_path):
+        keras.backend.tensorflow_backend.set_session(self.get_session())
+        self.detection_model = models.load_model(model_path, backbone_name="resnet50")
+        self.detection_model._make_predict_function() # Must be built before being used from other threads
+        # The graph has to be passed around explicitly if inference is run from another thread
+        self.graph = tf.get_default_graph()
+        self.lock = threading.Lock()
+        self.num_calls = 0
+
+    # Some keras/tensorflow related stuff, even I'm not entirely sure what it does exactly
+    def get_session(self):
+        config = tf.ConfigProto()
+        config.gpu_options.allow_growth = True
+        return tf.Session(config=config)
+
+    def predict_on_batch(self, images):
+        with self.lock:
+            self.num_calls += 1
+            with self.graph.as_default():
+                return self.detection_model.predict_on_batch(images)
+
+    # Runs the model on a list of frames, as few batches as possible, and returns (boxes, scores, labels)
+    # for every frame with the boxes scaled back to the frame
+    def detect_batch(self, frames):
+        images = []
+        scales = []
+        for frame in frames:
+            image = preprocess_image(frame) # Retinanet specific preprocessing
+            image, scale = resize_image(image, min_side = 400) # This model was trained with 400p images
+            images.append(image)
+            scales.append(scale)
+        return self.detect_preprocessed(images, scales)
+
+    # Same as detect_batch for images that have already been preprocessed and resized by scale (the tensors
+    # of a frame_ring)
+    def detect_preprocessed(self, images, scales):
+        if (isinstance(images, np.ndarray)): # Already a batch, passed to the model as it is
+            boxes, scores, labels = self.predict_on_batch(images)
+            return [(boxes[i] / scales[i], scores[i], labels[i]) for i in range(len(images))]
+
+        results = [None] * len(images)
+        # Frames can only be batched with frames of the same size
+        shapes = {}
+        for i, image in enumerate(images):
+            shapes.setdefault(image.shape, []).append(i)
+        for indices in shapes.values():
+            boxes, scores, labels = self.predict_on_batch(np.stack([images[i] for i in indices]))
+            for j, i in enumerate(indices):
+                results[i] = (boxes[j] / scales[i], scores[j], labels[j])
+        return results
+
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+# Finds num_windows emulator windows on screen using the included .png and returns the top left corners of
+# their gameplay as {"left": x, "top": y}, top to bottom and left to right
+def find_game_windows(num_windows=1):
+    corners = []
+    for left, top, width, height in pag.locateAllOnScreen("find_game_window_windows.png", confidence=0.8):
+        # The same window tends to match at a few neighbouring positions
+        if (any(abs(left - x) < 10 and abs(top - y) < 10 for x, y in corners)):
+            continue
+        corners.append((left, top))
+    if (len(corners) < num_windows):
+        raise RuntimeError(f"Found {len(corners)} game windows, expected {num_windows}")
+    corners.sort(key=lambda corner: (corner[1], corner[0]))
+    # Adding a 76 pixel offset to the y coordinate since the function above returns the x,y
+    # coordinates of the menu bar - we want the coords of the gameplay below this bar
+    # Change this offset to 20 if you are running on ubuntu and are using find_game_window_ubuntu.png
+    return [{"left": left, "top": top + 76} for left, top in corners[:num_windows]]
+
 class poke_ai:
-    def __init__(self, model_path, labels_to_names, game_window_size):
+    # pipelined runs capture and inference on their own threads (see pipeline.py). With
+    # keep_step_cadence the mapping stage still consumes exactly 5 detections per step like the
+    # sequential loop does, so mapping decisions stay reproducible. Without it, the 3 in-between
+    # frames are skipped and mapping uses the first frame captured settle_time seconds after the
+    # movement was sent.
+    #
+    # headless is a throughput mode for when nobody is watching the detection window. The 3
+    # visualisation-only frames of each step either skip inference entirely (headless_mode="skip")
+    # or only run it when the frame differs noticeably from the last inferenced one
+    # (headless_mode="reuse"). Either way the mapping frame is taken settle_time after the movement.
+    #
+    # detection_cache_size is the number of recently seen frames whose detections are remembered
+    # (see detection_cache.py), 0 disables the cache.
+    #
+    # async_controller uses the asyncio controller (see async_controller.py), which waits for movements
+    # to show up in the RAM instead of sleeping and times out if the emulator stops responding.
+    #
+    # When running as part of a fleet, detector is the fleet's shared_detector (or an inference_client of
+    # an inference_server.py), ctrl the agent's controller from the controller_pool and game_window_size
+    # already points at the agent's own emulator window (find_window=False).
+    #
+    # shared_frames captures into a preallocated ring of shared memory frames (see frame_ring.py) that are
+    # padded and preprocessed for the model in place, instead of being copied at every stage.
+    # track_allocations reports the memory allocated by every step in get_inference_stats.
+    #
+    # background_learner trains the battle AI on its own thread instead of in between battle turns (see
+    # battle_ai/battle_learner.py). replay_path is where the battle AI keeps its replay memory between runs,
+    # None doesn't keep it.
+    def __init__(self, model_path, labels_to_names, game_window_size, pipelined=False, keep_step_cadence=True, \
+        queue_size=2, settle_time=0.25, headless=False, headless_mode="skip", reuse_threshold=2.0, \
+        detection_cache_size=64, async_controller=False, detector=None, ctrl=None, find_window=True, \
+        shared_frames=False, track_allocations=False, background_learner=False, replay_path=None):
         self.game_window_size = game_window_size
         self.model_path = model_path
         self.labels_to_names = labels_to_names
 
-        keras.backend.tensorflow_backend.set_session(self.get_session())
-        self.detection_model = models.load_model(self.model_path, backbone_name="resnet50")
+        if (detector == None):
+            detector = shared_detector(self.model_path)
+        self.detector = detector
 
         # Load battle AI model here as well.
         self.battle_model = Sequential()
@@ -42,22 +157,34 @@ class poke_ai:
         self.battle_model.add(Dense(4, activation='linear')) # 4 is the number of actions we can choose from
         self.battle_model.compile(loss='mse', optimizer=Adam(lr=0.001)) # learning rate
         # Initialising battle ai with battle_model
-        self.bat_ai = battle_ai(self.battle_model)
+        self.bat_ai = battle_ai(self.battle_model, replay_path=replay_path, background_learner=background_learner)
 
-        # Finding game window using included .png
-        self.game_window_size["left"], self.game_window_size["top"], temp1, temp2 = pag.locateOnScreen("find_game_window_windows.png", confidence=0.8)
-        # Adding a 76 pixel offset to the y coordinate since the function above returns the x,y
-        # coordinates of the menu bar - we want the coords of the gameplay below this bar
-        # Change this offset to 20 if you are running on ubuntu and are using find_game_window_ubuntu.png
-        self.game_window_size["top"] += 76
+        if (find_window == True):
+            self.game_window_size.update(find_game_windows(1)[0])
 
         # Initialise screen capturer
         self.sct = mss()
+        self.ring = None
+        if (shared_frames == True):
+            # The pipeline claims the slots of the frames in its two queues, the one being inferenced and the
+            # one last handed to mapping, capture writes past them into the slots left over
+            self.ring = frame_ring(2 * queue_size + 4, self.game_window_size["width"], \
+                self.game_window_size["height"], name=f"poke_ai_frames_{os.getpid()}_{id(self)}")
+        self.alloc_tracker = allocation_tracker() if track_allocations == True else None
         # Get padding for converting 720:480 aspect ratio to 1:1
         temp3, padding = self.get_screen()
+        # Detections of recently seen frames, so identical frames aren't inferenced twice
+        self.det_cache = detection_cache(padding, self.game_window_size["width"], self.game_window_size["height"], \
+            capacity=detection_cache_size)
 
         # Setup controller
-        self.ctrl = controller()
+        self.owns_ctrl = (ctrl == None) # Pool controllers are stopped by their pool
+        if (ctrl != None):
+            self.ctrl = ctrl
+        elif (async_controller == True):
+            self.ctrl = threaded_controller()
+        else:
+            self.ctrl = controller()
         temp_init_ram_vals = self.ctrl.get_ram_vals()
         # Initialising mapper object with retroarch pid and memory addresses to watch for player's
         # x and y coordinates
@@ -77,26 +204,50 @@ class poke_ai:
         self.collision_type = "no_collision"
 
         self.in_battle = False
-        self.map_grid = np.full((2, 2), 255, dtype=np.uint8)
+        self.map_grid = np.zeros((2, 2, 2), dtype=np.uint8) # Tile ids and visited flags, see map_tiles.py
 
         # Variables to keep track of mapper history
         self.mapper_history_list = []
         self.history_output = None
 
+        # Variables for pipelined capture -> detect -> map mode
+        self.keep_step_cadence = keep_step_cadence
+        self.settle_time = settle_time
+        self.min_frame_seq = 0 # Only detections on frames captured after this are used
+        self.min_frame_time = 0.0
+        self.pipeline_wait_time = 0.0
+        self.pipeline = None
+
+        # Variables for headless mode
+        self.headless = headless
+        self.headless_mode = headless_mode
+        self.reuse_threshold = reuse_threshold # Mean absolute pixel difference below which detections are reused
+        self.last_inferenced_small = None
+        self.model_calls = 0
+        self.avoided_inference = rate_counter()
+        # Whether the 3 visualisation-only frames of each step are skipped altogether
+        self.skip_visual_frames = (pipelined == True and keep_step_cadence == False) or \
+            (headless == True and headless_mode == "skip")
+        if (pipelined == True):
+            self.pipeline = detection_pipeline(self.make_capture_func, self.detect, queue_size, \
+                self.ring.release_frame if self.ring != None else None)
+            self.pipeline.start()
+
     # Dummy function, does nothing
     def nothing(self, x):
         pass
 
-    # Some keras/tensorflow related stuff, even I'm not entirely sure what it does exactly
-    def get_session(self):
-        config = tf.ConfigProto()
-        config.gpu_options.allow_growth = True
-        return tf.Session(config=config)
+    # Gets single frame of gameplay as a numpy array on which object inference will be later ran. With
+    # claim, a frame ring slot stays claimed until it is released (the pipeline's frames).
+    def get_screen(self, sct=None, claim=False):
+        if (sct == None):
+            sct = self.sct
+        if (self.ring != None):
+            slot = self.ring.write_screenshot(sct.grab(self.game_window_size), claim)
+            return self.ring.frames[slot], self.ring.padding
 
-    # Gets single frame of gameplay as a numpy array on which object inference will be later ran
-    def get_screen(self):
         # Getting game screen as input
-        frame = np.array(self.sct.grab(self.game_window_size))
+        frame = np.array(sct.grab(self.game_window_size))
         frame = frame[:, :, :3] # Splicing off alpha channel
 
         # Making input a square by padding
@@ -112,28 +263,53 @@ class poke_ai:
         
         return frame, padding
 
+    # Used by the pipeline's capture thread, which needs its own screen capturer
+    def make_capture_func(self):
+        sct = mss()
+        def capture():
+            frame, padding = self.get_screen(sct, claim=True)
+            return frame
+        return capture
+
     # Runs inference on a single input frame and returns detected bounding boxes
     def run_detection(self, frame):
-        # Process image and run inference
-        image = preprocess_image(frame) # Retinanet specific preprocessing
-        image, scale = resize_image(image, min_side = 400) # This model was trained with 400p images
-        boxes, scores, labels = self.detection_model.predict_on_batch(np.expand_dims(image, axis=0)) # Run inference
-        boxes /= scale # Ensures bounding boxes are of the correct scale
+        if (self.headless == True and self.headless_mode == "reuse"):
+            self.last_inferenced_small = self.downsample_frame(frame)
+        frame, self.predictions_for_map, self.has_detections = self.detect(frame)
+        return frame, False
 
-        self.has_detections = False
+    # Cheap thumbnail of a frame used for frame-difference checks
+    def downsample_frame(self, frame):
+        return frame[::8, ::8].astype(np.int16)
+
+    # Used in headless reuse mode for frames whose detections are only ever displayed. If the frame
+    # hardly differs from the last inferenced one, the previous detections are kept as they are.
+    def reuse_detection(self):
+        frame, temp = self.get_screen()
+        if (self.last_inferenced_small is not None):
+            diff = np.mean(np.abs(self.downsample_frame(frame) - self.last_inferenced_small))
+            if (diff < self.reuse_threshold):
+                self.avoided_inference.add(1)
+                return frame, False
+        return self.run_detection(frame)
+
+    # Does the actual work for run_detection without modifying any state, so it is safe to call
+    # from the pipeline's inference thread
+    def detect(self, frame):
+        cache_key = None
+        detections = None
+        if (self.det_cache.capacity > 0):
+            cache_key = self.det_cache.make_key(frame)
+            detections = self.det_cache.get(cache_key)
+
+        if (detections == None):
+            detections = self.infer(frame)
+            if (cache_key != None):
+                self.det_cache.put(cache_key, detections)
 
         # Visualize detections from inferencing
-        self.predictions_for_map = []
-        for box, score, label in zip(boxes[0], scores[0], labels[0]):
-            # We can break here because the bounding boxes are in descending order in terms of confidence
-            if score < (85 / 100):
-                break
-
-            if (label == 7):
-                continue
-
-            self.has_detections = True
-
+        predictions_for_map = []
+        for label, box, score in detections:
             # Drawing labels and bounding boxes on input frame
             color = label_color(label)
             b = box.astype(int)
@@ -142,13 +318,107 @@ class poke_ai:
             draw_caption(frame, b, caption)
 
             # Appending to output array
-            self.predictions_for_map.append((label, box))
+            predictions_for_map.append((label, box))
+
+        return frame, predictions_for_map, len(predictions_for_map) > 0
+
+    # Runs the object detection model on a frame and returns a list of (label, box, score) for
+    # all confident detections
+    def infer(self, frame):
+        # Process image and run inference, the boxes come back scaled to the frame. Frames from the frame ring
+        # have already been preprocessed.
+        slot = self.ring.find_slot(frame) if self.ring != None else None
+        if (slot != None and isinstance(self.detector, shared_detector)):
+            boxes, scores, labels = self.detector.detect_preprocessed(self.ring.tensors[slot:slot + 1], \
+                [self.ring.scale])[0]
+        else:
+            boxes, scores, labels = self.detector.detect(frame)
+        self.model_calls += 1
 
-        return frame, False
+        detections = []
+        for box, score, label in zip(boxes, scores, labels):
+            # We can break here because the bounding boxes are in descending order in terms of confidence
+            if score < (85 / 100):
+                break
+
+            if (label == 7):
+                continue
+
+            detections.append((label, box, score))
+
+        return detections
+
+    # Gets the next frame of gameplay along with its detections. In pipelined mode the frame has
+    # already been captured and inferenced by the pipeline's worker threads.
+    def get_detection(self, visual_only=False):
+        if (self.pipeline == None):
+            if (visual_only == True and self.headless == True):
+                return self.reuse_detection()
+            # Give the movement animation time to finish if the in-between frames were skipped
+            wait_time = self.min_frame_time - time.perf_counter()
+            if (wait_time > 0):
+                time.sleep(wait_time)
+            frame, temp = self.get_screen()
+            return self.run_detection(frame)
+
+        if (self.pipeline.is_paused()):
+            self.pipeline.resume()
+            self.min_frame_seq = self.pipeline.next_seq()
+
+        wait_start = time.perf_counter()
+        result = self.pipeline.get(self.min_frame_seq, self.min_frame_time)
+        self.pipeline_wait_time += time.perf_counter() - wait_start
+
+        # Never hand out the same frame twice
+        self.min_frame_seq = result.seq + 1
+        self.predictions_for_map = result.predictions
+        self.has_detections = result.has_detections
+        return result.frame, False
+
+    # Ensures that any detections used after this point come from frames captured after the
+    # movement has been performed
+    def mark_movement(self):
+        if (self.pipeline != None):
+            self.min_frame_seq = self.pipeline.next_seq()
+        if (self.skip_visual_frames == True or self.headless == True):
+            self.min_frame_time = time.perf_counter() + self.settle_time
+
+    def get_inference_stats(self):
+        stats = {"model_calls": self.model_calls, "avoided_calls": self.avoided_inference.total, \
+            "avoided_per_minute": self.avoided_inference.per_minute(), "detection_cache": self.det_cache.stats()}
+        if (self.alloc_tracker != None):
+            stats["allocations"] = self.alloc_tracker.summary()
+        return stats
+
+    def get_pipeline_stats(self):
+        if (self.pipeline == None):
+            return None
+        return self.pipeline.stats()
+
+    def shutdown(self):
+        if (self.pipeline != None):
+            self.pipeline.stop()
+        if (self.owns_ctrl == True and isinstance(self.ctrl, threaded_controller)):
+            self.ctrl.stop()
+        if (self.alloc_tracker != None):
+            self.alloc_tracker.stop()
+        if (self.ring != None):
+            self.ring.close()
+        self.bat_ai.stop()
 
     def run_step(self):
+        if (self.alloc_tracker == None):
+            return self.do_step()
+        self.alloc_tracker.start_step()
+        output = self.do_step()
+        self.alloc_tracker.end_step()
+        return output
+
+    def do_step(self):
         temp_bool = None
         frame = None
+        step_start = time.perf_counter()
+        self.pipeline_wait_time = 0.0
         
         if (self.in_battle == False):
             
@@ -156,45 +426,51 @@ class poke_ai:
             if (self.step_count == 0):
                 if (self.is_init_step == True):
                     self.key_pressed = None
-                    frame, temp = self.get_screen()
-                    frame, temp_init = self.run_detection(frame)
+                    frame, temp_init = self.get_detection()
                     self.map_grid, self.collision_type = self.mp.draw_map(self.key_pressed, self.predictions_for_map, self.ram_vals)
                     # No collision handler here since it is literally impossible to collide on the first frame
 
                     self.step_count += 1
                     self.actions = self.mp.get_movelist()
-                    temp_obj = mapping_history_list_obj(f"Found next frontier at {self.mp.pf.next_frontier[1:]}", \
-                        frame, self.map_grid)
-                    self.mapper_history_list.append(temp_obj)
+                    self.add_frontier_history(frame)
 
                 # All other 0 frames that are not the initial frame
                 else:
-                    frame, temp = self.get_screen()
-                    frame, temp_init = self.run_detection(frame)
+                    frame, temp_init = self.get_detection()
                     
                     # Used to iterate through pre-defined actions and break once actions have ended
                     self.action_index += 1
                     if (self.action_index >= len(self.actions)):
+                        had_actions = (len(self.actions) > 0)
                         self.action_index = 0
                         self.actions = self.mp.get_movelist()
-                        temp_obj = mapping_history_list_obj(f"Reached frontier at {self.mp.pf.next_frontier[1:]}", \
-                            frame, self.map_grid)
-                        self.mapper_history_list.append(temp_obj)
-                        temp_obj = mapping_history_list_obj(f"Found next frontier at {self.mp.pf.next_frontier[1:]}", \
-                            frame, self.map_grid)
-                        self.mapper_history_list.append(temp_obj)
-                    
-                    print("Key pressed: " + self.keys[self.actions[self.action_index]])            
-                    self.key_pressed, self.ram_vals = self.ctrl.perform_movement(action=self.actions[self.action_index])
-                    self.step_count += 1
+                        if (had_actions == True):
+                            temp_obj = mapping_history_list_obj(f"Reached frontier at {self.mp.pf.next_frontier[1:]}", \
+                                frame, self.map_grid)
+                            self.mapper_history_list.append(temp_obj)
+                            self.add_frontier_history(frame)
+
+                    if (len(self.actions) == 0):
+                        # No reachable frontiers, stay put and look for one again next step, like
+                        # exploration_runner.explore stops instead of moving
+                        self.action_index = -1
+                    else:
+                        print("Key pressed: " + self.keys[self.actions[self.action_index]])
+                        self.key_pressed, self.ram_vals = self.ctrl.perform_movement(action=self.actions[self.action_index])
+                        self.mark_movement()
+                        self.step_count += 1
+                        if (self.skip_visual_frames == True):
+                            # Straight to the mapping frame, skipping the 3 visualisation-only frames
+                            self.step_count = 4
+                            if (self.pipeline == None):
+                                self.avoided_inference.add(3)
 
 
 
             # All other frames just deal with normal inferencing for nicer visualization purposes, but this does
             # nothing to affect out mapping algorithm
             elif (self.step_count < 4):
-                frame, temp = self.get_screen()
-                frame, temp_bool = self.run_detection(frame)
+                frame, temp_bool = self.get_detection(visual_only=True)
                 self.step_count += 1
 
 
@@ -202,8 +478,7 @@ class poke_ai:
             # Last frame is when the new detections are properly taken from the inferencing, and are used as inputs in the
             # mapping algorithm
             elif (self.step_count == 4):
-                frame, temp = self.get_screen()
-                frame, temp_bool = self.run_detection(frame)
+                frame, temp_bool = self.get_detection()
 
                 # Draw map in window
                 # Take note that there is a one frame delay because of something in OpenCV itself. If you print
@@ -222,32 +497,34 @@ class poke_ai:
                     self.mapper_history_list.append(temp_obj)
 
                 if (self.collision_type == "battle_collision_post" or self.collision_type == "battle_collision_pre"):
-                    if (self.collision_type == "battle_collision_pre"):
+                    if (self.collision_type == "battle_collision_pre" and len(self.actions) > 0):
                         self.action_index -= 1
                         self.action_index %= len(self.actions) # Ensuring that any negative values are cycled back to positive
 
                     while (self.has_detections == True):
-                        frame, temp = self.get_screen()
-                        frame, temp_bool = self.run_detection(frame)
+                        frame, temp_bool = self.get_detection()
                         
                         # Spam Z until battle has properly started.
                         self.ctrl.interact()
                     self.in_battle = True
+                    if (self.pipeline != None):
+                        # Battle AI grabs its own frames, no point in running detection meanwhile
+                        self.pipeline.pause()
 
                 else:
                     # Check here if the latest frontier is now a building or another object. 
-                    # If it is, search for another frontier.
-                    if (not (np.array_equal(self.map_grid[self.mp.pf.next_frontier[2]][self.mp.pf.next_frontier[1]][:3], [0, 0, 0]) or \
-                        np.array_equal(self.map_grid[self.mp.pf.next_frontier[2]][self.mp.pf.next_frontier[1]][:3], [255, 255, 255]))):
-                        print("Frontier obstructed, switching to new frontier...")
-                        temp_obj = mapping_history_list_obj(f"Frontier at {self.mp.pf.next_frontier[1:]} obstructued", \
-                            frame, self.map_grid)
-                        self.mapper_history_list.append(temp_obj)
-                        self.action_index = -1
-                        self.actions = self.mp.get_movelist()
-                        temp_obj = mapping_history_list_obj(f"Found next frontier at {self.mp.pf.next_frontier[1:]}", \
-                            frame, self.map_grid)
-                        self.mapper_history_list.append(temp_obj)
+                    # If it is, search for another frontier. There's none to check if no reachable frontier has
+                    # been found yet, the next step stays put and searches again.
+                    if (self.mp.pf.next_frontier != None):
+                        frontier_x, frontier_y = self.mp.pf.get_frontier_grid_pos()
+                        if (self.map_grid[frontier_y][frontier_x][TILE] != EMPTY):
+                            print("Frontier obstructed, switching to new frontier...")
+                            temp_obj = mapping_history_list_obj(f"Frontier at {self.mp.pf.next_frontier[1:]} obstructued", \
+                                frame, self.map_grid)
+                            self.mapper_history_list.append(temp_obj)
+                            self.action_index = -1
+                            self.actions = self.mp.get_movelist()
+                            self.add_frontier_history(frame)
 
                     # Change actions to newly calculated path if a collision occurs
                     if (self.collision_type == "normal_collision"):
@@ -257,12 +534,12 @@ class poke_ai:
                         self.actions = self.mp.pf.frontier_path_collision_handler(self.map_grid, \
                             (self.mp.map_offset_x - self.mp.map_min_offset_x), \
                             (self.mp.map_offset_y - self.mp.map_min_offset_y))
-                        if (self.actions == False): # If we have experienced 5 consecutive collisions
+                        # If we have experienced 5 consecutive collisions (False), or there are no moves left
+                        # to the frontier ([], which isn't == False)
+                        if (self.actions == False or len(self.actions) == 0):
                             # Find a new frontier to go towards
                             self.actions = self.mp.get_movelist()
-                            temp_obj = mapping_history_list_obj(f"Found next frontier at {self.mp.pf.next_frontier[1:]}", \
-                                frame, self.map_grid)
-                            self.mapper_history_list.append(temp_obj)
+                            self.add_frontier_history(frame)
                         self.action_index = -1 # Either way we reset the index
 
                 # Reset 5 frame cycle
@@ -283,41 +560,109 @@ class poke_ai:
                 self.bat_ai.pokemon_hp = 141 # Reset back to default
                 temp3, padding = self.get_screen()
                 self.mp = live_map(self.game_window_size["width"], self.game_window_size["height"], padding, self.ram_vals)
+                self.det_cache.clear()
                 self.is_init_step = True
                 self.step_count = 0
                 self.actions = []
                 self.in_battle = False
-                return frame, self.map_grid
+                return frame, render_map(self.map_grid)
 
             elif (battle_status == "continue"):
                 self.in_battle = True
-                return frame, self.map_grid
+                return frame, render_map(self.map_grid)
             
             else:
                 self.in_battle = False
 
             # After battle ai has completed, returning back to normal movement
             while True:
-                frame, temp = self.get_screen()
-                frame, temp3 = self.run_detection(frame)
+                frame, temp3 = self.get_detection()
                 if (self.has_detections == True):
                     time.sleep(0.5)
                     break
 
+        if (self.pipeline != None):
+            self.pipeline.timers["mapping"].add(time.perf_counter() - step_start - self.pipeline_wait_time)
+
         # Drawing centroid on map
-        ret_map_grid = self.map_grid.copy()
-        ret_map_grid[self.mp.pf.next_frontier[2]][self.mp.pf.next_frontier[1]][:3] = [234, 0, 255]
+        ret_map_grid = render_map(self.map_grid)
+        if (self.mp.pf.next_frontier != None): # None until a reachable frontier has been found
+            frontier_x, frontier_y = self.mp.pf.get_frontier_grid_pos()
+            ret_map_grid[frontier_y][frontier_x] = frontier_colour
         return frame, ret_map_grid
 
+    # Adds the frontier just planned for to the history, get_movelist returns no moves when there are no
+    # reachable frontiers left
+    def add_frontier_history(self, frame):
+        if (len(self.actions) > 0):
+            text = f"Found next frontier at {self.mp.pf.next_frontier[1:]}"
+        else:
+            text = "No reachable frontiers left, waiting"
+        self.mapper_history_list.append(mapping_history_list_obj(text, frame, self.map_grid))
+
     def show_windows(self, frame, map_grid):
         cv2.imshow("Screen", frame)
         cv2.imshow("Map", map_grid[:,:,:3])
 
+# The map is kept as tile ids and only turned into an image when the GUI asks for it
 class mapping_history_list_obj:
-    def __init__(self, text, detection_img, map_img):
+    def __init__(self, text, detection_img, map_grid):
         self.text = text
+        # Frames from the frame ring are views on a slot that gets overwritten a few frames later
+        if (isinstance(detection_img, np.ndarray) and detection_img.flags.owndata == False):
+            detection_img = detection_img.copy()
         self.detection_img = detection_img
-        self.map_img = map_img
+        self.map_grid = map_grid.copy()
+
+    @property
+    def map_img(self):
+        return render_map(self.map_grid)
+
+# Runs num_agents headless agents at once sharing a single detection model, agent i driving emulator
+# instance i (started with controller_pool.emulator_env(i)) through the i-th game window found on screen,
+# counting top to bottom and left to right. With inference_endpoint the model is the one served by
+# inference_server.py, which batches the agents' frames together. With replay_path every agent keeps its
+# battle AI's replay memory in its own file, replay_path with the agent's index added to the name.
+def run_fleet(num_agents, model_path, labels_to_names, game_window_size, transport="tcp", async_controller=False, \
+    inference_endpoint=None, replay_path=None):
+    detector = None
+    if (inference_endpoint == None):
+        detector = shared_detector(model_path)
+    pool = controller_pool(num_agents, transport, async_controller=async_controller)
+    windows = find_game_windows(num_agents)
+    for i in range(num_agents):
+        print(f"Emulator {i}: window at {windows[i]}, POKE_AI_INPUT_ENDPOINT={pool.endpoints[i]['input_connect']} " + \
+            f"POKE_AI_RAM_ENDPOINT={pool.endpoints[i]['ram_bind']}")
+
+    def make_agent(index):
+        window = dict(game_window_size)
+        window.update(windows[index])
+        agent_detector = detector
+        if (inference_endpoint != None):
+            agent_detector = inference_client(inference_endpoint)
+        agent_replay_path = None
+        if (replay_path != None):
+            root, ext = os.path.splitext(replay_path)
+            agent_replay_path = f"{root}_{index}{ext}"
+        return poke_ai(model_path, labels_to_names, window, headless=True, detector=agent_detector, \
+            ctrl=pool[index], find_window=False, replay_path=agent_replay_path)
+
+    fleet = fleet_scheduler(make_agent, num_agents)
+    fleet.start()
+    try:
+        while (fleet.join(30.0) == False):
+            print(fleet.stats())
+    except KeyboardInterrupt:
+        pass
+    fleet.stop(5.0)
+    print(fleet.stats())
+    if (detector != None):
+        print(f"{detector.num_calls} detection model calls")
+
+    for agent in fleet.agents:
+        if (agent != None):
+            agent.shutdown()
+    pool.stop()
 
 # Main function
 if __name__ == "__main__":
@@ -326,23 +671,58 @@ if __name__ == "__main__":
     model_path = "../object_detection/keras-retinanet/inference_graphs/map_detector.h5" # Model to be used for detection
     labels_to_names = {0: "pokecen", 1: "pokemart", 2: "npc", 3: "house", 4: "gym", 5: "exit", 6: "wall", 7:"grass"} # Labels to draw
 
+    headless = ("--headless" in sys.argv)
+
+    # --inference-server endpoint uses the model served by inference_server.py instead of loading one
+    inference_endpoint = None
+    if ("--inference-server" in sys.argv):
+        inference_endpoint = sys.argv[sys.argv.index("--inference-server") + 1]
+
+    # --replay-memory path keeps the battle AI's replay memory in path between runs
+    # (e.g. battle_ai/models/replay_memory.npz)
+    replay_path = None
+    if ("--replay-memory" in sys.argv):
+        replay_path = sys.argv[sys.argv.index("--replay-memory") + 1]
+
+    # python standalone_backend.py --fleet 4 [--ipc] runs 4 emulators at once, see run_fleet
+    if ("--fleet" in sys.argv):
+        run_fleet(int(sys.argv[sys.argv.index("--fleet") + 1]), model_path, labels_to_names, game_window_size, \
+            "ipc" if "--ipc" in sys.argv else "tcp", async_controller=("--async-controller" in sys.argv), \
+            inference_endpoint=inference_endpoint, replay_path=replay_path)
+        sys.exit()
+
     # Setting up windows
-    cv2.namedWindow("Map", cv2.WINDOW_NORMAL)
-    cv2.resizeWindow("Map", game_window_size["width"], game_window_size["height"])
-    cv2.moveWindow("Map", 750, 850)
-    cv2.namedWindow("Screen")
-    cv2.moveWindow("Screen", 750, 0)
+    if (headless == False):
+        cv2.namedWindow("Map", cv2.WINDOW_NORMAL)
+        cv2.resizeWindow("Map", game_window_size["width"], game_window_size["height"])
+        cv2.moveWindow("Map", 750, 850)
+        cv2.namedWindow("Screen")
+        cv2.moveWindow("Screen", 750, 0)
     
-    my_poke_ai = poke_ai(model_path, labels_to_names, game_window_size)
+    my_poke_ai = poke_ai(model_path, labels_to_names, game_window_size, pipelined=("--pipelined" in sys.argv), \
+        headless=headless, async_controller=("--async-controller" in sys.argv), \
+        detector=(inference_client(inference_endpoint) if inference_endpoint != None else None), \
+        shared_frames=("--shared-frames" in sys.argv), track_allocations=("--track-allocations" in sys.argv), \
+        background_learner=("--background-learner" in sys.argv), replay_path=replay_path)
+
+    try:
+        while True:  
+            frame, map_grid = my_poke_ai.run_step()
+            if (headless == True):
+                continue # No windows to update, stop with Ctrl+C
+            my_poke_ai.show_windows(frame, map_grid)
+            
+            key = cv2.waitKey(1)
+            if (key == ord('q')):
+                break
+    except KeyboardInterrupt:
+        pass
 
-    while True:  
-        frame, map_grid = my_poke_ai.run_step()
-        my_poke_ai.show_windows(frame, map_grid)
-        
-        key = cv2.waitKey(1)
-        if (key == ord('q')):
-            break
+    print(my_poke_ai.get_inference_stats())
+    if (my_poke_ai.pipeline != None):
+        print(my_poke_ai.get_pipeline_stats())
 
     # Clean running processes and close program cleanly
+    my_poke_ai.shutdown()
     cv2.destroyAllWindows()
     sys.exit()
\ No newline at end of file
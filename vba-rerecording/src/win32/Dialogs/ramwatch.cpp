@@ -12,6 +12,7 @@
 #include <windows.h>
 #include <string>
 #include "../../common/Util.h"
+#include "../../common/SystemGlobals.h"
 #include <iostream>	
 #include <sstream>
 #include <zmq.h>
@@ -26,6 +27,22 @@
 void *context2;
 void *publisher;
 
+// Binary RAM telemetry frame published on every update, see ai/ram_telemetry.py for the Python side.
+// Little endian, bump RAM_FRAME_VERSION whenever the layout changes.
+#define RAM_FRAME_VERSION 1
+#pragma pack(push, 1)
+struct RamFrame
+{
+	unsigned char version;
+	unsigned char numValues;
+	unsigned short reserved;
+	unsigned int seq; // Incremented for every frame sent, gaps mean frames were dropped
+	unsigned int frameCount; // Emulator frame the values were read on
+	unsigned char values[6];
+};
+#pragma pack(pop)
+unsigned int ramFrameSeq = 0;
+
 /*
 #include <commctrl.h>
 #pragma comment(lib, "comctl32.lib")
@@ -227,7 +244,15 @@ void Update_RAM_Watch()
         msg[6] = 0; // null character to end string
 
         //DBOUT("Send: " << msg[0] << "," << msg[1] << "," << msg[2] << "," << msg[3] << std::endl);
-        zmq_send(publisher, msg, strlen(msg), 0);
+        RamFrame frame;
+        frame.version = RAM_FRAME_VERSION;
+        frame.numValues = 6;
+        frame.reserved = 0;
+        frame.seq = ramFrameSeq++;
+        frame.frameCount = systemCounters.frameCount;
+        for (int i = 0; i < 6; i++)
+            frame.values[i] = msg[i];
+        zmq_send(publisher, &frame, sizeof(frame), 0);
 	}
 
 	// refresh any visible parts of the listview box that changed
@@ -967,7 +992,9 @@ LRESULT CALLBACK RamWatchProc(HWND hDlg, UINT uMsg, WPARAM wParam, LPARAM lParam
             // Add socket initialization code here
             context2 = zmq_ctx_new();
             publisher = zmq_socket(context2, ZMQ_PUB);
-            int rc = zmq_bind(publisher, "tcp://*:5556");
+            // Overridden for each emulator in a fleet, see ai/controller_pool.py
+            const char *endpoint = getenv("POKE_AI_RAM_ENDPOINT");
+            int rc = zmq_bind(publisher, endpoint != NULL ? endpoint : "tcp://*:5556");
             //DBOUT("Socket initialized.");
 
 			Update_RAM_Watch();
@@ -167,6 +167,12 @@ extern void winlog(const char *msg, ...);
 #define POV_RIGHT 4
 #define POV_LEFT  8
 
+// Input scripts, see ai/input_script.py
+#define INPUT_SCRIPT_VERSION 1
+#define INPUT_SCRIPT_HEADER_SIZE 6
+#define INPUT_SCRIPT_STEP_SIZE 3
+#define MAX_SCRIPT_STEPS 256
+
 class DirectInput : public Input
 {
 private:
@@ -174,6 +180,26 @@ private:
    
     int move_count = 0;
 
+    // Input script sent by the AI instead of a single byte of buttons, see ai/input_script.py
+    struct ScriptStep
+    {
+        unsigned char buttons;
+        int frames;
+    };
+    ScriptStep scriptSteps[MAX_SCRIPT_STEPS];
+    int scriptLength = 0;
+    int scriptStep = 0;
+    int scriptFramesLeft = 0;
+    unsigned short scriptId = 0;
+    bool scriptRunning = false;
+    // A request was sent to the AI and its reply hasn't come back yet (replies are only waited on for 1 ms),
+    // the REQ socket can't send another request until it has
+    bool replyPending = false;
+
+    bool loadScript(const unsigned char *msg, int size);
+    int requestAI(const char *request, int requestSize, unsigned char *reply, int replySize);
+    unsigned char readAIButtons();
+
 public:
     void *context;
     void *subscriber;
@@ -1080,7 +1106,10 @@ void DirectInput::startZMQ()
     requester = zmq_socket(context, ZMQ_REQ);
     int timeout = 1;
     zmq_setsockopt(requester, ZMQ_RCVTIMEO, &timeout, sizeof(timeout));
-    zmq_connect(requester, "tcp://localhost:5555");
+    // Every emulator in a fleet needs its own endpoint (see ai/controller_pool.py), the default is the
+    // single emulator setup
+    const char *endpoint = getenv("POKE_AI_INPUT_ENDPOINT");
+    zmq_connect(requester, endpoint != NULL ? endpoint : "tcp://localhost:5555");
 }
 
 void DirectInput::endZMQ()
@@ -1089,6 +1118,93 @@ void DirectInput::endZMQ()
     //zmq_ctx_destroy(context);
 }
 
+// Script header: version (u8), reserved (u8), id (u16), number of steps (u16), then for every step the
+// buttons (u8) and how many frames to hold them for (u16), all little endian
+bool DirectInput::loadScript(const unsigned char *msg, int size)
+{
+    if (size < INPUT_SCRIPT_HEADER_SIZE || msg[0] != INPUT_SCRIPT_VERSION)
+        return false;
+    int length = msg[4] | (msg[5] << 8);
+    if (length == 0 || length > MAX_SCRIPT_STEPS || size != INPUT_SCRIPT_HEADER_SIZE + length * INPUT_SCRIPT_STEP_SIZE)
+        return false;
+
+    for (int i = 0; i < length; i++) {
+        const unsigned char *step = msg + INPUT_SCRIPT_HEADER_SIZE + i * INPUT_SCRIPT_STEP_SIZE;
+        scriptSteps[i].buttons = step[0];
+        scriptSteps[i].frames = step[1] | (step[2] << 8);
+    }
+    scriptId = msg[2] | (msg[3] << 8);
+    scriptLength = length;
+    scriptStep = 0;
+    scriptFramesLeft = scriptSteps[0].frames;
+    scriptRunning = true;
+    return true;
+}
+
+// Sends request to the AI and waits (1 ms) for its reply. If the reply to an earlier request is still pending
+// nothing is sent, the REQ socket only allows one request at a time, and the reply picked up is that one's.
+// Returns the size of the reply, or -1 if there was none in time or the request couldn't be sent.
+int DirectInput::requestAI(const char *request, int requestSize, unsigned char *reply, int replySize)
+{
+    if (!replyPending) {
+        if (zmq_send(requester, request, requestSize, 0) < 0) {
+            DBOUT("Couldn't send a request to the AI: " << zmq_strerror(zmq_errno()) << std::endl);
+            return -1;
+        }
+        replyPending = true;
+    }
+    int size = zmq_recv(requester, reply, replySize, 0);
+    if (size >= 0)
+        replyPending = false;
+    return size;
+}
+
+// Buttons the AI wants pressed on this frame. Either a single byte of buttons for this frame, or an input
+// script that is played out over the next frames without asking the AI again. Once a script is over,
+// "script_done" and its id are sent as the acknowledgement, and the AI's reply to it (nothing to press) is
+// received before the next "check_move".
+unsigned char DirectInput::readAIButtons()
+{
+    unsigned char buttons = 0;
+    unsigned char msg[INPUT_SCRIPT_HEADER_SIZE + MAX_SCRIPT_STEPS * INPUT_SCRIPT_STEP_SIZE];
+
+    if (!scriptRunning) {
+        int size = requestAI("check_move", 10, msg, sizeof(msg));
+        if (size == 1) {
+            buttons = msg[0];
+        }
+        else if (size > 1 && size <= (int)sizeof(msg)) {
+            if (!loadScript(msg, size))
+                DBOUT("Invalid input script\n");
+        }
+    }
+
+    while (scriptRunning && scriptFramesLeft <= 0) { // Zero frame steps are skipped
+        scriptStep += 1;
+        if (scriptStep >= scriptLength) {
+            scriptRunning = false;
+            char done[13] = "script_done";
+            done[11] = scriptId & 0xFF;
+            done[12] = scriptId >> 8;
+            // If the reply doesn't come in time it is picked up by the next "check_move" instead
+            requestAI(done, 13, msg, sizeof(msg));
+        }
+        else {
+            scriptFramesLeft = scriptSteps[scriptStep].frames;
+        }
+    }
+    if (scriptRunning) {
+        buttons = scriptSteps[scriptStep].buttons;
+        scriptFramesLeft -= 1;
+    }
+
+    if (buttons != 0) {
+        move_count += 1;
+        DBOUT(move_count << std::endl);
+    }
+    return buttons;
+}
+
 bool DirectInput::readDevices()
 {
 	bool ok = true;
@@ -1115,17 +1231,7 @@ u32 DirectInput::readDevice(int i, bool sensor)
 	u32 res = 0;
 
     char buffer[2];
-    buffer[0] = 0;
-    buffer[1] = '/0';
-
-    zmq_send(requester, "check_move", 10, 0);
-    zmq_recv(requester, buffer, 1, 0);
-
-    if (buffer[0] != 0) {
-        move_count += 1;
-        DBOUT(move_count << std::endl);
-    }
-
+    buffer[0] = readAIButtons();
     buffer[1] = '/0';
 
     // W, D, S, A, Z, (B), CONT.